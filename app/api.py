@@ -0,0 +1,228 @@
+"""Versioned JSON API (``/api/v1``) next to the HTML views.
+
+    GET    /api/v1/<entity>?fields=id,nombre&q=..&cursor=..&limit=100   cursor-paginated list
+    GET    /api/v1/<entity>?ids=1,2,3                                   bulk get, one query
+    GET    /api/v1/<entity>/<id>
+    POST   /api/v1/<entity>    [{...}, ...]                             bulk create
+    PATCH  /api/v1/<entity>    [{"id": 1, ...}, ...]                    bulk update
+    DELETE /api/v1/<entity>    {"ids": [1, 2]}                          bulk delete
+    GET    /api/v1/vehiculos/facetas?tipo=suv&banda_precio=2&anio_desde=2018  page plus facet counts
+    GET    /api/v1/cambios?after=<offset>&entidades=clientes,ventas&wait=25  change feed (long poll)
+
+Authentication is the normal session cookie (POST /login) and every call is
+checked against the same view/add/edit/delete permissions as the HTML views.
+Each bulk write runs in a single transaction: either every item is applied
+or none is.
+
+The facet call filters vehiculos by tipo, color, banda_precio (repeatable)
+and an anio_desde/anio_hasta range, and answers with the keyset page and the
+counts of every facet (see app.facets) in one round-trip.
+
+The change feed returns the writes after ``after`` (see app.changes) and
+``next``, the offset to resume from. With nothing new it waits up to ``wait``
+seconds for a change before answering with an empty list.
+"""
+import time
+from datetime import date
+from decimal import Decimal
+
+import mysql.connector
+from flask import Blueprint, jsonify, request, session
+
+from app import changes, facets
+from app.auth import can
+from app.db import close_db, get_db, get_read_db
+from app.repository import repositories, transaction
+
+MAX_LIMIT = 500
+MAX_BULK = 1000
+
+ENTITIES = "<any(clientes, proveedores, vehiculos, almacenes, empleados, ventas):entity>"
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api.errorhandler(ApiError)
+def api_error(e):
+    return jsonify(error=e.message), e.status
+
+
+@api.errorhandler(mysql.connector.IntegrityError)
+def api_integrity_error(e):
+    return jsonify(error="Registro duplicado o con datos relacionados", detail=e.msg), 409
+
+
+@api.errorhandler(mysql.connector.DataError)
+def api_data_error(e):
+    return jsonify(error="Valor no válido", detail=e.msg), 400
+
+
+@api.before_request
+def authenticate():
+    if "empleado_id" not in session:
+        raise ApiError("No autenticado", 401)
+    action = {"GET": "view", "POST": "add", "PATCH": "edit", "DELETE": "delete"}.get(request.method, "view")
+    if not can(action):
+        raise ApiError("No autorizado", 403)
+
+
+def _jsonable(row):
+    out = {}
+    for key, value in row.items():
+        if isinstance(value, Decimal):
+            value = str(value)
+        elif isinstance(value, date):
+            value = value.isoformat()
+        out[key] = value
+    return out
+
+
+def _fields(repo):
+    requested = request.args.get("fields")
+    if not requested:
+        return repo.columns
+    fields = [f.strip() for f in requested.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in repo.columns]
+    if unknown:
+        raise ApiError("Campos desconocidos: " + ", ".join(unknown))
+    # The keyset needs its own columns in every row
+    return [f for f in repo.order[1] if f not in fields] + fields
+
+
+def _ids(values):
+    try:
+        ids = sorted({int(v) for v in values})
+    except (TypeError, ValueError):
+        raise ApiError("Los ids deben ser enteros")
+    if not ids or len(ids) > MAX_BULK:
+        raise ApiError(f"Entre 1 y {MAX_BULK} ids")
+    return ids
+
+
+def _items():
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items or not all(isinstance(i, dict) for i in items):
+        raise ApiError("Se espera una lista JSON de objetos")
+    if len(items) > MAX_BULK:
+        raise ApiError(f"Máximo {MAX_BULK} elementos por llamada")
+    return items
+
+
+def _limit():
+    try:
+        return min(MAX_LIMIT, max(1, int(request.args.get("limit", 100))))
+    except ValueError:
+        raise ApiError("limit debe ser un entero")
+
+
+def _writable(entity):
+    repo = repositories[entity]
+    if not repo.api_writable:
+        raise ApiError(f"{entity} es de solo lectura en la API", 405)
+    return repo
+
+
+@api.route(f"/{ENTITIES}", methods=["GET"])
+def listar(entity):
+    repo = repositories[entity]
+    fields = _fields(repo)
+    db = get_read_db()
+    if request.args.get("ids"):
+        # Bulk get: a few IN queries instead of one request per record
+        ids = _ids(request.args["ids"].split(","))
+        rows = repo.get_many(db, ids, fields)
+        found = {row["id"] for row in rows}
+        return jsonify(data=[_jsonable(r) for r in rows], missing=[i for i in ids if i not in found])
+
+    result = repo.page(db, request.args.get("q", "").strip(), request.args.get("cursor"), _limit(), fields)
+    return jsonify(data=[_jsonable(r) for r in result["rows"]], next=result["next"], prev=result["prev"])
+
+
+@api.route("/vehiculos/facetas", methods=["GET"])
+def vehiculos_facetas():
+    repo = repositories["vehiculos"]
+    seleccion = facets.parse(request.args)
+    db = get_read_db()
+    result = repo.page(db, "", request.args.get("cursor"), _limit(), _fields(repo), facets.where(seleccion))
+    return jsonify(data=[_jsonable(r) for r in result["rows"]], next=result["next"], prev=result["prev"],
+                   facetas=facets.counts(db.cursor(dictionary=True), seleccion))
+
+
+@api.route(f"/{ENTITIES}/<int:id>", methods=["GET"])
+def obtener(entity, id):
+    repo = repositories[entity]
+    row = repo.get(get_read_db(), id, _fields(repo))
+    if row is None:
+        raise ApiError("No encontrado", 404)
+    return jsonify(data=_jsonable(row))
+
+
+@api.route(f"/{ENTITIES}", methods=["POST"])
+def crear(entity):
+    repo = _writable(entity)
+    items = _items()
+    for item in items:
+        unknown = set(item) - set(repo.writable)
+        if unknown:
+            raise ApiError("Campos no editables: " + ", ".join(sorted(unknown)))
+    db = get_db()
+    with transaction(db, entity):
+        ids = repo.insert_many(db, items)
+    return jsonify(ids=ids), 201
+
+
+@api.route(f"/{ENTITIES}", methods=["PATCH"])
+def actualizar(entity):
+    repo = _writable(entity)
+    items = _items()
+    for item in items:
+        if "id" not in item:
+            raise ApiError("Cada elemento necesita su id")
+        unknown = set(item) - set(repo.writable) - {"id"}
+        if unknown or len(item) == 1:
+            raise ApiError("Campos no editables o vacíos en el id %s" % item["id"])
+    db = get_db()
+    with transaction(db, entity):
+        updated = repo.update_many(db, items)
+    return jsonify(updated=updated)
+
+
+@api.route(f"/{ENTITIES}", methods=["DELETE"])
+def eliminar(entity):
+    repo = _writable(entity)
+    body = request.get_json(silent=True) or {}
+    ids = _ids(body.get("ids") or [])
+    db = get_db()
+    with transaction(db, entity):
+        deleted = repo.delete_many(db, ids)
+    return jsonify(deleted=deleted)
+
+
+@api.route("/cambios", methods=["GET"])
+def cambios():
+    try:
+        after = max(0, int(request.args.get("after", 0)))
+        limit = min(MAX_LIMIT, max(1, int(request.args.get("limit", changes.CDC_BATCH))))
+        wait = min(changes.CDC_WAIT, max(0.0, float(request.args.get("wait", changes.CDC_WAIT))))
+    except ValueError:
+        raise ApiError("after, limit y wait deben ser números")
+    entidades = [e for e in request.args.get("entidades", "").split(",") if e]
+    unknown = [e for e in entidades if e not in changes.ENTITIES]
+    if unknown:
+        raise ApiError("Entidades desconocidas: " + ", ".join(unknown))
+    deadline = time.monotonic() + wait
+    while True:
+        # Read on the primary: a lagging replica would only delay the feed
+        data, after = changes.read(get_db(), after, entidades, limit)
+        if data or time.monotonic() >= deadline:
+            return jsonify(data=data, next=after)
+        # The pooled connection goes back while the request waits
+        close_db()
+        time.sleep(changes.CDC_POLL_INTERVAL)
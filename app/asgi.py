@@ -0,0 +1,320 @@
+"""Optional ASGI entry point: ``uvicorn app.asgi:application --workers N``.
+
+The list views, the CRUD of clientes and proveedores and the
+server-sent change feed (``/api/v1/cambios/stream``) run as coroutines over an
+aiomysql pool, so a slow query or an open stream no longer pins a thread.
+Every other route (auth, empleados, vehiculos, almacenes and ventas writes,
+import/export...) is still served by the Flask app in app.main through a WSGI bridge.
+"""
+import asyncio
+import json
+import os
+import time
+from functools import wraps
+
+import aiomysql
+import pymysql
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart, g, render_template, request, redirect, session, flash, make_response
+from quart.sessions import SessionInterface
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+from werkzeug.routing import RequestRedirect
+
+from app import changes, facets, metrics
+from app.db import DB_CONFIG, remember_write
+from app.auth import ACTIONS, ROLES_VERSION, session_data
+from app.cache import BUMP_SQL, CACHE_VERSION_TTL, lookups
+from app.main import app as flask_app
+from app.pagination import (
+    APPROX_COUNT_MIN, APPROX_COUNT_SQL, PER_PAGE, cached_count, count_sql, keyset_result, page_count, store_count,
+)
+from app.repository import in_batches, repositories
+
+class StoreSessionInterface(SessionInterface):
+    # Same store and cookie as the Flask half (app.sessions), so both share the session
+    def __init__(self, interface):
+        self.interface = interface
+
+    async def open_session(self, app, request):
+        return self.interface.load(request.cookies.get(self.get_cookie_name(app)))
+
+    async def save_session(self, app, session, response):
+        self.interface.write(self, app, session, response)
+
+
+quart_app = Quart(__name__)
+quart_app.secret_key = flask_app.secret_key
+quart_app.session_interface = StoreSessionInterface(flask_app.session_interface)
+
+
+@quart_app.before_serving
+async def open_pool():
+    quart_app.db_pool = await aiomysql.create_pool(
+        host=DB_CONFIG["host"],
+        user=DB_CONFIG["user"],
+        password=DB_CONFIG["password"],
+        db=DB_CONFIG["database"],
+        minsize=1,
+        maxsize=int(os.environ.get("DB_POOL_SIZE", 10)),
+        pool_recycle=float(os.environ.get("DB_POOL_MAX_IDLE", 300)),
+    )
+
+
+@quart_app.after_serving
+async def close_pool():
+    quart_app.db_pool.close()
+    await quart_app.db_pool.wait_closed()
+
+
+# Same per-route timing as the Flask half, into the same /metrics histograms
+@quart_app.before_request
+async def start_timer():
+    metrics.start_request(g)
+
+
+@quart_app.after_request
+async def record_request(response):
+    return metrics.end_request(g, request, response)
+
+
+async def fetch(sql, params=(), one=False):
+    async with quart_app.db_pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            start = time.perf_counter()
+            await cur.execute(sql, params)
+            metrics.observe_query(sql, time.perf_counter() - start)
+            return await (cur.fetchone() if one else cur.fetchall())
+
+
+async def execute(sql, params=(), bump=None, change=None):
+    # ``bump`` names the cache_versions row to invalidate in the same transaction;
+    # ``change`` is the (entity, operacion, id) to record in the cambios outbox,
+    # id None for the inserted row
+    async with quart_app.db_pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            if change and change[1] == "delete":
+                await record(cur, *change)
+            start = time.perf_counter()
+            await cur.execute(sql, params)
+            metrics.observe_query(sql, time.perf_counter() - start)
+            if change and change[1] != "delete":
+                await record(cur, change[0], change[1], change[2] or cur.lastrowid)
+            if bump:
+                await cur.execute(BUMP_SQL, (bump,))
+        await conn.commit()
+    # The session's next reads, on either half, must not go to a replica
+    # that hasn't applied this write yet
+    remember_write(session)
+    if bump:
+        lookups.forget(bump)
+
+
+async def record(cur, entity, operacion, id):
+    # Async twin of Repository.record for one row
+    batch = next(in_batches([id]))
+    await cur.execute(repositories[entity].change_sql(operacion, len(batch)), batch)
+
+
+async def count_rows(from_sql, where, params, table=None):
+    # Async twin of app.pagination.count_rows, sharing its cache
+    sql = count_sql(from_sql, where)
+    total = cached_count(sql, params)
+    if total is not None:
+        return total
+    if not where and table:
+        row = await fetch(APPROX_COUNT_SQL, (table,), one=True)
+        if row and row["cnt"] is not None and row["cnt"] >= APPROX_COUNT_MIN:
+            total = int(row["cnt"])
+    if total is None:
+        total = (await fetch(sql, tuple(params), one=True))["cnt"]
+    store_count(sql, params, total)
+    return total
+
+
+@quart_app.errorhandler(pymysql.err.IntegrityError)
+async def integrity_error(e):
+    # Duplicate DNI/correo or a row still referenced by ventas
+    await flash("No se pudo guardar: el registro está duplicado o tiene datos relacionados", "error")
+    return redirect(request.referrer or "/")
+
+
+# ---------------- AUTH ----------------
+_roles_version = {"value": None, "expires": 0.0}
+
+
+async def refresh_perms():
+    # Async twin of app.auth.current_perms: re-resolve sessions opened before a role change
+    now = time.monotonic()
+    if now >= _roles_version["expires"]:
+        row = await fetch("SELECT version FROM cache_versions WHERE name=%s", (ROLES_VERSION,), one=True)
+        _roles_version.update(value=row["version"] if row else 0, expires=now + CACHE_VERSION_TTL)
+    version = _roles_version["value"]
+    if session.get("perms_version") != version:
+        row = await fetch("SELECT nombre, role FROM empleados WHERE id=%s", (session["empleado_id"],), one=True)
+        if row is None:
+            session.clear()
+            return
+        session.update(session_data(session["empleado_id"], row["nombre"], row["role"] or 'empleado', version))
+
+
+def allowed(action):
+    return bool(session.get("perms", 0) & ACTIONS[action])
+
+
+@quart_app.context_processor
+async def inject_permissions():
+    return dict(has_permission=allowed)
+
+
+def requires(action):
+    def decorator(f):
+        @wraps(f)
+        async def wrapped(*args, **kwargs):
+            if "empleado_id" in session:
+                await refresh_perms()
+            if "empleado_id" not in session:
+                return redirect("/login")
+            if not allowed(action):
+                await flash("No autorizado", "error")
+                return redirect("/")
+            return await f(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+# ---------------- LISTADOS ----------------
+@quart_app.route("/<any(clientes, empleados, vehiculos, almacenes, proveedores, ventas):entity>")
+@requires('view')
+async def listado(entity):
+    repo = repositories[entity]
+    q = request.args.get('q', '').strip()
+    filters, context = None, {}
+    if entity == "vehiculos":
+        seleccion = facets.parse(request.args)
+        filters = facets.where(seleccion)
+        context = dict(seleccion=seleccion, query=facets.query_string(seleccion, q), facetas=None)
+    sql, page_params, state = repo.list_query(q, request.args.get('cursor'), filters=filters)
+    # COUNT (or the facet counts) and page query go out concurrently on two pooled connections
+    if entity == "vehiculos" and not q:
+        counts, rows = await asyncio.gather(fetch(*facets.counts_query(seleccion)), fetch(sql, page_params))
+        context["facetas"] = facets.counts_result(counts, seleccion)
+        total = context["facetas"]["total"]
+    else:
+        total, rows = await asyncio.gather(count_rows(*repo.count_query(q, filters)), fetch(sql, page_params))
+    result = keyset_result(rows, state, repo.order[1])
+    return await render_template(f"{entity}.html", page=result["page"], per_page=PER_PAGE, total=total,
+                                 pages=page_count(total), q=q, next_cursor=result["next"], prev_cursor=result["prev"],
+                                 **context, **{entity: result["rows"]})
+
+
+# ---------------- CRUD ----------------
+# Vehiculo and almacen writes keep their rollups in step (app.facets, app.inventory)
+# through app.repository, so they are left to Flask
+CRUD_ENTITIES = "<any(clientes, proveedores):entity>"
+
+
+@quart_app.route(f"/{CRUD_ENTITIES}/nuevo", methods=["GET", "POST"])
+@requires('add')
+async def nuevo(entity):
+    repo = repositories[entity]
+    if request.method == "POST":
+        values = repo.from_form(await request.form)
+        await execute(repo.insert_sql(tuple(values)), tuple(values.values()), bump=entity,
+                      change=(entity, "insert", None))
+        return redirect(f"/{entity}")
+    return await render_template(f"{entity}_form.html", **{repo.var: None})
+
+
+@quart_app.route(f"/{CRUD_ENTITIES}/editar/<int:id>", methods=["GET", "POST"])
+@requires('edit')
+async def editar(entity, id):
+    repo = repositories[entity]
+    if request.method == "POST":
+        values = repo.from_form(await request.form)
+        await execute(repo.update_sql(tuple(values)), tuple(values.values()) + (id,), bump=entity,
+                      change=(entity, "update", id))
+        return redirect(f"/{entity}")
+    row = await fetch(repo.get_sql(), (id,), one=True)
+    return await render_template(f"{entity}_form.html", **{repo.var: row})
+
+
+@quart_app.route(f"/{CRUD_ENTITIES}/eliminar/<int:id>")
+@requires('delete')
+async def eliminar(entity, id):
+    await execute(repositories[entity].delete_sql(), (id,), bump=entity, change=(entity, "delete", id))
+    return redirect(f"/{entity}")
+
+
+# ---------------- CAMBIOS ----------------
+@quart_app.route("/api/v1/cambios/stream")
+@requires('view')
+async def cambios_stream():
+    # Server-sent events over app.changes; EventSource resumes from Last-Event-ID on reconnect
+    try:
+        after = int(request.headers.get("Last-Event-ID") or request.args.get("after") or 0)
+    except ValueError:
+        return {"error": "after debe ser un entero"}, 400
+    entidades = [e for e in request.args.get("entidades", "").split(",") if e]
+    if any(e not in changes.ENTITIES for e in entidades):
+        return {"error": "Entidad desconocida"}, 400
+
+    async def events():
+        nonlocal after
+        idle = 0.0
+        while True:
+            async with quart_app.db_pool.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cur:
+                    # Same gap handling as app.changes.read
+                    await cur.execute(changes.READ_SQL, (after, changes.CDC_BATCH))
+                    rows = await cur.fetchall()
+                    confirmed = 0
+                    if changes.gap(rows, after):
+                        await cur.execute(changes.OPEN_SQL, (rows[0]["ahora"],))
+                        if not (await cur.fetchone())["n"]:
+                            confirmed = rows[-1]["id"]
+                            await conn.rollback()
+                            await cur.execute(changes.READ_SQL, (after, changes.CDC_BATCH))
+                            rows = await cur.fetchall()
+                # End the read snapshot, or the next poll would not see new commits
+                await conn.rollback()
+            data, after_next = changes.select(rows, after, entidades, confirmed)
+            for change in data:
+                yield (f"id: {change['offset']}\nevent: {change['entidad']}\n"
+                       f"data: {json.dumps(change, default=str)}\n\n").encode()
+            if after_next != after:
+                after, idle = after_next, 0.0
+                if not data:
+                    # Only filtered-out changes: move the resume point past them
+                    yield f"id: {after}\n\n".encode()
+                continue
+            idle += changes.CDC_POLL_INTERVAL
+            if idle >= changes.CDC_WAIT:
+                idle = 0.0
+                yield b": keepalive\n\n"
+            await asyncio.sleep(changes.CDC_POLL_INTERVAL)
+
+    response = await make_response(events(), {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    response.timeout = None
+    return response
+
+
+# ---------------- DISPATCH ----------------
+_flask = WsgiToAsgi(flask_app)
+_routes = quart_app.url_map.bind("localhost")
+
+
+def _is_async(scope):
+    try:
+        _routes.match(scope["path"], method=scope["method"])
+    except RequestRedirect:
+        return True
+    except (NotFound, MethodNotAllowed):
+        return False
+    return True
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and not _is_async(scope):
+        await _flask(scope, receive, send)
+        return
+    await quart_app(scope, receive, send)
@@ -0,0 +1,123 @@
+"""Compiled role permissions.
+
+A role is resolved once, when the session is opened, into an int bitmask kept
+in the session, so every check is a single AND. Role changes bump the
+``roles`` row of cache_versions; a session resolved under an older version
+re-reads its own empleado on its next request.
+"""
+from flask import g, session
+
+from app.cache import lookups
+from app.db import get_db
+
+VIEW, ADD, EDIT, DELETE = 1, 2, 4, 8
+ACTIONS = {"view": VIEW, "add": ADD, "edit": EDIT, "delete": DELETE}
+# Role membership bits, for checks like role_required('jefe', 'supervisor')
+JEFE, SUPERVISOR, EMPLEADO = 16, 32, 64
+ROLE_BITS = {"jefe": JEFE, "supervisor": SUPERVISOR, "empleado": EMPLEADO}
+# The jefe passes every check
+ALL = 0xFFFF
+
+ROLES_VERSION = "roles"
+
+ROLE_ALIASES = {
+    'admin': 'jefe',
+    'gerente': 'jefe',
+    'compras': 'supervisor',
+    'vendedor': 'empleado',
+    'almacenista': 'empleado',
+    'tecnico': 'empleado'
+}
+
+# Define permissions by action for the three roles
+permissions = {
+    'jefe': {'view': True, 'add': True, 'edit': True, 'delete': True},
+    'supervisor': {'view': True, 'add': True, 'edit': True, 'delete': False},
+    'empleado': {'view': True, 'add': True, 'edit': False, 'delete': False},
+}
+
+
+def normalize_role(role):
+    if not role:
+        return None
+    return ROLE_ALIASES.get(role, role)
+
+
+def _compile(role):
+    if role == 'jefe':
+        return ALL
+    mask = ROLE_BITS.get(role, 0)
+    for action, allowed in permissions.get(role, {}).items():
+        if allowed:
+            mask |= ACTIONS[action]
+    return mask
+
+
+ROLE_MASKS = {role: _compile(role) for role in permissions}
+
+
+def compile_role(role):
+    return ROLE_MASKS.get(normalize_role(role), 0)
+
+
+def roles_mask(*roles):
+    mask = 0
+    for role in roles:
+        mask |= ROLE_BITS.get(normalize_role(role), 0)
+    return mask
+
+
+def session_data(empleado_id, nombre, role, version):
+    role = normalize_role(role)
+    return {
+        "empleado_id": empleado_id,
+        "empleado_nombre": nombre,
+        "empleado_role": role,
+        "perms": compile_role(role),
+        "perms_version": version,
+    }
+
+
+def start_session(empleado_id, nombre, role):
+    session.update(session_data(empleado_id, nombre, role, lookups.version(get_db, ROLES_VERSION)))
+    g.pop("perms", None)
+
+
+def current_perms():
+    """Permission mask of the logged-in empleado (0 when logged out), memoized per request."""
+    perms = g.get("perms")
+    if perms is None:
+        if "empleado_id" in session:
+            version = lookups.version(get_db, ROLES_VERSION)
+            if session.get("perms_version") != version:
+                _refresh(version)
+        perms = g.perms = session.get("perms", 0)
+    return perms
+
+
+def _refresh(version):
+    cursor = get_db().cursor()
+    cursor.execute("SELECT nombre, role FROM empleados WHERE id=%s", (session["empleado_id"],))
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        # Deleted empleado: the session ends here
+        session.clear()
+        return
+    session.update(session_data(session["empleado_id"], row[0], row[1] or 'empleado', version))
+
+
+def can(action):
+    return bool(current_perms() & ACTIONS[action])
+
+
+def has_role(*roles):
+    return bool(current_perms() & roles_mask(*roles))
+
+
+def roles_changed(cursor):
+    """Call inside the ``transaction()`` that changes or removes an empleado's role.
+
+    Its commit makes this worker re-read cache_versions, and so the new roles version.
+    """
+    lookups.invalidate(cursor, ROLES_VERSION)
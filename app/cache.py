@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+CACHE_TTL = float(os.environ.get("CACHE_TTL", 300))
+# How long a worker trusts its snapshot of cache_versions before re-reading it;
+# this bounds how stale another worker's write can look here.
+CACHE_VERSION_TTL = float(os.environ.get("CACHE_VERSION_TTL", 1))
+
+BUMP_SQL = """
+    INSERT INTO cache_versions (name, version) VALUES (%s, 1)
+    ON DUPLICATE KEY UPDATE version = version + 1
+"""
+
+
+class VersionedCache:
+    """In-process cache for small derived lookups (counts, dropdown options).
+
+    Every entry depends on a named version row in ``cache_versions``. Writers
+    call ``invalidate`` inside their transaction, which bumps that row for all
+    workers, and ``forget`` once it has committed, which drops the local
+    entries (app.repository.transaction does both). Other workers notice the
+    new version within ``version_ttl`` seconds; ``ttl`` caps the age of any entry.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, version_ttl=CACHE_VERSION_TTL):
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self._entries = {}  # key -> (value, depends, version, expires)
+        self._versions = {}
+        self._versions_expire = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def _current_versions(self, db):
+        now = time.monotonic()
+        if now < self._versions_expire:
+            return self._versions
+        if callable(db):
+            # Lazily resolved connection: only checked out when the snapshot is stale
+            db = db()
+        cursor = db.cursor()
+        cursor.execute("SELECT name, version FROM cache_versions")
+        versions = dict(cursor.fetchall())
+        cursor.close()
+        with self._lock:
+            self._versions = versions
+            self._versions_expire = now + self.version_ttl
+        return versions
+
+    def version(self, db, name):
+        return self._current_versions(db).get(name, 0)
+
+    def get(self, db, key, loader, depends):
+        version = self._current_versions(db).get(depends, 0)
+        entry = self._entries.get(key)
+        if entry and entry[2] == version and entry[3] > time.monotonic():
+            with self._lock:
+                self.stats["hits"] += 1
+            return entry[0]
+        value = loader()
+        with self._lock:
+            self.stats["misses"] += 1
+            self._entries[key] = (value, depends, version, time.monotonic() + self.ttl)
+        return value
+
+    def invalidate(self, cursor, depends):
+        # Only the shared half: dropping the local entries before the commit
+        # would let a concurrent request re-cache the old rows meanwhile
+        cursor.execute(BUMP_SQL, (depends,))
+
+    def bump(self, db, *names):
+        """Invalidate ``names`` in a transaction of their own, after the data was committed."""
+        cursor = db.cursor()
+        for name in names:
+            self.invalidate(cursor, name)
+        db.commit()
+        cursor.close()
+        for name in names:
+            self.forget(name)
+
+    def forget(self, depends):
+        # Local half of invalidate, once the bump has committed
+        with self._lock:
+            self.stats["invalidations"] += 1
+            self._entries = {k: e for k, e in self._entries.items() if e[1] != depends}
+            # Force a re-read so this worker picks up its own bump immediately
+            self._versions_expire = 0.0
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self.stats)
+            data["entries"] = len(self._entries)
+        lookups = data["hits"] + data["misses"]
+        data["hit_ratio"] = data["hits"] / lookups if lookups else 0.0
+        return data
+
+
+lookups = VersionedCache()
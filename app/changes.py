@@ -0,0 +1,126 @@
+"""Change feed of the six entities, read from the ``cambios`` outbox.
+
+Every write to clientes, empleados, vehiculos, almacenes, proveedores or
+ventas inserts one cambios row per affected record in the same transaction
+(``Repository.record``): the entity, its id, the operation and the record as
+JSON, after an insert or update and before a delete. The row id is the feed
+offset, so a consumer keeps the last offset it processed and asks only for
+what came after it: ``/api/v1/cambios`` long-polls, and the ASGI app serves
+the same feed as server-sent events.
+
+Ids are handed out when a transaction inserts its rows, not when it commits,
+so id 11 can be visible while the transaction holding id 10 is still open.
+``settled`` stops in front of such a gap until it is resolved: once no
+transaction that started before the read can still be writing (see OPEN_SQL),
+the gap was rolled back or committed meanwhile, and a fresh read returns
+whatever filled it. Rows are never skipped for their age, so a long
+transaction (a big import batch, a bulk API write) only holds the feed back
+until it ends. Reading information_schema.innodb_trx needs the PROCESS
+privilege.
+"""
+import json
+import os
+from decimal import Decimal
+
+CDC_WAIT = float(os.environ.get("CDC_WAIT", 25))  # longest long-poll, seconds
+CDC_POLL_INTERVAL = float(os.environ.get("CDC_POLL_INTERVAL", 0.5))
+CDC_BATCH = 500
+ENTITIES = ("clientes", "empleados", "vehiculos", "almacenes", "proveedores", "ventas")
+
+READ_SQL = """
+    SELECT id, entidad, entidad_id, operacion, datos, creado, NOW(6) AS ahora FROM cambios
+    WHERE id > %s ORDER BY id LIMIT %s
+"""
+
+
+# Other transactions that started before the read (``ahora``) and may still
+# insert into cambios: any that holds a lock, has written or is running a
+# statement. Idle read snapshots (pooled connections) don't count.
+OPEN_SQL = """
+    SELECT COUNT(*) AS n FROM information_schema.innodb_trx
+    WHERE trx_mysql_thread_id <> CONNECTION_ID() AND trx_started < %s
+        AND (trx_lock_structs > 0 OR trx_rows_modified > 0 OR trx_query IS NOT NULL)
+"""
+
+
+def settled(rows, after, confirmed=0):
+    """The leading ``rows`` (in id order, after offset ``after``) no open transaction can precede.
+
+    Missing ids below ``confirmed`` are known to be resolved (see ``read``).
+    """
+    out = []
+    expected = after + 1
+    for row in rows:
+        if row["id"] != expected and row["id"] > confirmed:
+            break
+        out.append(row)
+        expected = row["id"] + 1
+    return out
+
+
+def decode(row):
+    datos = row["datos"]
+    if isinstance(datos, (bytes, bytearray)):
+        datos = datos.decode()
+    return {
+        "offset": row["id"],
+        "entidad": row["entidad"],
+        "id": row["entidad_id"],
+        "operacion": row["operacion"],
+        # Decimals stay exact, and serialize as strings like the rest of the API
+        "datos": json.loads(datos, parse_float=Decimal) if datos else None,
+        "creado": row["creado"].isoformat(),
+    }
+
+
+def gap(rows, after):
+    """Whether a missing id holds back some of the READ_SQL ``rows``."""
+    return len(settled(rows, after)) < len(rows)
+
+
+def select(rows, after, entidades=None, confirmed=0):
+    """``(changes, next_offset)`` from the READ_SQL ``rows`` read after ``after``."""
+    rows = settled(rows, after, confirmed)
+    next_offset = rows[-1]["id"] if rows else after
+    return [decode(r) for r in rows if not entidades or r["entidad"] in entidades], next_offset
+
+
+def read(db, after, entidades=None, limit=CDC_BATCH):
+    """Settled changes after offset ``after``, only those of ``entidades`` when given.
+
+    ``next_offset`` moves past filtered-out changes too, so resume from it.
+    A transaction holding a missing id allocated it before the rows after it
+    were committed, so before the read: if none of those is open any more,
+    every gap below the last row read is resolved, and a new snapshot shows
+    the ones that were committed.
+    """
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute(READ_SQL, (after, limit))
+        rows = cursor.fetchall()
+        confirmed = 0
+        if gap(rows, after):
+            cursor.execute(OPEN_SQL, (rows[0]["ahora"],))
+            if not cursor.fetchone()["n"]:
+                confirmed = rows[-1]["id"]
+                db.commit()
+                cursor.execute(READ_SQL, (after, limit))
+                rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    return select(rows, after, entidades, confirmed)
+
+
+def purge(db, days, batch=10000):
+    """Delete changes older than ``days``; returns how many."""
+    cursor = db.cursor()
+    deleted = 0
+    while True:
+        cursor.execute("DELETE FROM cambios WHERE creado < NOW() - INTERVAL %s DAY ORDER BY id LIMIT %s",
+                       (days, batch))
+        db.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch:
+            break
+    cursor.close()
+    return deleted
@@ -1,9 +1,391 @@
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
 import mysql.connector
+from flask import g, has_request_context, session
+
+from app import metrics
+
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "localhost"),
+    "user": os.environ.get("DB_USER", "root"),
+    "password": os.environ.get("DB_PASSWORD", ""),
+    "database": os.environ.get("DB_NAME", "erp_toyota"),
+}
+
+
+# Read replicas as "host[:port],host[:port]" (same user, password and database)
+DB_REPLICAS = [r.strip() for r in os.environ.get("DB_REPLICAS", "").split(",") if r.strip()]
+DB_REPLICA_POLICY = os.environ.get("DB_REPLICA_POLICY", "least_connections")  # or round_robin
+DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", 5))
+DB_REPLICA_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", 5))
+DB_REPLICA_CHECK_TIMEOUT = int(os.environ.get("DB_REPLICA_CHECK_TIMEOUT", 1))
+# Seconds after a commit during which the same session reads from the primary
+DB_READ_STICKY = float(os.environ.get("DB_READ_STICKY", 10))
+READ_PRIMARY_UNTIL = "_read_primary_until"
+
+
+def connect(**overrides):
+    # Raw, unpooled connection (scripts and one-off maintenance tasks)
+    return mysql.connector.connect(**dict(DB_CONFIG, **overrides))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections.
+
+    Connections are opened lazily up to ``size``; when all of them are in use
+    callers wait up to ``timeout`` seconds for one to be released. Idle
+    connections are pinged before being handed out again and closed once they
+    have been idle for more than ``max_idle`` seconds.
+    """
+
+    def __init__(self, size=10, timeout=5.0, max_idle=300.0, ping_after=1.0, factory=connect):
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self._factory = factory
+        self._idle = deque()  # (conn, released_at), most recently used on the right
+        self._open = 0
+        self._cond = threading.Condition()
+        self.stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "evicted": 0,
+        }
+
+    def acquire(self):
+        start = time.monotonic()
+        waited = False
+        conn = None
+        idle_for = 0.0
+        timed_out = False
+        stale = []
+        with self._cond:
+            while True:
+                stale.extend(self._take_stale())
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    idle_for = time.monotonic() - released_at
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    break
+                waited = True
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    self.stats["timeouts"] += 1
+                    timed_out = True
+                    break
+                self._cond.wait(remaining)
+        self._close_all(stale)
+        if timed_out:
+            raise PoolTimeout("No hay conexiones libres en el pool (size=%d)" % self.size)
+
+        # Health check on checkout: only connections that sat idle for a while
+        # get a round-trip ping, hot connections are handed out directly.
+        if conn is not None and idle_for >= self.ping_after and not self._is_healthy(conn):
+            # The slot stays reserved and is refilled with a fresh connection below
+            self._close_all([conn])
+            with self._cond:
+                self.stats["discarded"] += 1
+            conn = None
+        if conn is None:
+            try:
+                conn = self._factory()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self.stats["created"] += 1
+
+        with self._cond:
+            self.stats["checkouts"] += 1
+            if waited:
+                self.stats["waits"] += 1
+                self.stats["wait_time"] += time.monotonic() - start
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.unread_result:
+                conn.consume_results()
+            # Never hand out a connection with a half-finished transaction
+            conn.rollback()
+        except Exception:
+            self.discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, conn):
+        self._close_all([conn])
+        with self._cond:
+            self._open -= 1
+            self.stats["discarded"] += 1
+            self._cond.notify()
+
+    @property
+    def in_use(self):
+        return self._open - len(self._idle)
+
+    def metrics(self):
+        with self._cond:
+            data = dict(self.stats)
+            data.update(size=self.size, open=self._open, idle=len(self._idle), in_use=self._open - len(self._idle))
+        data["avg_wait"] = data["wait_time"] / data["waits"] if data["waits"] else 0.0
+        return data
+
+    def _take_stale(self):
+        # Called with the lock held; oldest idle connections sit on the left
+        stale = []
+        cutoff = time.monotonic() - self.max_idle
+        while self._idle and self._idle[0][1] < cutoff:
+            stale.append(self._idle.popleft()[0])
+            self._open -= 1
+            self.stats["evicted"] += 1
+        return stale
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_all(conns):
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+class Replica:
+    """One read replica: its own pool plus the last health and lag reading."""
+
+    def __init__(self, address, size, timeout, max_idle):
+        host, _, port = address.partition(":")
+        self.name = address
+        self.config = {"host": host, "port": int(port or 3306)}
+        self.pool = ConnectionPool(size=size, timeout=timeout, max_idle=max_idle, factory=lambda: connect(**self.config))
+        self.healthy = True
+        self.lag = None
+        self.error = None
+        self._monitor = None
+
+    def check(self, max_lag):
+        try:
+            if self._monitor is None:
+                self._monitor = connect(connection_timeout=DB_REPLICA_CHECK_TIMEOUT, **self.config)
+            self.lag = self._read_lag(self._monitor)
+        except Exception as e:
+            ConnectionPool._close_all([self._monitor] if self._monitor else [])
+            self._monitor = None
+            self.healthy, self.lag, self.error = False, None, str(e)
+            return
+        # Seconds_Behind_Source is NULL while replication is stopped
+        self.healthy = self.lag is not None and self.lag <= max_lag
+        self.error = None if self.healthy else "replicación parada o con retraso"
+
+    @staticmethod
+    def _read_lag(conn):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except mysql.connector.ProgrammingError:
+                # MySQL before 8.0.22
+                cursor.execute("SHOW SLAVE STATUS")
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        if not rows:
+            # Not replicating at all (a read-only copy): nothing to lag behind
+            return 0.0
+        lag = rows[0].get("Seconds_Behind_Source", rows[0].get("Seconds_Behind_Master"))
+        return None if lag is None else float(lag)
+
+
+class ReplicaSet:
+    """Read replicas with lazy health checks and least-connections or round-robin choice.
+
+    At most one thread per process re-checks the replicas, once every
+    ``check_interval`` seconds; the others keep using the last readings.
+    Replicas that are down or more than ``max_lag`` seconds behind are skipped.
+    """
+
+    def __init__(self, addresses, policy=DB_REPLICA_POLICY, max_lag=DB_REPLICA_MAX_LAG,
+                 check_interval=DB_REPLICA_CHECK_INTERVAL, size=10, timeout=5.0, max_idle=300.0):
+        self.replicas = [Replica(a, size, timeout, max_idle) for a in addresses]
+        self.policy = policy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._turn = itertools.count()
+        self._checked_at = 0.0
+        self._checking = threading.Lock()
+        self._lock = threading.Lock()
+        self.stats = {"replica_reads": 0, "primary_reads": 0, "fallbacks": 0}
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def check(self):
+        if not self._checking.acquire(blocking=False):
+            return
+        try:
+            for replica in self.replicas:
+                replica.check(self.max_lag)
+            self._checked_at = time.monotonic()
+        finally:
+            self._checking.release()
+
+    def choose(self):
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.check()
+        live = [r for r in self.replicas if r.healthy]
+        if not live:
+            return None
+        if self.policy == "round_robin":
+            return live[next(self._turn) % len(live)]
+        return min(live, key=lambda r: r.pool.in_use)
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self.stats)
+        data["replicas"] = {
+            r.name: dict(r.pool.metrics(), healthy=int(r.healthy), lag=r.lag, error=r.error) for r in self.replicas
+        }
+        return data
+
+
+pool = ConnectionPool(
+    size=int(os.environ.get("DB_POOL_SIZE", 10)),
+    timeout=float(os.environ.get("DB_POOL_TIMEOUT", 5)),
+    max_idle=float(os.environ.get("DB_POOL_MAX_IDLE", 300)),
+)
+replicas = ReplicaSet(
+    DB_REPLICAS,
+    size=pool.size,
+    timeout=pool.timeout,
+    max_idle=pool.max_idle,
+)
+
+
+class PrimaryConnection(metrics.InstrumentedConnection):
+    """The request's primary connection; a commit opens the session's read-your-writes window."""
+
+    def commit(self):
+        self.raw.commit()
+        g.db_committed = True
+
 
 def get_db():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="",
-        database="erp_toyota"
-    )
+    # One pooled connection per request, returned to the pool on teardown
+    if "db" not in g:
+        start = time.perf_counter()
+        conn = pool.acquire()
+        metrics.connect_seconds.observe((), time.perf_counter() - start)
+        g.db = PrimaryConnection(conn)
+    return g.db
+
+
+def get_read_db():
+    """Connection for read-only handlers: a healthy replica, else the primary.
+
+    Sessions that committed in the last DB_READ_STICKY seconds read from the
+    primary so they see their own writes.
+    """
+    if "read_db" not in g:
+        g.read_db = _replica_db() or get_db()
+    return g.read_db
+
+
+def _replica_db():
+    if not replicas:
+        return None
+    if has_request_context() and session.get(READ_PRIMARY_UNTIL, 0) > time.time():
+        replicas.count("primary_reads")
+        return None
+    replica = replicas.choose()
+    if replica is None:
+        replicas.count("fallbacks")
+        return None
+    start = time.perf_counter()
+    try:
+        conn = replica.pool.acquire()
+    except PoolTimeout:
+        replicas.count("fallbacks")
+        return None
+    except Exception as e:
+        # Down since the last check: skip it until the next one says otherwise
+        replica.healthy, replica.error = False, str(e)
+        replicas.count("fallbacks")
+        return None
+    metrics.connect_seconds.observe((), time.perf_counter() - start)
+    replicas.count("replica_reads")
+    g.read_replica = replica
+    return metrics.InstrumentedConnection(conn)
+
+
+def reading_replica():
+    return g.get("read_replica") is not None
+
+
+def use_primary():
+    """Serve the rest of this request's reads from the primary (the replica is behind)."""
+    replica = g.pop("read_replica", None)
+    read_db = g.pop("read_db", None)
+    if replica is not None:
+        replica.pool.release(read_db.raw)
+        replicas.count("fallbacks")
+    g.read_db = get_db()
+
+
+def close_db(e=None):
+    replica = g.pop("read_replica", None)
+    read_db = g.pop("read_db", None)
+    if replica is not None:
+        replica.pool.release(read_db.raw)
+    db = g.pop("db", None)
+    if db is not None:
+        pool.release(db.raw)
+
+
+def remember_write(session):
+    """Open ``session``'s read-your-writes window: its reads use the primary for DB_READ_STICKY seconds.
+
+    Called after a commit by the Flask half (below) and the ASGI half (app.asgi).
+    """
+    if replicas:
+        session[READ_PRIMARY_UNTIL] = time.time() + DB_READ_STICKY
+
+
+def init_app(app):
+    @app.after_request
+    def remember_commit(response):
+        if g.pop("db_committed", False):
+            remember_write(session)
+        return response
+
+    app.teardown_appcontext(close_db)
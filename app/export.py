@@ -0,0 +1,50 @@
+import csv
+import io
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+def stream_rows(db, sql, params):
+    # The default mysql-connector cursor is unbuffered: rows are read off the
+    # socket as we iterate, so only one row is held in memory at a time.
+    cursor = db.cursor()
+    try:
+        cursor.execute(sql, tuple(params))
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+
+
+def csv_chunks(header, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= CHUNK_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def xlsx_chunks(header, rows):
+    # openpyxl's write-only mode spools rows to disk instead of building the
+    # whole workbook in memory; the finished file is then streamed back.
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(header)
+    for row in rows:
+        ws.append(list(row))
+    with tempfile.TemporaryFile() as f:
+        wb.save(f)
+        f.seek(0)
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
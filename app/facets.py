@@ -0,0 +1,176 @@
+"""Faceted browsing of vehiculos by tipo, anio range, color and price band.
+
+The counts next to every option come from vehiculos_facetas: how many
+vehiculos share each (tipo, anio, color, banda_precio) combination. A large
+catalog collapses to a few thousand combinations, so the counts of all four
+facets for any selection are a single UNION ALL over that table instead of
+four GROUP BYs over vehiculos. Vehiculo writes through app.repository keep
+it up to date inside their own transaction (``vehiculos_changed``);
+``backfill`` rebuilds it.
+
+Each facet's counts apply the selection of the other three, so picking a
+tipo still shows how many vehiculos every other tipo would add.
+"""
+from collections import Counter
+from urllib.parse import urlencode
+
+# Upper bounds of the price bands; they must match banda_precio in migration 012
+PRICE_BANDS = [20000, 35000, 50000, 80000]
+LISTS = ("tipo", "color", "banda_precio")
+# Vehiculo columns the counts read, fetched (and locked) around every write
+COLUMNS = ["id", "tipo", "anio", "color", "banda_precio"]
+
+APPLY_SQL = """
+    INSERT INTO vehiculos_facetas (tipo, anio, color, banda_precio, num_vehiculos) VALUES (%s,%s,%s,%s,%s)
+    ON DUPLICATE KEY UPDATE num_vehiculos = num_vehiculos + VALUES(num_vehiculos)
+"""
+
+
+def band_label(band):
+    if band == 0:
+        return f"< {PRICE_BANDS[0]:,}".replace(",", ".")
+    if band == len(PRICE_BANDS):
+        return f">= {PRICE_BANDS[-1]:,}".replace(",", ".")
+    return f"{PRICE_BANDS[band - 1]:,} - {PRICE_BANDS[band]:,}".replace(",", ".")
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse(args):
+    """Selection from the query string: lists of tipo/color/banda_precio and an anio range."""
+    bands = {_int(b) for b in args.getlist("banda_precio")}
+    return {
+        "tipo": sorted({t for t in args.getlist("tipo") if t}),
+        "color": sorted({c for c in args.getlist("color") if c}),
+        "banda_precio": sorted(b for b in bands if b is not None and 0 <= b <= len(PRICE_BANDS)),
+        "anio_desde": _int(args.get("anio_desde")),
+        "anio_hasta": _int(args.get("anio_hasta")),
+    }
+
+
+def active(seleccion):
+    return (any(seleccion[k] for k in LISTS)
+            or seleccion["anio_desde"] is not None or seleccion["anio_hasta"] is not None)
+
+
+def query_string(seleccion, q=""):
+    """The selection (and search) as query-string arguments, for pagination links."""
+    args = [(k, v) for k in LISTS for v in seleccion[k]]
+    args += [(k, seleccion[k]) for k in ("anio_desde", "anio_hasta") if seleccion[k] is not None]
+    if q:
+        args.append(("q", q))
+    return urlencode(args)
+
+
+def where(seleccion, skip=None, facet_table=False):
+    """``(where, params)`` of the selection, without the ``skip`` facet.
+
+    Valid both on vehiculos (list and keyset page) and, with ``facet_table``,
+    on vehiculos_facetas, where a NULL anio is stored as 0: an anio bound
+    leaves those out there too, as it does on vehiculos.
+    """
+    conds, params = [], []
+    for col in LISTS:
+        if col != skip and seleccion[col]:
+            conds.append(f"{col} IN ({','.join(['%s'] * len(seleccion[col]))})")
+            params += seleccion[col]
+    if skip != "anio":
+        if facet_table and (seleccion["anio_desde"] is not None or seleccion["anio_hasta"] is not None):
+            conds.append("anio >= 1")
+        if seleccion["anio_desde"] is not None:
+            conds.append("anio >= %s")
+            params.append(seleccion["anio_desde"])
+        if seleccion["anio_hasta"] is not None:
+            conds.append("anio <= %s")
+            params.append(seleccion["anio_hasta"])
+    return " AND ".join(conds), params
+
+
+def counts_query(seleccion):
+    """``(sql, params)`` of the counts of every facet and the total, one UNION ALL."""
+    branches, params = [], []
+    for facet in LISTS + ("anio",):
+        cond, cond_params = where(seleccion, skip=facet, facet_table=True)
+        branches.append(f"""
+            SELECT '{facet}' AS faceta, CAST({facet} AS CHAR) AS valor, SUM(num_vehiculos) AS n
+            FROM vehiculos_facetas{' WHERE ' + cond if cond else ''} GROUP BY {facet} HAVING n > 0""")
+        params += cond_params
+    cond, cond_params = where(seleccion, facet_table=True)
+    branches.append(f"""
+        SELECT 'total' AS faceta, '' AS valor, COALESCE(SUM(num_vehiculos), 0) AS n
+        FROM vehiculos_facetas{' WHERE ' + cond if cond else ''}""")
+    params += cond_params
+    return " UNION ALL ".join(branches), tuple(params)
+
+
+def counts_result(rows, seleccion):
+    """Options with their counts for every facet, and the ``total`` matching the whole selection.
+
+    Options for a missing tipo, color, anio or price are left out; those
+    vehiculos still count in the total.
+    """
+    result = {facet: [] for facet in LISTS + ("anio",)}
+    total = 0
+    for row in rows:
+        facet, valor, n = row["faceta"], row["valor"], int(row["n"])
+        if facet == "total":
+            total = n
+            continue
+        if facet in ("anio", "banda_precio"):
+            valor = int(valor)
+            if valor < (1 if facet == "anio" else 0):
+                continue
+        elif not valor:
+            continue
+        option = {"valor": valor, "n": n, "activo": facet in LISTS and valor in seleccion[facet]}
+        if facet == "banda_precio":
+            option["etiqueta"] = band_label(valor)
+        result[facet].append(option)
+    for facet, options in result.items():
+        options.sort(key=lambda o: o["valor"])
+    result["total"] = total
+    return result
+
+
+def counts(cursor, seleccion):
+    """``counts_result`` of the selection, on a dictionary cursor."""
+    cursor.execute(*counts_query(seleccion))
+    return counts_result(cursor.fetchall(), seleccion)
+
+
+def _key(row):
+    return (row["tipo"] or "", row["anio"] or 0, row["color"] or "",
+            -1 if row["banda_precio"] is None else row["banda_precio"])
+
+
+def vehiculos_changed(cursor, old_rows, new_rows):
+    """Apply a vehiculo write: ``old_rows``/``new_rows`` are the COLUMNS dicts before and after it."""
+    deltas = Counter()
+    for row in old_rows:
+        deltas[_key(row)] -= 1
+    for row in new_rows:
+        deltas[_key(row)] += 1
+    # Always in key order, so concurrent writes lock the combinations alike
+    for key in sorted(k for k, n in deltas.items() if n):
+        cursor.execute(APPLY_SQL, key + (deltas[key],))
+
+
+def backfill(db):
+    """Rebuild vehiculos_facetas from the vehiculos table."""
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM vehiculos_facetas")
+    cursor.execute("""
+        INSERT INTO vehiculos_facetas (tipo, anio, color, banda_precio, num_vehiculos)
+        SELECT COALESCE(tipo, ''), COALESCE(anio, 0), COALESCE(color, ''), COALESCE(banda_precio, -1), COUNT(*)
+        FROM vehiculos
+        GROUP BY COALESCE(tipo, ''), COALESCE(anio, 0), COALESCE(color, ''), COALESCE(banda_precio, -1)
+    """)
+    rows = cursor.rowcount
+    db.commit()
+    cursor.close()
+    return rows
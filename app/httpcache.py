@@ -0,0 +1,112 @@
+"""Conditional GETs and a rendered-page cache for the list views.
+
+A list page is a function of the versions of the tables it reads (the
+``cache_versions`` rows bumped by every write), the URL and who is looking at
+it (permissions decide the action buttons, the header shows the name). That
+key gives a weak ETag, so an unchanged page is a 304 without touching MySQL,
+and indexes an LRU of rendered HTML shared by every user with the same key.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request, session
+
+from app.auth import current_perms
+from app.cache import lookups
+from app.db import get_db, get_read_db, reading_replica, use_primary
+
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", 512))
+
+
+class PageCache:
+    def __init__(self, size=PAGE_CACHE_SIZE):
+        self.size = size
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def get(self, key):
+        with self._lock:
+            body = self._pages.get(key)
+            if body is None:
+                self.stats["misses"] += 1
+                return None
+            self._pages.move_to_end(key)
+            self.stats["hits"] += 1
+            return body
+
+    def put(self, key, body):
+        with self._lock:
+            self._pages[key] = body
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.size:
+                self._pages.popitem(last=False)
+
+    def not_modified(self):
+        with self._lock:
+            self.stats["not_modified"] += 1
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self.stats)
+            data["entries"] = len(self._pages)
+        served = data["hits"] + data["misses"]
+        data["hit_ratio"] = data["hits"] / served if served else 0.0
+        return data
+
+
+pages = PageCache()
+
+
+def _replica_caught_up(tables, versions):
+    # A replica that has not applied the latest writes to these tables would
+    # render (and cache) old rows under the new key: read from the primary then
+    db = get_read_db()
+    if not reading_replica():
+        return
+    cursor = db.cursor()
+    cursor.execute(f"SELECT name, version FROM cache_versions WHERE name IN ({', '.join(['%s'] * len(tables))})", tables)
+    applied = dict(cursor.fetchall())
+    cursor.close()
+    if any(applied.get(t, 0) < v for t, v in zip(tables, versions)):
+        use_primary()
+
+
+def cached_page(*tables):
+    """Serve a GET list view with an ETag and from the page cache.
+
+    ``tables`` are the cache_versions names the page depends on. Requests
+    with pending flash messages bypass the cache, since those are rendered
+    into the page once. A page is only rendered from a read replica that
+    has caught up with those versions.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            if request.method != "GET" or "_flashes" in session:
+                return f(*args, **kwargs)
+            versions = tuple(lookups.version(get_db, t) for t in tables)
+            key = (request.endpoint, request.full_path, current_perms(), session.get("empleado_nombre"), versions)
+            etag = hashlib.sha1(repr(key).encode()).hexdigest()[:24]
+            if request.if_none_match.contains_weak(etag):
+                pages.not_modified()
+                response = make_response("", 304)
+            else:
+                body = pages.get(key)
+                if body is None:
+                    _replica_caught_up(tables, versions)
+                    body = f(*args, **kwargs)
+                    if not isinstance(body, str):
+                        # Redirects and error responses are never cached
+                        return body
+                    pages.put(key, body)
+                response = make_response(body)
+            response.set_etag(etag, weak=True)
+            # Browsers keep the page but must revalidate it on every visit
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,165 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+import mysql.connector
+
+from app.cache import lookups
+from app.repository import repositories
+
+BATCH_SIZE = 1000
+
+# Columns accepted per entity, in insert order. Header aliases match the
+# names used by the HTML forms.
+IMPORT_COLUMNS = {entity: repositories[entity].writable for entity in ("clientes", "proveedores", "vehiculos")}
+HEADER_ALIASES = {"precio": "precio_venta", "costo": "costo_fabricante"}
+REQUIRED = {"clientes": ["nombre"], "proveedores": ["nombre"], "vehiculos": ["modelo"]}
+UNIQUE = {"clientes": "dni", "proveedores": "dni"}
+
+
+class CSVImportError(Exception):
+    pass
+
+
+def _clean_row(entity, raw):
+    row = {}
+    for col in IMPORT_COLUMNS[entity]:
+        value = (raw.get(col) or "").strip()
+        row[col] = value or None
+    for col in REQUIRED[entity]:
+        if not row[col]:
+            raise ValueError(f"Falta el campo {col}")
+    if row.get("correo") and "@" not in row["correo"]:
+        raise ValueError("Correo no válido")
+    if entity == "vehiculos":
+        try:
+            if row["anio"] is not None:
+                row["anio"] = int(row["anio"])
+            for col in ("precio_venta", "costo_fabricante"):
+                if row[col] is not None:
+                    row[col] = Decimal(row[col])
+        except (ValueError, InvalidOperation):
+            raise ValueError("Año o precio no numérico")
+    return row
+
+
+def _existing_keys(cursor, entity, keys):
+    col = UNIQUE[entity]
+    placeholders = ",".join(["%s"] * len(keys))
+    cursor.execute(f"SELECT {col} FROM {entity} WHERE {col} IN ({placeholders})", tuple(keys))
+    return {r[0] for r in cursor.fetchall()}
+
+
+def _id_step(cursor):
+    cursor.execute("SELECT @@auto_increment_increment")
+    return cursor.fetchone()[0]
+
+
+def _flush(db, entity, batch, errors, step):
+    """Insert one batch as a single multi-row INSERT, record it (cambios, facet counts) and commit it.
+
+    One INSERT ... VALUES (...),(...) is a "simple insert": InnoDB reserves
+    all its ids at once in every innodb_autoinc_lock_mode, so they run from
+    ``lastrowid`` in steps of @@auto_increment_increment (``step``).
+    """
+    columns = IMPORT_COLUMNS[entity]
+    cursor = db.cursor()
+    unique = UNIQUE.get(entity)
+    if unique:
+        keys = [row[unique] for _, row in batch if row[unique]]
+        taken = _existing_keys(cursor, entity, keys) if keys else set()
+        kept = []
+        for line, row in batch:
+            if row[unique] in taken:
+                errors.append((line, f"{unique.upper()} duplicado: {row[unique]}"))
+            else:
+                kept.append((line, row))
+        batch = kept
+    if not batch:
+        cursor.close()
+        return 0
+
+    repo = repositories[entity]
+    sql = repo.insert_sql(tuple(columns))
+    values = [tuple(row[c] for c in columns) for _, row in batch]
+    # Built by hand rather than left to executemany, so it is one statement
+    # whatever the cursor class
+    head, _, row_placeholders = sql.partition(" VALUES ")
+    try:
+        cursor.execute(f"{head} VALUES {','.join([row_placeholders] * len(values))}",
+                       tuple(v for params in values for v in params))
+        ids = list(range(cursor.lastrowid, cursor.lastrowid + len(values) * step, step))
+        repo.record(cursor, "insert", ids)
+        repo.written(db, [], ids)
+        db.commit()
+        cursor.close()
+        return len(batch)
+    except mysql.connector.Error:
+        # A conflict slipped in between the check and the insert: retry
+        # row by row so only the offending rows are reported.
+        db.rollback()
+    ids = []
+    for (line, _), params in zip(batch, values):
+        try:
+            cursor.execute(sql, params)
+            ids.append(cursor.lastrowid)
+        except mysql.connector.Error as e:
+            errors.append((line, e.msg))
+    repo.record(cursor, "insert", ids)
+    repo.written(db, [], ids)
+    db.commit()
+    cursor.close()
+    return len(ids)
+
+
+def import_csv(db, entity, stream, batch_size=BATCH_SIZE, progress=None):
+    """Stream ``stream`` (text CSV with a header row) into ``entity``.
+
+    Rows are validated one by one and written in batches of ``batch_size``,
+    one transaction per batch. ``progress(processed, inserted)`` is called
+    after every batch. Returns ``{"processed", "inserted", "errors"}`` where
+    ``errors`` holds ``(line, message)`` pairs.
+    """
+    if entity not in IMPORT_COLUMNS:
+        raise CSVImportError(f"Importación no soportada para {entity}")
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames:
+        raise CSVImportError("El archivo está vacío")
+    reader.fieldnames = [HEADER_ALIASES.get(h.strip().lower(), h.strip().lower()) for h in reader.fieldnames]
+    missing = [c for c in REQUIRED[entity] if c not in reader.fieldnames]
+    if missing:
+        raise CSVImportError("Faltan columnas: " + ", ".join(missing))
+
+    cursor = db.cursor()
+    step = _id_step(cursor)
+    cursor.close()
+    unique = UNIQUE.get(entity)
+    seen = set()
+    batch, errors = [], []
+    processed = inserted = 0
+    for raw in reader:
+        processed += 1
+        line = reader.line_num
+        try:
+            row = _clean_row(entity, raw)
+        except ValueError as e:
+            errors.append((line, str(e)))
+            continue
+        if unique and row[unique]:
+            if row[unique] in seen:
+                errors.append((line, f"{unique.upper()} repetido en el archivo: {row[unique]}"))
+                continue
+            seen.add(row[unique])
+        batch.append((line, row))
+        if len(batch) >= batch_size:
+            inserted += _flush(db, entity, batch, errors, step)
+            batch = []
+            if progress:
+                progress(processed, inserted)
+    if batch:
+        inserted += _flush(db, entity, batch, errors, step)
+    if progress:
+        progress(processed, inserted)
+    if inserted:
+        lookups.bump(db, entity)
+    errors.sort()
+    return {"processed": processed, "inserted": inserted, "errors": errors}
@@ -0,0 +1,189 @@
+"""Inventory rollup over almacenes, kept in inventario_resumen and alertas_stock.
+
+Every almacen counts towards three inventario_resumen rows: the fleet total,
+its tipo_almacen and its ubicacion (capacity, stock and how many of them are
+low on stock), so any of those figures is a primary-key read. alertas_stock
+holds the almacenes at or below LOW_STOCK_RATIO of their capacity.
+
+Almacen writes made through app.repository apply their delta inside their
+own transaction (``almacenes_changed``), and so do sales, once they have
+moved the stock (``stock_moved``), so the rollup can't drift from
+almacenes.disponible. Each rollup row is split over INVENTORY_SLOTS rows
+(migration 014) and every transaction adds its delta to one of them at
+random, so concurrent sales rarely wait on each other's total row; reads sum
+the slots. ``backfill`` rebuilds both tables from scratch.
+
+Lock order, shared by every write path: almacenes rows by id, then their
+alertas_stock rows by almacen_id, then the rollup rows by (dimension, valor).
+"""
+import os
+import random
+from collections import defaultdict
+
+LOW_STOCK_RATIO = float(os.environ.get("LOW_STOCK_RATIO", 0.1))
+INVENTORY_SLOTS = int(os.environ.get("INVENTORY_SLOTS", 8))
+# Almacen columns the rollup reads, fetched (and locked) around every write
+COLUMNS = ["id", "tipo_almacen", "ubicacion", "capacidad", "disponible"]
+MAX_ALERTS = 200
+
+APPLY_SQL = """
+    INSERT INTO inventario_resumen (dimension, valor, slot, num_almacenes, capacidad, disponible, bajo_stock)
+    VALUES (%s,%s,%s,%s,%s,%s,%s)
+    ON DUPLICATE KEY UPDATE num_almacenes = num_almacenes + VALUES(num_almacenes),
+        capacidad = capacidad + VALUES(capacidad), disponible = disponible + VALUES(disponible),
+        bajo_stock = bajo_stock + VALUES(bajo_stock)
+"""
+FIGURES = ("num_almacenes", "capacidad", "disponible", "bajo_stock")
+
+
+def _groups(tipo_almacen, ubicacion):
+    return [("total", ""), ("tipo", tipo_almacen or ""), ("ubicacion", ubicacion or "")]
+
+
+def low_stock(row):
+    capacidad = row["capacidad"] or 0
+    return capacidad > 0 and (row["disponible"] or 0) <= capacidad * LOW_STOCK_RATIO
+
+
+class Deltas:
+    """Rollup changes of one transaction, summed per group and written in (dimension, valor) order."""
+
+    def __init__(self):
+        self.groups = defaultdict(lambda: [0, 0, 0, 0])
+
+    def add(self, tipo_almacen, ubicacion, num=0, capacidad=0, disponible=0, bajo_stock=0):
+        for group in _groups(tipo_almacen, ubicacion):
+            figures = self.groups[group]
+            for i, value in enumerate((num, capacidad, disponible, bajo_stock)):
+                figures[i] += value
+
+    def apply(self, cursor, slot=None):
+        slot = random.randrange(INVENTORY_SLOTS) if slot is None else slot
+        for (dimension, valor), figures in sorted(self.groups.items()):
+            if any(figures):
+                cursor.execute(APPLY_SQL, (dimension, valor, slot, *figures))
+
+
+def _sync_alert(cursor, almacen_id, row, deltas):
+    # bajo_stock always counts the alertas_stock rows, so adding or removing
+    # an alert is what moves it, whichever path gets here first
+    cursor.execute("SELECT tipo_almacen, ubicacion FROM alertas_stock WHERE almacen_id=%s FOR UPDATE", (almacen_id,))
+    alert = cursor.fetchone()
+    wanted = row is not None and low_stock(row)
+    if alert and not (wanted and (alert["tipo_almacen"], alert["ubicacion"]) == (row["tipo_almacen"] or "", row["ubicacion"] or "")):
+        cursor.execute("DELETE FROM alertas_stock WHERE almacen_id=%s", (almacen_id,))
+        deltas.add(alert["tipo_almacen"], alert["ubicacion"], bajo_stock=-1)
+        alert = None
+    if not wanted:
+        return
+    disponible = row["disponible"] or 0
+    if alert:
+        cursor.execute(
+            "UPDATE alertas_stock SET capacidad=%s, disponible=%s, nivel=%s WHERE almacen_id=%s",
+            (row["capacidad"], disponible, disponible / row["capacidad"], almacen_id),
+        )
+    else:
+        cursor.execute("""
+            INSERT INTO alertas_stock (almacen_id, tipo_almacen, ubicacion, capacidad, disponible, nivel)
+            VALUES (%s,%s,%s,%s,%s,%s)
+        """, (almacen_id, row["tipo_almacen"] or "", row["ubicacion"] or "", row["capacidad"], disponible,
+              disponible / row["capacidad"]))
+        deltas.add(row["tipo_almacen"], row["ubicacion"], bajo_stock=1)
+
+
+def almacenes_changed(cursor, old_rows, new_rows):
+    """Apply an almacen write: ``old_rows``/``new_rows`` are the COLUMNS dicts before and after it.
+
+    ``cursor`` must return dict rows and be inside the write's transaction.
+    """
+    deltas = Deltas()
+    for row in old_rows:
+        deltas.add(row["tipo_almacen"], row["ubicacion"], -1, -(row["capacidad"] or 0), -(row["disponible"] or 0))
+    for row in new_rows:
+        deltas.add(row["tipo_almacen"], row["ubicacion"], 1, row["capacidad"] or 0, row["disponible"] or 0)
+    new = {row["id"]: row for row in new_rows}
+    for almacen_id in sorted({row["id"] for row in old_rows} | set(new)):
+        _sync_alert(cursor, almacen_id, new.get(almacen_id), deltas)
+    deltas.apply(cursor)
+
+
+def stock_moved(db, deltas):
+    """Inside a sale, after its stock UPDATEs: apply ``{almacen_id: delta}`` and re-check those almacenes' alerts.
+
+    The sale already holds the almacen row locks, so the groups read here
+    can't change under it.
+    """
+    if not deltas:
+        return
+    ids = sorted(deltas)
+    cursor = db.cursor(dictionary=True)
+    cursor.execute(f"SELECT {', '.join(COLUMNS)} FROM almacenes WHERE id IN ({','.join(['%s'] * len(ids))}) ORDER BY id",
+                   tuple(ids))
+    rollup = Deltas()
+    for row in cursor.fetchall():
+        rollup.add(row["tipo_almacen"], row["ubicacion"], disponible=deltas[row["id"]])
+        _sync_alert(cursor, row["id"], row, rollup)
+    rollup.apply(cursor)
+    cursor.close()
+
+
+def summary(cursor):
+    """Fleet-wide figures: a primary-key range read over the total row's slots."""
+    cursor.execute(f"""
+        SELECT {', '.join(f'COALESCE(SUM({c}), 0) AS {c}' for c in FIGURES)} FROM inventario_resumen
+        WHERE dimension='total' AND valor=''
+    """)
+    return _with_level(cursor.fetchone())
+
+
+def by_group(cursor, dimension):
+    """Per tipo (``dimension='tipo'``) or per ubicacion, fullest first."""
+    cursor.execute(f"""
+        SELECT valor, {', '.join(f'SUM({c}) AS {c}' for c in FIGURES)} FROM inventario_resumen
+        WHERE dimension=%s GROUP BY valor HAVING SUM(num_almacenes) > 0
+        ORDER BY SUM(disponible) / NULLIF(SUM(capacidad), 0) DESC, valor
+    """, (dimension,))
+    return [_with_level(row) for row in cursor.fetchall()]
+
+
+def alerts(cursor, limit=MAX_ALERTS):
+    """Almacenes low on stock, emptiest first."""
+    cursor.execute("""
+        SELECT almacen_id, tipo_almacen, ubicacion, capacidad, disponible, nivel, desde
+        FROM alertas_stock ORDER BY nivel, almacen_id LIMIT %s
+    """, (limit,))
+    return cursor.fetchall()
+
+
+def _with_level(row):
+    row = dict(row)
+    row["nivel"] = row["disponible"] / row["capacidad"] if row["capacidad"] else None
+    return row
+
+
+def backfill(db):
+    """Rebuild inventario_resumen and alertas_stock from the almacenes table."""
+    low = "capacidad > 0 AND COALESCE(disponible, 0) <= capacidad * %s"
+    figures = f"""COUNT(*), COALESCE(SUM(capacidad), 0), COALESCE(SUM(disponible), 0),
+        COALESCE(SUM({low}), 0) FROM almacenes"""
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM inventario_resumen")
+    cursor.execute("DELETE FROM alertas_stock")
+    cursor.execute(f"""
+        INSERT INTO inventario_resumen (dimension, valor, num_almacenes, capacidad, disponible, bajo_stock)
+        SELECT 'total', '', {figures}
+        UNION ALL
+        SELECT 'tipo', COALESCE(tipo_almacen, ''), {figures} GROUP BY COALESCE(tipo_almacen, '')
+        UNION ALL
+        SELECT 'ubicacion', COALESCE(ubicacion, ''), {figures} GROUP BY COALESCE(ubicacion, '')
+    """, (LOW_STOCK_RATIO,) * 3)
+    cursor.execute(f"""
+        INSERT INTO alertas_stock (almacen_id, tipo_almacen, ubicacion, capacidad, disponible, nivel)
+        SELECT id, COALESCE(tipo_almacen, ''), COALESCE(ubicacion, ''), capacidad, COALESCE(disponible, 0),
+               COALESCE(disponible, 0) / capacidad
+        FROM almacenes WHERE {low}
+    """, (LOW_STOCK_RATIO,))
+    alerts = cursor.rowcount
+    db.commit()
+    cursor.close()
+    return alerts
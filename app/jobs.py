@@ -0,0 +1,319 @@
+"""Durable background jobs, queued in the MySQL ``jobs`` table.
+
+Request handlers ``enqueue`` slow work and return at once. Worker threads in
+every web process (JOBS_WORKERS, started on the first request; none under
+gunicorn) and any ``flask --app app.main jobs-worker`` process claim the pending job with the
+highest ``prioridad`` through SELECT ... FOR UPDATE SKIP LOCKED, so they all
+share one queue without handing a job out twice.
+
+A failing job goes back to the queue with an exponential backoff until it has
+used its ``max_intentos``; a handler raises ``JobFailed`` for errors no retry
+will fix. A claimed job is leased for JOBS_LEASE seconds, and a long handler
+renews the lease as it goes (``heartbeat``): if its worker dies (a recycled
+gunicorn worker, a deploy) it is handed out again once the lease runs out, so
+handlers must be safe to run twice or be queued with ``max_intentos=1``.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import mysql.connector
+
+from app import facets, inventory, rollups
+from app.db import connect
+from app.importer import CSVImportError, import_csv
+
+JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", 1))  # threads per web process, 0 for none
+JOBS_POLL = float(os.environ.get("JOBS_POLL", 1))  # seconds between checks of an idle queue
+JOBS_POLL_MAX = float(os.environ.get("JOBS_POLL_MAX", 30))  # doubled up to this while it stays idle
+JOBS_REQUEUE_EVERY = float(os.environ.get("JOBS_REQUEUE_EVERY", 60))  # seconds between expired-lease checks
+JOBS_LEASE = int(os.environ.get("JOBS_LEASE", 600))
+JOBS_RETRY_DELAY = int(os.environ.get("JOBS_RETRY_DELAY", 5))  # doubled on every further attempt
+# Uploads waiting for their job; must be shared by every process running workers
+JOBS_SPOOL_DIR = os.environ.get("JOBS_SPOOL_DIR", "/tmp/erp_toyota-jobs")
+# Import errors kept in a job's result
+MAX_ERRORS = 200
+
+log = logging.getLogger("app.jobs")
+handlers = {}
+
+CLAIM_SQL = """
+    SELECT id, tipo, payload, intentos, max_intentos FROM jobs
+    WHERE estado='pendiente' AND ejecutar_desde <= NOW()
+    ORDER BY prioridad DESC, id LIMIT 1 FOR UPDATE SKIP LOCKED
+"""
+STATUS_COLUMNS = "id, tipo, prioridad, estado, intentos, max_intentos, creado_por, resultado, error, creado, actualizado"
+
+
+class JobFailed(Exception):
+    """Raised by a handler when retrying the job can't help."""
+
+
+def handler(tipo):
+    """Register ``f(db, payload, heartbeat) -> result`` as the handler of ``tipo`` jobs.
+
+    ``db`` is the worker's own connection; the handler commits its writes.
+    A handler that may outlast JOBS_LEASE calls ``heartbeat()`` between its
+    transactions to renew the lease. The result must be JSON-serializable
+    and is kept with the job.
+    """
+    def decorator(f):
+        handlers[tipo] = f
+        return f
+    return decorator
+
+
+def enqueue(db, tipo, payload, prioridad=0, max_intentos=3, creado_por=None):
+    """Queue a ``tipo`` job and commit; returns its id."""
+    cursor = db.cursor()
+    cursor.execute(
+        "INSERT INTO jobs (tipo, payload, prioridad, max_intentos, creado_por) VALUES (%s,%s,%s,%s,%s)",
+        (tipo, json.dumps(payload), prioridad, max_intentos, creado_por),
+    )
+    job_id = cursor.lastrowid
+    db.commit()
+    cursor.close()
+    workers.wake()
+    return job_id
+
+
+def claim(db):
+    """Take the next runnable job (or None) and lease it to this worker."""
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute(CLAIM_SQL)
+        job = cursor.fetchone()
+        if job:
+            cursor.execute(
+                "UPDATE jobs SET estado='en_curso', intentos=intentos+1, bloqueado_hasta=NOW() + INTERVAL %s SECOND "
+                "WHERE id=%s", (JOBS_LEASE, job["id"]))
+            job["intentos"] += 1
+        db.commit()
+    finally:
+        cursor.close()
+    return job
+
+
+def heartbeat(db, job):
+    """Renew the lease of a running ``job`` and commit.
+
+    Raises JobFailed if the lease already ran out and the job was given back
+    to the queue, so the handler stops instead of racing the next worker.
+    """
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT id FROM jobs WHERE id=%s AND estado='en_curso' AND intentos=%s FOR UPDATE",
+                       (job["id"], job["intentos"]))
+        leased = cursor.fetchone() is not None
+        if leased:
+            cursor.execute("UPDATE jobs SET bloqueado_hasta=NOW() + INTERVAL %s SECOND WHERE id=%s",
+                           (JOBS_LEASE, job["id"]))
+        db.commit()
+    finally:
+        cursor.close()
+    if not leased:
+        raise JobFailed("El trabajo perdió su reserva y volvió a la cola")
+
+
+def requeue_expired(db):
+    """Give back jobs whose lease ran out; returns how many."""
+    cursor = db.cursor()
+    cursor.execute("""
+        UPDATE jobs SET estado=IF(intentos < max_intentos, 'pendiente', 'fallido'),
+            error='El worker no terminó a tiempo', bloqueado_hasta=NULL
+        WHERE estado='en_curso' AND bloqueado_hasta < NOW()
+    """)
+    requeued = cursor.rowcount
+    db.commit()
+    cursor.close()
+    return requeued
+
+
+def run(db, job):
+    """Run a claimed job and record its outcome; returns its new estado."""
+    try:
+        f = handlers.get(job["tipo"])
+        if f is None:
+            raise JobFailed(f"Tipo de trabajo desconocido: {job['tipo']}")
+        result = f(db, json.loads(job["payload"]), lambda: heartbeat(db, job))
+    except Exception as e:
+        db.rollback()
+        retry = not isinstance(e, JobFailed) and job["intentos"] < job["max_intentos"]
+        if retry:
+            log.warning("Job %s (%s) failed, retrying: %s", job["id"], job["tipo"], e)
+        else:
+            log.exception("Job %s (%s) failed", job["id"], job["tipo"])
+        estado = "pendiente" if retry else "fallido"
+        cursor = db.cursor()
+        cursor.execute("""
+            UPDATE jobs SET estado=%s, error=%s, bloqueado_hasta=NULL, ejecutar_desde=NOW() + INTERVAL %s SECOND
+            WHERE id=%s AND estado='en_curso' AND intentos=%s
+        """, (estado, str(e)[:2000] or type(e).__name__, JOBS_RETRY_DELAY * 2 ** (job["intentos"] - 1), job["id"],
+              job["intentos"]))
+    else:
+        estado = "hecho"
+        cursor = db.cursor()
+        # Only while this worker still holds the lease (see heartbeat)
+        cursor.execute(
+            "UPDATE jobs SET estado='hecho', resultado=%s, error=NULL, bloqueado_hasta=NULL "
+            "WHERE id=%s AND estado='en_curso' AND intentos=%s",
+            (json.dumps(result, default=str), job["id"], job["intentos"]))
+    db.commit()
+    cursor.close()
+    return estado
+
+
+class Workers:
+    """Threads draining the queue, each on its own unpooled connection.
+
+    Threads don't survive gunicorn's fork, so ``start`` runs once per process.
+    An idle thread polls less and less often, up to ``poll_max`` seconds;
+    ``wake`` (a job queued by this process) brings it back at once. Expired
+    leases are checked once every JOBS_REQUEUE_EVERY seconds per process.
+    """
+
+    def __init__(self, count=JOBS_WORKERS, poll=JOBS_POLL, poll_max=JOBS_POLL_MAX):
+        self.count = count
+        self.poll = poll
+        self.poll_max = poll_max
+        self._next_requeue = 0.0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self.stats = {"hecho": 0, "reintentos": 0, "fallido": 0, "caducados": 0}
+
+    def start(self, count=None):
+        count = self.count if count is None else count
+        if not count or self._pid == os.getpid():
+            return []
+        with self._lock:
+            if self._pid == os.getpid():
+                return []
+            self._pid = os.getpid()
+        threads = [threading.Thread(target=self.loop, name=f"jobs-{i}", daemon=True) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _requeue_due(self):
+        with self._lock:
+            if time.monotonic() < self._next_requeue:
+                return False
+            self._next_requeue = time.monotonic() + JOBS_REQUEUE_EVERY
+            return True
+
+    def loop(self):
+        db = None
+        delay = self.poll
+        while True:
+            try:
+                if db is None:
+                    db = connect()
+                job = claim(db)
+                if job:
+                    estado = run(db, job)
+                    self._count("reintentos" if estado == "pendiente" else estado)
+                    delay = self.poll
+                    continue
+                if self._requeue_due():
+                    self._count("caducados", requeue_expired(db))
+            except mysql.connector.Error:
+                log.exception("Job queue unavailable")
+                if db is not None:
+                    try:
+                        db.close()
+                    except mysql.connector.Error:
+                        pass
+                    db = None
+            if self._wakeup.wait(delay):
+                delay = self.poll
+            else:
+                delay = min(delay * 2, self.poll_max)
+            self._wakeup.clear()
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, threads=self.count if self._pid == os.getpid() else 0)
+
+
+workers = Workers()
+
+
+def init_app(app):
+    @app.before_request
+    def start_workers():
+        workers.start()
+
+
+# ---- status ----
+def _decoded(job):
+    if job and job["resultado"]:
+        job["resultado"] = json.loads(job["resultado"])
+    return job
+
+
+def status(cursor, job_id):
+    cursor.execute(f"SELECT {STATUS_COLUMNS} FROM jobs WHERE id=%s", (job_id,))
+    return _decoded(cursor.fetchone())
+
+
+def recent(cursor, estado=None, limit=50):
+    """Latest jobs, optionally only those in ``estado``; results are left out."""
+    where = "WHERE estado=%s " if estado else ""
+    cursor.execute(f"""
+        SELECT id, tipo, prioridad, estado, intentos, max_intentos, creado_por, error, creado, actualizado
+        FROM jobs {where}ORDER BY id DESC LIMIT %s
+    """, ((estado,) if estado else ()) + (limit,))
+    return cursor.fetchall()
+
+
+def counts(cursor):
+    cursor.execute("SELECT estado, COUNT(*) AS n FROM jobs GROUP BY estado")
+    return {row["estado"]: row["n"] for row in cursor.fetchall()}
+
+
+# ---- job types ----
+def spool_path(name):
+    os.makedirs(JOBS_SPOOL_DIR, exist_ok=True)
+    return os.path.join(JOBS_SPOOL_DIR, name)
+
+
+@handler("import_csv")
+def _import_csv(db, payload, heartbeat):
+    # Queued with max_intentos=1: vehiculos have no unique key, so a rerun would insert them twice.
+    # Every committed batch renews the lease, however long the file.
+    try:
+        with open(payload["path"], encoding="utf-8-sig", newline="") as f:
+            result = import_csv(db, payload["entity"], f, progress=lambda processed, inserted: heartbeat())
+    except (CSVImportError, UnicodeDecodeError, OSError) as e:
+        raise JobFailed(f"No se pudo importar: {e}")
+    finally:
+        if os.path.exists(payload["path"]):
+            os.remove(payload["path"])
+    result["num_errors"] = len(result["errors"])
+    result["errors"] = result["errors"][:MAX_ERRORS]
+    return result
+
+
+@handler("backfill_ventas")
+def _backfill_ventas(db, payload, heartbeat):
+    return {"filas": rollups.backfill(db)}
+
+
+@handler("backfill_inventario")
+def _backfill_inventario(db, payload, heartbeat):
+    return {"alertas": inventory.backfill(db)}
+
+
+@handler("backfill_facetas")
+def _backfill_facetas(db, payload, heartbeat):
+    return {"combinaciones": facets.backfill(db)}
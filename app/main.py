@@ -1,8 +1,24 @@
-from flask import Flask, render_template, request, redirect, session, g, url_for, flash
-from app.db import get_db
+from flask import Flask, render_template, request, redirect, session, g, url_for, flash, jsonify, Response, stream_with_context
+from app.db import get_db, get_read_db, init_app as init_db, pool, replicas, connect
+from app.pagination import PER_PAGE, page_count
+from app import facets, inventory, rollups, sales
+from app.importer import import_csv, BATCH_SIZE
+from app.export import stream_rows, csv_chunks, xlsx_chunks
+from app.repository import repositories, statements, transaction
+from app.cache import lookups
+from app.httpcache import cached_page, pages
+from app.api import api
+from app import changes, jobs, migrations, metrics, sessions, throttle
+from app.auth import ACTIONS, normalize_role, current_perms, roles_mask, start_session, can, has_role, roles_changed
+import mysql.connector
+import click
+import math
+from datetime import date, timedelta
+import hmac
 import os
 from functools import wraps
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
+import uuid
 
 app = Flask(
     __name__,
@@ -10,6 +26,31 @@ app = Flask(
 )
 # Use an environment variable in production
 app.secret_key = os.environ.get("SECRET_KEY", "dev-secret-key")
+# Session payloads live server-side (SESSION_STORE); the cookie is just an id
+app.session_interface = sessions.ServerSessionInterface(sessions.store)
+# Pooled DB connections are request-scoped and returned on teardown
+init_db(app)
+metrics.init_app(app)
+# Background job threads start with the first request of each worker process
+jobs.init_app(app)
+app.register_blueprint(api)
+# Behind WEB_PROXIES reverse proxies, take the client address (and scheme) from
+# their X-Forwarded-* headers; login throttling is keyed on it
+WEB_PROXIES = int(os.environ.get("WEB_PROXIES", 0))
+if WEB_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=WEB_PROXIES, x_proto=WEB_PROXIES)
+
+@app.errorhandler(mysql.connector.IntegrityError)
+def integrity_error(e):
+    # Duplicate DNI/correo or a row still referenced by ventas
+    flash("No se pudo guardar: el registro está duplicado o tiene datos relacionados", "error")
+    return redirect(request.referrer or "/")
+
+@app.errorhandler(throttle.HashPoolBusy)
+def hash_pool_busy(e):
+    # New passwords are hashed on the bounded login pool
+    flash("Servidor ocupado, inténtalo de nuevo", "error")
+    return redirect(request.referrer or "/")
 
 # ---------------- INDEX ----------------
 @app.route("/")
@@ -20,32 +61,12 @@ def index():
 def login_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        # Revoked sessions are already gone when the session store loads them
         if "empleado_id" not in session:
             return redirect(url_for("login"))
         return f(*args, **kwargs)
     return decorated
 
-
-def normalize_role(role):
-    if not role:
-        return None
-    mapping = {
-        'admin': 'jefe',
-        'gerente': 'jefe',
-        'compras': 'supervisor',
-        'vendedor': 'empleado',
-        'almacenista': 'empleado',
-        'tecnico': 'empleado'
-    }
-    return mapping.get(role, role)
-
-# Define permissions by action for the three roles
-permissions = {
-    'jefe': {'view': True, 'add': True, 'edit': True, 'delete': True},
-    'supervisor': {'view': True, 'add': True, 'edit': True, 'delete': False},
-    'empleado': {'view': True, 'add': True, 'edit': False, 'delete': False},
-}
-
 # Validacion de Contraseña 
 def is_valid_password(p):
     if not isinstance(p, str):
@@ -58,67 +79,82 @@ def is_valid_password(p):
     has_alpha = any(c.isalpha() for c in p)
     return has_digit and has_alpha
 
+# Fields of the empleado forms taken as posted; departamento, role and the
+# password hash are set by the handlers
+EMPLEADO_FIELDS = ["nombre", "dni", "correo", "direccion", "salario"]
+
+# Cached lookups derived from empleados, invalidated by every empleado write
+def has_jefe(db):
+    def load():
+        cur = db.cursor()
+        cur.execute("SELECT COUNT(*) FROM empleados WHERE role='jefe'")
+        exists = cur.fetchone()[0] > 0
+        cur.close()
+        return exists
+    return lookups.get(db, "jefe_exists", load, depends="empleados")
+
+
+def empleado_options(db):
+    def load():
+        cur = db.cursor(dictionary=True)
+        cur.execute("SELECT id, nombre FROM empleados ORDER BY nombre")
+        rows = cur.fetchall()
+        cur.close()
+        return rows
+    return lookups.get(db, "empleado_options", load, depends="empleados")
+
 @app.context_processor
 def inject_permissions():
-    def has_permission(action):
-        role = normalize_role(session.get('empleado_role'))
-        if not role:
-            return False
-        if role == 'jefe':
-            return True
-        return permissions.get(role, {}).get(action, False)
-    return dict(has_permission=has_permission)
+    return dict(has_permission=can)
 
 
 def role_required(*roles, action=None):
+    # Compiled once per route; the check itself is a single AND on the session mask
+    if roles:
+        needed = roles_mask(*roles)
+    elif action:
+        needed = ACTIONS[action]
+    else:
+        # Default: allow view for any logged-in user
+        needed = 0
+
     def decorator(f):
         @wraps(f)
         def wrapped(*args, **kwargs):
-            role = normalize_role(session.get("empleado_role"))
-            if role == 'jefe':
+            if not needed or current_perms() & needed:
                 return f(*args, **kwargs)
-             if roles:
-                normalized_roles = [normalize_role(r) for r in roles]
-                if role in normalized_roles:
-                    return f(*args, **kwargs)
-                flash("No autorizado", "error")
-                return redirect(url_for("index"))
-            if action:
-                if permissions.get(role, {}).get(action):
-                    return f(*args, **kwargs)
-                flash("No autorizado", "error")
-                return redirect(url_for("index"))
-            # Default: allow view for any logged-in user
-            return f(*args, **kwargs)
+            flash("No autorizado", "error")
+            return redirect(url_for("index"))
         return wrapped
     return decorator
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM empleados WHERE correo=%s", (request.form["correo"],))
-        empleado = cursor.fetchone()
-        db.close()
-        if empleado and check_password_hash(empleado.get("contrasena",""), request.form["contrasena"]):
-            session["empleado_id"] = empleado["id"]
-            session["empleado_nombre"] = empleado["nombre"]
-            raw_role = empleado.get("role") or 'empleado'
-            role = normalize_role(raw_role)
-            session["empleado_role"] = role
-            # If role missing in DB, set default to 'empleado'
-            if empleado.get("role") is None:
-                db = get_db()
-                cur2 = db.cursor()
-                try:
-                    cur2.execute("UPDATE empleados SET role=%s WHERE id=%s", (role, empleado['id']))
-                    db.commit()
-                except Exception:
-                    pass
-                cur2.close()
-                db.close()
+        correo = request.form.get("correo", "").strip().lower()
+        # Per-IP budget for every attempt, per-account budget for failures only
+        wait = max(throttle.ip_buckets.take(request.remote_addr), throttle.account_buckets.wait_time(correo))
+        if wait:
+            flash(f"Demasiados intentos, espera {math.ceil(wait)} s", "error")
+            return render_template("login.html"), 429, {"Retry-After": str(math.ceil(wait))}
+        empleado = None
+        if not throttle.unknown_correos.hit(get_db, correo):
+            cursor = get_db().cursor(dictionary=True)
+            cursor.execute("SELECT id, nombre, role, contrasena FROM empleados WHERE correo=%s", (correo,))
+            empleado = cursor.fetchone()
+            cursor.close()
+            if empleado is None:
+                throttle.unknown_correos.add(get_db, correo)
+        # Unknown correos are checked against a dummy hash: every failure costs the same
+        try:
+            valid = throttle.hashes.check(empleado and empleado["contrasena"], request.form.get("contrasena", ""))
+        except throttle.HashPoolBusy:
+            flash("Servidor ocupado, inténtalo de nuevo", "error")
+            return render_template("login.html"), 503, {"Retry-After": "1"}
+        if valid:
+            start_session(empleado["id"], empleado["nombre"], empleado["role"] or 'empleado')
             return redirect("/")
+        throttle.account_buckets.take(correo)
         flash("Credenciales incorrectas", "error")
     return render_template("login.html")
 
@@ -130,18 +166,16 @@ def logout():
 @app.route("/register", methods=["GET", "POST"])
 def register():
     db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT COUNT(*) FROM empleados WHERE role='jefe'")
-    jefe_exists = cur.fetchone()[0] > 0
+    jefe_exists = has_jefe(db)
 
     # Build department options: jefe can choose all; if no jefe exists allow jefe option for first registration
     departments = ['Ventas', 'Almacén', 'Compras', 'Técnico']
-    if not jefe_exists or normalize_role(session.get('empleado_role')) == 'jefe':
+    if not jefe_exists or has_role('jefe'):
         departments = ['Administración', 'Gerencia'] + departments
 
     # Roles available at registration
     roles = ['supervisor','empleado']
-    if not jefe_exists or normalize_role(session.get('empleado_role')) == 'jefe':
+    if not jefe_exists or has_role('jefe'):
         roles = ['jefe'] + roles
 
     if request.method == "POST":
@@ -170,7 +204,6 @@ def register():
         cursor = db.cursor(dictionary=True)
         cursor.execute("SELECT id FROM empleados WHERE correo=%s OR dni=%s", (correo, dni))
         if cursor.fetchone():
-            db.close()
             flash("Correo o DNI ya registrado", "error")
             return render_template("register.html", departments=departments)
 
@@ -178,157 +211,52 @@ def register():
         selected_dept = departamento
         selected_role = request.form.get('role') or 'empleado'
         if selected_role not in roles:
-            db.close()
             flash("Rol no permitido", "error")
             return render_template("register.html", departments=departments, roles=roles)
-        if selected_role == 'jefe' and normalize_role(session.get('empleado_role')) != 'jefe' and jefe_exists:
+        if selected_role == 'jefe' and not has_role('jefe') and jefe_exists:
             # Solo el jefe puede asignar el rol de jefe si ya existe uno
-            db.close()
             flash("No está permitido asignar Jefe", "error")
             return render_template("register.html", departments=departments, roles=roles)
 
-        hashed = generate_password_hash(contrasena)
-        cursor2 = db.cursor()
-        cursor2.execute("""
-            INSERT INTO empleados (nombre,dni,correo,direccion,departamento,salario,contrasena,role)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        """, (
-            nombre,
-            dni,
-            correo,
-            direccion,
-            selected_dept,
-            salario,
-            hashed,
-            selected_role
-        ))
-        db.commit()
-        emp_id = cursor2.lastrowid
-        db.close()
+        with transaction(db, "empleados"):
+            emp_id = repositories["empleados"].insert(db, dict(
+                nombre=nombre, dni=dni, correo=correo, direccion=direccion, departamento=selected_dept, salario=salario,
+                contrasena=throttle.hashes.hash(contrasena), role=selected_role))
 
         # Auto-login después del registro
-        session["empleado_id"] = emp_id
-        session["empleado_nombre"] = nombre
-        session["empleado_role"] = normalize_role(selected_role)
+        start_session(emp_id, nombre, selected_role)
         flash("Registro exitoso. Has iniciado sesión.", "success")
         return redirect("/")
 
     # GET
-    cur.close()
-    db.close()
     return render_template("register.html", departments=departments, roles=roles)
 
+# ---------------- LISTADOS ----------------
+def list_view(entity, filters=None, total=None, **context):
+    # Count and keyset page of any entity, both through app.repository (on a replica when there is one)
+    repo = repositories[entity]
+    q = request.args.get('q', '').strip()
+    db = get_read_db()
+    if total is None:
+        total = repo.count(db, q, filters)
+    result = repo.page(db, q, request.args.get('cursor'), filters=filters)
+    return render_template(f"{entity}.html", page=result["page"], per_page=PER_PAGE, total=total, pages=page_count(total), q=q,
+                           next_cursor=result["next"], prev_cursor=result["prev"], **context, **{entity: result["rows"]})
+
 # ---------------- CLIENTES ----------------
 @app.route("/clientes")
 @login_required
+@cached_page("clientes")
 def clientes():
-    page = int(request.args.get('page', 1))
-    per_page = 10
-    offset = (page - 1) * per_page
-    q = request.args.get('q', '').strip()
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-    # Build filter
-    params = []
-    where = ''
-    if q:
-        like = f"%{q}%"
-        where = "WHERE nombre LIKE %s OR dni LIKE %s OR correo LIKE %s"
-        params = [like, like, like]
-    cursor.execute(f"SELECT COUNT(*) AS cnt FROM clientes {where}", tuple(params))
-    total = cursor.fetchone()['cnt']
-    params2 = params + [per_page, offset]
-    cursor.execute(f"SELECT * FROM clientes {where} LIMIT %s OFFSET %s", tuple(params2))
-    data = cursor.fetchall()
-    pages = max(1, (total + per_page - 1) // per_page)
-    db.close()
-    return render_template("clientes.html", clientes=data, page=page, per_page=per_page, total=total, pages=pages, q=q)
-
-@app.route("/clientes/nuevo", methods=["GET", "POST"])
-@login_required
-@role_required(action='add')
-def nuevo_cliente():
-    if request.method == "POST":
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO clientes VALUES (NULL,%s,%s,%s,%s,%s,%s)
-        """, (
-            request.form["nombre"],
-            request.form["dni"],
-            request.form["correo"],
-            request.form["telefono"],
-            request.form["pais"],
-            request.form["tipo"]
-        ))
-        db.commit()
-        db.close()
-        return redirect("/clientes")
-    return render_template("clientes_form.html")
-
-@app.route("/clientes/editar/<int:id>", methods=["GET", "POST"])
-@login_required
-@role_required(action='edit')
-def editar_cliente(id):
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-    if request.method == "POST":
-        cursor.execute("""
-            UPDATE clientes SET nombre=%s, dni=%s, correo=%s, telefono=%s, pais=%s, tipo=%s
-            WHERE id=%s
-        """, (
-            request.form["nombre"],
-            request.form["dni"],
-            request.form["correo"],
-            request.form["telefono"],
-            request.form["pais"],
-            request.form["tipo"],
-            id
-        ))
-        db.commit()
-        db.close()
-        return redirect("/clientes")
-    cursor.execute("SELECT * FROM clientes WHERE id=%s", (id,))
-    cliente = cursor.fetchone()
-    db.close()
-    return render_template("clientes_form.html", cliente=cliente)
-
-@app.route("/clientes/eliminar/<int:id>")
-@login_required
-@role_required(action='delete')
-def eliminar_cliente(id):
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("DELETE FROM clientes WHERE id=%s", (id,))
-    db.commit()
-    db.close()
-    return redirect("/clientes")
+    return list_view("clientes")
 
 # ---------------- EMPLEADOS ----------------
 @app.route("/empleados")
 @login_required
 @role_required(action='view')
+@cached_page("empleados")
 def empleados():
-    page = int(request.args.get('page', 1))
-    per_page = 10
-    offset = (page - 1) * per_page
-    q = request.args.get('q', '').strip()
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-    params = []
-    where = ''
-    if q:
-        like = f"%{q}%"
-        where = "WHERE nombre LIKE %s OR dni LIKE %s OR correo LIKE %s OR departamento LIKE %s OR role LIKE %s"
-        params = [like, like, like, like, like]
-    cursor.execute(f"SELECT COUNT(*) AS cnt FROM empleados {where}", tuple(params))
-    total = cursor.fetchone()['cnt']
-    params2 = params + [per_page, offset]
-    cursor.execute(f"SELECT * FROM empleados {where} LIMIT %s OFFSET %s", tuple(params2))
-    data = cursor.fetchall()
-    pages = max(1, (total + per_page - 1) // per_page)
-    db.close()
-    return render_template("empleados.html", empleados=data, page=page, per_page=per_page, total=total, pages=pages, q=q)
+    return list_view("empleados")
 
 @app.route("/empleados/nuevo", methods=["GET", "POST"])
 @login_required
@@ -337,46 +265,31 @@ def nuevo_empleado():
     # Departments allowed for jefe
     departments = ['Administración','Gerencia','Ventas','Almacén','Compras','Técnico']
     db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT COUNT(*) FROM empleados WHERE role='jefe'")
-    jefe_exists = cur.fetchone()[0] > 0
+    jefe_exists = has_jefe(db)
 
     roles = ['supervisor','empleado']
-    if not jefe_exists or normalize_role(session.get('empleado_role')) == 'jefe':
+    if not jefe_exists or has_role('jefe'):
         roles = ['jefe'] + roles
 
     if request.method == "POST":
         departamento = request.form.get('departamento')
         selected_role = request.form.get('role') or 'empleado'
         if selected_role not in roles:
-            db.close()
             flash('Rol no permitido', 'error')
             return render_template('empleados_form.html', departments=departments, roles=roles)
         # Prevent non-jefe from assigning jefe if one exists
-        if selected_role == 'jefe' and normalize_role(session.get('empleado_role')) != 'jefe' and jefe_exists:
-            db.close()
+        if selected_role == 'jefe' and not has_role('jefe') and jefe_exists:
             flash('No está permitido asignar Jefe', 'error')
             return render_template('empleados_form.html', departments=departments, roles=roles)
         pw = request.form.get("contrasena", "")
         if not is_valid_password(pw):
-            db.close()
             flash("La contraseña debe tener al menos 4 caracteres, contener letras y números, y no incluir símbolos.", "error")
             return render_template('empleados_form.html', departments=departments, roles=roles)
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO empleados (nombre,dni,correo,direccion,departamento,salario,contrasena,role) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        """, (
-            request.form["nombre"],
-            request.form["dni"],
-            request.form["correo"],
-            request.form["direccion"],
-            departamento,
-            request.form["salario"],
-            generate_password_hash(request.form.get("contrasena", "")),
-            selected_role
-        ))
-        db.commit()
-        db.close()
+        repo = repositories["empleados"]
+        values = repo.from_form(request.form, EMPLEADO_FIELDS)
+        values.update(departamento=departamento, contrasena=throttle.hashes.hash(pw), role=selected_role)
+        with transaction(db, "empleados"):
+            repo.insert(db, values)
         return redirect("/empleados")
     return render_template("empleados_form.html", departments=departments, roles=roles)
 
@@ -384,22 +297,19 @@ def nuevo_empleado():
 @login_required
 def editar_empleado(id):
     # Allow jefe/supervisor or the employee themselves to edit
-    if normalize_role(session.get("empleado_role")) not in ('jefe','supervisor') and session.get("empleado_id") != id:
+    if not has_role('jefe', 'supervisor') and session.get("empleado_id") != id:
         flash("No autorizado", "error")
         return redirect("/empleados")
 
     db = get_db()
-    cursor = db.cursor(dictionary=True)
+    repo = repositories["empleados"]
     # prepare departments list
-    cur2 = db.cursor()
-    cur2.execute("SELECT COUNT(*) FROM empleados WHERE role='jefe'")
-    jefe_exists = cur2.fetchone()[0] > 0
-    cur2.close()
+    jefe_exists = has_jefe(db)
     departments = ['Ventas','Almacén','Compras','Técnico']
-    if not jefe_exists or session.get('empleado_role') == 'jefe':
+    if not jefe_exists or has_role('jefe'):
         departments = ['Administración','Gerencia'] + departments
     roles = ['supervisor','empleado']
-    if not jefe_exists or session.get('empleado_role') == 'jefe':
+    if not jefe_exists or has_role('jefe'):
         roles = ['jefe'] + roles
 
     if request.method == "POST":
@@ -409,53 +319,27 @@ def editar_empleado(id):
             flash('Rol no permitido', 'error')
             return redirect(f'/empleados/editar/{id}')
         # Prevent non-jefe from assigning jefe if one exists
-        if selected_role == 'jefe' and normalize_role(session.get('empleado_role')) != 'jefe' and jefe_exists:
+        if selected_role == 'jefe' and not has_role('jefe') and jefe_exists:
             flash('No está permitido asignar Jefe', 'error')
             return redirect(f'/empleados/editar/{id}')
-        role = selected_role
-
+        values = repo.from_form(request.form, EMPLEADO_FIELDS)
+        values.update(departamento=departamento, role=selected_role)
         # Self-edit and role validation handled above (jefe assignment already validated)
-        if request.method == 'POST' and request.form.get('contrasena'):
-            pw = request.form.get('contrasena')
+        pw = request.form.get('contrasena')
+        if pw:
             if not is_valid_password(pw):
                 flash("La contraseña debe tener al menos 4 caracteres, contener letras y números, y no incluir símbolos.", "error")
                 return redirect(f'/empleados/editar/{id}')
             # Password change
-            cursor.execute('''
-                UPDATE empleados SET nombre=%s, dni=%s, correo=%s, direccion=%s, departamento=%s, salario=%s, contrasena=%s, role=%s
-                WHERE id=%s
-            ''', (
-                request.form["nombre"],
-                request.form["dni"],
-                request.form["correo"],
-                request.form["direccion"],
-                departamento,
-                request.form["salario"],
-                generate_password_hash(request.form.get("contrasena")),
-                role,
-                id
-            ))
-        else:
-            # No password change
-            cursor.execute('''
-                UPDATE empleados SET nombre=%s, dni=%s, correo=%s, direccion=%s, departamento=%s, salario=%s, role=%s
-                WHERE id=%s
-            ''', (
-                request.form["nombre"],
-                request.form["dni"],
-                request.form["correo"],
-                request.form["direccion"],
-                departamento,
-                request.form["salario"],
-                role,
-                id
-            ))
-        db.commit()
-        db.close()
+            values["contrasena"] = throttle.hashes.hash(pw)
+        previous = repo.get(db, id, ["role"])
+        with transaction(db, "empleados") as cursor:
+            if previous and normalize_role(previous["role"]) != normalize_role(selected_role):
+                # Sessions of this empleado pick up the new permissions on their next request
+                roles_changed(cursor)
+            repo.update(db, id, values)
         return redirect("/empleados")
-    cursor.execute("SELECT * FROM empleados WHERE id=%s", (id,))
-    empleado = cursor.fetchone()
-    db.close()
+    empleado = repo.get(db, id)
     return render_template("empleados_form.html", empleado=empleado, departments=departments, roles=roles)
 
 @app.route("/empleados/eliminar/<int:id>")
@@ -467,135 +351,32 @@ def eliminar_empleado(id):
         flash("No puedes eliminar tu propio usuario", "error")
         return redirect("/empleados")
     db = get_db()
-    cursor = db.cursor()
-    cursor.execute("DELETE FROM empleados WHERE id=%s", (id,))
-    db.commit()
-    db.close()
+    with transaction(db, "empleados") as cursor:
+        repositories["empleados"].delete(db, id)
+        roles_changed(cursor)
+    sessions.revoke(id)
     return redirect("/empleados")
 
 # ---------------- VEHICULOS ----------------
 @app.route("/vehiculos")
 @login_required
+@cached_page("vehiculos")
 def vehiculos():
-    page = int(request.args.get('page', 1))
-    per_page = 10
-    offset = (page - 1) * per_page
+    # Facet filters narrow the list; without a search, the total and the facet
+    # counts are one query over vehiculos_facetas (app.facets)
+    seleccion = facets.parse(request.args)
     q = request.args.get('q', '').strip()
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-    params = []
-    where = ''
-    if q:
-        like = f"%{q}%"
-        where = "WHERE modelo LIKE %s OR tipo LIKE %s OR color LIKE %s"
-        params = [like, like, like]
-    cursor.execute(f"SELECT COUNT(*) AS cnt FROM vehiculos {where}", tuple(params))
-    total = cursor.fetchone()['cnt']
-    params2 = params + [per_page, offset]
-    cursor.execute(f"SELECT * FROM vehiculos {where} LIMIT %s OFFSET %s", tuple(params2))
-    data = cursor.fetchall()
-    pages = max(1, (total + per_page - 1) // per_page)
-    db.close()
-    return render_template("vehiculos.html", vehiculos=data, page=page, per_page=per_page, total=total, pages=pages, q=q)
-
-@app.route("/vehiculos/nuevo", methods=["GET", "POST"])
-@login_required
-@role_required(action='add')
-def nuevo_vehiculo():
-    if request.method == "POST":
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO vehiculos VALUES (NULL,%s,%s,%s,%s,%s,%s)
-        """, (
-            request.form["modelo"],
-            request.form["tipo"],
-            request.form["anio"],
-            request.form["color"],
-            request.form["precio"],
-            request.form["costo"]
-        ))
-        db.commit()
-        db.close()
-        return redirect("/vehiculos")
-    return render_template("vehiculos_form.html")
-
-@app.route("/vehiculos/editar/<int:id>", methods=["GET", "POST"])
-@login_required
-@role_required(action='edit')
-def editar_vehiculo(id):
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-    if request.method == "POST":
-        cursor.execute("""
-            UPDATE vehiculos SET modelo=%s, tipo=%s, anio=%s, color=%s, precio_venta=%s, costo_fabricante=%s
-            WHERE id=%s
-        """, (
-            request.form["modelo"],
-            request.form["tipo"],
-            request.form["anio"],
-            request.form["color"],
-            request.form["precio"],
-            request.form["costo"],
-            id
-        ))
-        db.commit()
-        db.close()
-        return redirect("/vehiculos")
-    cursor.execute("SELECT * FROM vehiculos WHERE id=%s", (id,))
-    vehiculo = cursor.fetchone()
-    db.close()
-    return render_template("vehiculos_form.html", vehiculo=vehiculo)
-
-@app.route("/vehiculos/eliminar/<int:id>")
-@login_required
-@role_required(action='delete')
-def eliminar_vehiculo(id):
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("DELETE FROM vehiculos WHERE id=%s", (id,))
-    db.commit()
-    db.close()
-    return redirect("/vehiculos")
+    facetas = None if q else facets.counts(get_read_db().cursor(dictionary=True), seleccion)
+    return list_view("vehiculos", facets.where(seleccion), facetas["total"] if facetas else None,
+                     facetas=facetas, seleccion=seleccion, query=facets.query_string(seleccion, q))
 
 # ---------------- VENTAS ----------------
 @app.route("/ventas")
 @login_required
+@cached_page("ventas", "empleados")
 def ventas():
-    page = int(request.args.get('page', 1))
-    per_page = 10
-    offset = (page - 1) * per_page
-    q = request.args.get('q', '').strip()
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-    if q:
-        like = f"%{q}%"
-        cursor.execute("""
-            SELECT COUNT(*) AS cnt FROM ventas v
-            JOIN empleados e ON v.empleado_id = e.id
-            WHERE v.id LIKE %s OR e.nombre LIKE %s OR v.fecha LIKE %s
-        """, (like, like, like))
-        total = cursor.fetchone()['cnt']
-        cursor.execute("""
-            SELECT v.id, v.fecha, v.total, e.nombre AS empleado
-            FROM ventas v
-            JOIN empleados e ON v.empleado_id = e.id
-            WHERE v.id LIKE %s OR e.nombre LIKE %s OR v.fecha LIKE %s
-            LIMIT %s OFFSET %s
-        """, (like, like, like, per_page, offset))
-    else:
-        cursor.execute("SELECT COUNT(*) AS cnt FROM ventas")
-        total = cursor.fetchone()['cnt']
-        cursor.execute("""
-            SELECT v.id, v.fecha, v.total, e.nombre AS empleado
-            FROM ventas v
-            JOIN empleados e ON v.empleado_id = e.id
-            LIMIT %s OFFSET %s
-        """, (per_page, offset))
-    data = cursor.fetchall()
-    pages = max(1, (total + per_page - 1) // per_page)
-    db.close()
-    return render_template("ventas.html", ventas=data, page=page, per_page=per_page, total=total, pages=pages, q=q)
+    # Newest first, seeking on (fecha, id) so deep pages stay as cheap as the first one
+    return list_view("ventas")
 
 @app.route("/ventas/nuevo", methods=["GET", "POST"])
 @login_required
@@ -603,265 +384,393 @@ def ventas():
 def nueva_venta():
     db = get_db()
     cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM empleados")
-    empleados = cursor.fetchall()
+    empleados = empleado_options(db)
+    cursor.execute("SELECT id, ubicacion, disponible FROM almacenes ORDER BY ubicacion")
+    almacenes = cursor.fetchall()
 
     if request.method == "POST":
-        cursor2 = db.cursor()
-        cursor2.execute("""
-            INSERT INTO ventas VALUES (NULL,%s,%s,%s)
-        """, (
-            request.form["fecha"],
-            request.form["total"],
-            request.form["empleado"]
-        ))
-        db.commit()
-        db.close()
+        if not request.form.get("fecha"):
+            flash("Indica la fecha de la venta", "error")
+            return render_template("ventas_form.html", empleados=empleados, almacenes=almacenes)
+        try:
+            lines = sales.parse_lines(request.form)
+            sales.create_sale(db, request.form["fecha"], request.form["empleado"], lines,
+                              cliente_id=request.form.get("cliente_id"), total=sales.parse_total(request.form.get("total")))
+        except ValueError as e:
+            flash(f"Línea no válida: {e}", "error")
+            return render_template("ventas_form.html", empleados=empleados, almacenes=almacenes)
+        except sales.StockInsuficiente as e:
+            flash(str(e), "error")
+            return render_template("ventas_form.html", empleados=empleados, almacenes=almacenes)
         return redirect("/ventas")
 
-    return render_template("ventas_form.html", empleados=empleados)
+    return render_template("ventas_form.html", empleados=empleados, almacenes=almacenes)
 
 @app.route("/ventas/editar/<int:id>", methods=["GET", "POST"])
 @login_required
 @role_required(action='edit')
 def editar_venta(id):
     db = get_db()
-    cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM empleados")
-    empleados = cursor.fetchall()
+    repo = repositories["ventas"]
+    empleados = empleado_options(db)
 
     if request.method == "POST":
-        cursor2 = db.cursor()
-        cursor2.execute("""
-            UPDATE ventas SET fecha=%s, total=%s, empleado_id=%s
-            WHERE id=%s
-        """, (
-            request.form["fecha"],
-            request.form["total"],
-            request.form["empleado"],
-            id
-        ))
-        db.commit()
-        db.close()
+        values = repo.from_form(request.form, ["fecha", "total", "empleado_id"])
+        if not values["fecha"]:
+            flash("Indica la fecha de la venta", "error")
+            return redirect(request.url)
+        try:
+            values["total"] = sales.parse_total(values["total"])
+        except ValueError as e:
+            flash(str(e), "error")
+            return redirect(request.url)
+        with transaction(db, "ventas") as cursor:
+            old = rollups.lock_venta(cursor, id)
+            # A venta with line items is worth what its lines add up to; only
+            # plain ventas take the total from the form
+            from_lines = sales.lines_total(cursor, id)
+            if from_lines is not None:
+                values["total"] = from_lines
+            repo.update(db, id, values)
+            rollups.remove_venta(cursor, old)
+            rollups.apply_venta(cursor, values["fecha"], values["empleado_id"], values["total"])
         return redirect("/ventas")
 
-    cursor.execute("SELECT * FROM ventas WHERE id=%s", (id,))
-    venta = cursor.fetchone()
-    db.close()
-    return render_template("ventas_form.html", venta=venta, empleados=empleados)
+    venta = repo.get(db, id)
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT l.cantidad, l.precio_unitario, v.modelo, a.ubicacion
+        FROM venta_lineas l
+        JOIN vehiculos v ON v.id = l.vehiculo_id
+        JOIN almacenes a ON a.id = l.almacen_id
+        WHERE l.venta_id=%s
+    """, (id,))
+    lineas = cursor.fetchall()
+    return render_template("ventas_form.html", venta=venta, empleados=empleados, lineas=lineas)
 
 @app.route("/ventas/eliminar/<int:id>")
 @login_required
 @role_required(action='delete')
 def eliminar_venta(id):
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("DELETE FROM ventas WHERE id=%s", (id,))
-    db.commit()
-    db.close()
+    # Returns the units of its line items to their almacenes
+    sales.delete_sale(get_db(), id)
     return redirect("/ventas")
 
+@app.route("/ventas/dashboard")
+@login_required
+@role_required('jefe', 'supervisor')
+@cached_page("ventas", "empleados")
+def ventas_dashboard():
+    # Reads only the ventas_diarias rollup, never the raw ventas table
+    try:
+        hasta = date.fromisoformat(request.args.get('hasta', ''))
+    except ValueError:
+        hasta = date.today()
+    try:
+        desde = date.fromisoformat(request.args.get('desde', ''))
+    except ValueError:
+        desde = hasta - timedelta(days=30)
+    granularity = 'mes' if request.args.get('por') == 'mes' else 'dia'
+    db = get_read_db()
+    cursor = db.cursor(dictionary=True)
+    periodos = rollups.totals_by_period(cursor, desde, hasta, granularity)
+    por_empleado = rollups.totals_by_empleado(cursor, desde, hasta)
+    total = sum((p['total'] or 0) for p in periodos)
+    num_ventas = sum((p['num_ventas'] or 0) for p in periodos)
+    return render_template("ventas_dashboard.html", periodos=periodos, por_empleado=por_empleado, desde=desde, hasta=hasta,
+                           por=granularity, total=total, num_ventas=num_ventas)
+
+
+@app.cli.command("backfill-ventas")
+@click.option("--background", is_flag=True, help="Queue it for the job workers instead")
+def backfill_ventas(background):
+    """Rebuild the ventas_diarias rollup from the ventas table."""
+    if background:
+        print(f"job {jobs.enqueue(get_db(), 'backfill_ventas', {}, prioridad=-10)}")
+        return
+    rows = rollups.backfill(get_db())
+    print(f"ventas_diarias: {rows} filas")
+
 # ---------------- ALMACENES ----------------
 @app.route("/almacenes")
 @login_required
+@cached_page("almacenes")
 def almacenes():
-    page = int(request.args.get('page', 1))
-    per_page = 10
-    offset = (page - 1) * per_page
-    q = request.args.get('q', '').strip()
-    db = get_db()
+    return list_view("almacenes")
+
+@app.route("/almacenes/inventario")
+@login_required
+@role_required('jefe', 'supervisor')
+@cached_page("almacenes")
+def almacenes_inventario():
+    # Reads only the inventario_resumen/alertas_stock rollup, never the almacenes table
+    db = get_read_db()
     cursor = db.cursor(dictionary=True)
-    params = []
-    where = ''
-    if q:
-        like = f"%{q}%"
-        where = "WHERE ubicacion LIKE %s OR tipo_almacen LIKE %s"
-        params = [like, like]
-    cursor.execute(f"SELECT COUNT(*) AS cnt FROM almacenes {where}", tuple(params))
-    total = cursor.fetchone()['cnt']
-    params2 = params + [per_page, offset]
-    cursor.execute(f"SELECT * FROM almacenes {where} LIMIT %s OFFSET %s", tuple(params2))
-    data = cursor.fetchall()
-    pages = max(1, (total + per_page - 1) // per_page)
-    db.close()
-    return render_template("almacenes.html", almacenes=data, page=page, per_page=per_page, total=total, pages=pages, q=q)
-
-@app.route("/almacenes/nuevo", methods=["GET", "POST"])
+    return render_template("almacenes_inventario.html", resumen=inventory.summary(cursor),
+                           por_tipo=inventory.by_group(cursor, 'tipo'),
+                           por_ubicacion=inventory.by_group(cursor, 'ubicacion'),
+                           alertas=inventory.alerts(cursor), umbral=inventory.LOW_STOCK_RATIO,
+                           max_alertas=inventory.MAX_ALERTS)
+
+
+@app.cli.command("backfill-inventario")
+@click.option("--background", is_flag=True, help="Queue it for the job workers instead")
+def backfill_inventario(background):
+    """Rebuild the inventario_resumen and alertas_stock rollup from the almacenes table."""
+    if background:
+        print(f"job {jobs.enqueue(get_db(), 'backfill_inventario', {}, prioridad=-10)}")
+        return
+    alertas = inventory.backfill(get_db())
+    print(f"alertas_stock: {alertas} almacenes")
+
+
+@app.cli.command("backfill-facetas")
+@click.option("--background", is_flag=True, help="Queue it for the job workers instead")
+def backfill_facetas(background):
+    """Rebuild the vehiculos_facetas counts from the vehiculos table."""
+    if background:
+        print(f"job {jobs.enqueue(get_db(), 'backfill_facetas', {}, prioridad=-10)}")
+        return
+    print(f"vehiculos_facetas: {facets.backfill(get_db())} combinaciones")
+
+# ---------------- PROVEEDORES ----------------
+@app.route("/proveedores")
+@login_required
+@cached_page("proveedores")
+def proveedores():
+    return list_view("proveedores")
+
+# ---------------- ALTAS, EDICIONES Y BAJAS ----------------
+# Clientes, vehiculos, almacenes and proveedores share their form handlers:
+# the columns and form field names come from app.repository.
+CRUD_ENTITIES = "<any(clientes, vehiculos, almacenes, proveedores):entity>"
+
+@app.route(f"/{CRUD_ENTITIES}/nuevo", methods=["GET", "POST"])
 @login_required
 @role_required(action='add')
-def nuevo_almacen():
+def nuevo(entity):
+    repo = repositories[entity]
     if request.method == "POST":
         db = get_db()
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO almacenes VALUES (NULL,%s,%s,%s,%s,%s)
-        """, (
-            request.form["ubicacion"],
-            request.form["correo"],
-            request.form["tipo_almacen"],
-            request.form["capacidad"],
-            request.form["disponible"]
-        ))
-        db.commit()
-        db.close()
-        return redirect("/almacenes")
-    return render_template("almacenes_form.html", almacen=None)
+        with transaction(db, entity):
+            repo.insert(db, repo.from_form(request.form))
+        return redirect(f"/{entity}")
+    return render_template(f"{entity}_form.html", **{repo.var: None})
 
-@app.route("/almacenes/editar/<int:id>", methods=["GET", "POST"])
+@app.route(f"/{CRUD_ENTITIES}/editar/<int:id>", methods=["GET", "POST"])
 @login_required
 @role_required(action='edit')
-def editar_almacen(id):
+def editar(entity, id):
+    repo = repositories[entity]
     db = get_db()
-    cursor = db.cursor(dictionary=True)
     if request.method == "POST":
-        cursor.execute("""
-            UPDATE almacenes SET ubicacion=%s, correo=%s, tipo_almacen=%s, capacidad=%s, disponible=%s WHERE id=%s
-        """, (
-            request.form["ubicacion"],
-            request.form["correo"],
-            request.form["tipo_almacen"],
-            request.form["capacidad"],
-            request.form["disponible"],
-            id
-        ))
-        db.commit()
-        db.close()
-        return redirect("/almacenes")
-    cursor.execute("SELECT * FROM almacenes WHERE id=%s", (id,))
-    almacen = cursor.fetchone()
-    db.close()
-    return render_template("almacenes_form.html", almacen=almacen)
+        with transaction(db, entity):
+            repo.update(db, id, repo.from_form(request.form))
+        return redirect(f"/{entity}")
+    return render_template(f"{entity}_form.html", **{repo.var: repo.get(db, id)})
 
-@app.route("/almacenes/eliminar/<int:id>")
+@app.route(f"/{CRUD_ENTITIES}/eliminar/<int:id>")
 @login_required
 @role_required(action='delete')
-def eliminar_almacen(id):
+def eliminar(entity, id):
     db = get_db()
-    cursor = db.cursor()
-    cursor.execute("DELETE FROM almacenes WHERE id=%s", (id,))
-    db.commit()
-    db.close()
-    return redirect("/almacenes")
+    with transaction(db, entity):
+        repositories[entity].delete(db, id)
+    return redirect(f"/{entity}")
 
+# ---------------- IMPORTAR CSV ----------------
+@app.route("/<any(clientes, proveedores, vehiculos):entity>/importar", methods=["GET", "POST"])
+@login_required
+@role_required(action='add')
+def importar(entity):
+    # The upload is spooled and imported by a background job; the page polls its status
+    if request.method == "POST":
+        archivo = request.files.get("archivo")
+        if not archivo or not archivo.filename:
+            flash("Selecciona un archivo CSV", "error")
+            return redirect(request.path)
+        path = jobs.spool_path(f"{uuid.uuid4().hex}.csv")
+        archivo.save(path)
+        job_id = jobs.enqueue(get_db(), "import_csv", {"entity": entity, "path": path}, prioridad=10,
+                              max_intentos=1, creado_por=session["empleado_id"])
+        return redirect(f"{request.path}?job={job_id}")
+    job = visible_job(request.args.get("job", type=int))
+    result = None
+    if job and job["estado"] == "hecho":
+        result = job["resultado"]
+        flash(f"{result['inserted']} de {result['processed']} filas importadas", "success" if not result["errors"] else "error")
+    elif job and job["estado"] == "fallido":
+        flash(job["error"], "error")
+    return render_template("importar.html", entity=entity, result=result, job=job)
+
+
+@app.cli.command("import-csv")
+@click.argument("entity", type=click.Choice(["clientes", "proveedores", "vehiculos"]))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True)
+def import_csv_command(entity, path, batch_size):
+    """Bulk-load a CSV file into clientes, proveedores or vehiculos."""
+    def progress(processed, inserted):
+        click.echo(f"\r{processed} filas leídas, {inserted} insertadas", nl=False)
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        result = import_csv(get_db(), entity, f, batch_size=batch_size, progress=progress)
+    click.echo()
+    for line, msg in result["errors"]:
+        click.echo(f"línea {line}: {msg}", err=True)
+
+
+# ---------------- EXPORTAR ----------------
+@app.route("/<any(clientes, empleados, vehiculos, almacenes, proveedores, ventas):entity>/exportar")
+@login_required
+@role_required(action='view')
+def exportar(entity):
+    formato = request.args.get('formato', 'csv')
+    if formato == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            flash("Exportar a Excel requiere openpyxl", "error")
+            return redirect(f"/{entity}")
+    sql, params, header = repositories[entity].export_query(request.args.get('q', '').strip())
+    # stream_with_context keeps the request (and its pooled connection) alive
+    # until the last chunk has been sent
+    rows = stream_rows(get_read_db(), sql, params)
+    if formato == 'xlsx':
+        body = xlsx_chunks(header, rows)
+        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        formato = 'csv'
+        body = csv_chunks(header, rows)
+        mimetype = "text/csv; charset=utf-8"
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={entity}.{formato}"})
 
 
-# ---------------- PROVEEDORES ----------------
-@app.route("/proveedores")
+# ---------------- JOBS ----------------
+def visible_job(job_id):
+    # Each empleado sees their own jobs; the jefe sees all of them
+    if not job_id:
+        return None
+    job = jobs.status(get_db().cursor(dictionary=True), job_id)
+    if job and (job["creado_por"] == session.get("empleado_id") or has_role('jefe')):
+        return job
+    return None
+
+
+@app.route("/jobs")
 @login_required
-def proveedores():
-    page = int(request.args.get('page', 1))
-    per_page = 10
-    offset = (page - 1) * per_page
-    q = request.args.get('q', '').strip()
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-    params = []
-    where = ''
-    if q:
-        like = f"%{q}%"
-        where = "WHERE nombre LIKE %s OR dni LIKE %s OR correo LIKE %s"
-        params = [like, like, like]
-    cursor.execute(f"SELECT COUNT(*) AS cnt FROM proveedores {where}", tuple(params))
-    total = cursor.fetchone()['cnt']
-    params2 = params + [per_page, offset]
-    cursor.execute(f"SELECT * FROM proveedores {where} LIMIT %s OFFSET %s", tuple(params2))
-    data = cursor.fetchall()
-    pages = max(1, (total + per_page - 1) // per_page)
-    db.close()
-    return render_template("proveedores.html", proveedores=data, page=page, per_page=per_page, total=total, pages=pages, q=q)
-
-
-@app.before_request
-def ensure_role_column():
-    # Run once per app lifetime: ensure the 'role' column exists and set initial 'jefe' for admin@example.com
-    if app.config.get('ROLE_COLUMN_CHECKED'):
-        return
-    db = None
-    try:
-        db = get_db()
-        cur = db.cursor()
-        cur.execute("SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s AND COLUMN_NAME='role'", ('erp_toyota','empleados'))
-        exists = cur.fetchone()[0]
-        if not exists:
-            cur.execute("ALTER TABLE empleados ADD COLUMN role VARCHAR(20) NOT NULL DEFAULT 'empleado'")
-            db.commit()
-            print('Added role column to empleados')
-        try:
-            cur.execute("UPDATE empleados SET role='jefe' WHERE correo=%s", ('admin@example.com',))
-            db.commit()
-        except Exception:
-            pass
-        cur.close()
-        app.config['ROLE_COLUMN_CHECKED'] = True
-    except Exception as e:
-        print('ensure_role_column error:', e)
-    finally:
-        if db:
-            db.close()
+@role_required('jefe')
+def jobs_list():
+    cursor = get_db().cursor(dictionary=True)
+    estado = request.args.get('estado') or None
+    return jsonify(counts=jobs.counts(cursor), jobs=jobs.recent(cursor, estado), workers=jobs.workers.metrics())
+
 
-@app.route("/proveedores/nuevo", methods=["GET", "POST"])
+@app.route("/jobs/<int:id>")
 @login_required
-@role_required(action='add')
-def nuevo_proveedor():
-    if request.method == "POST":
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO proveedores VALUES (NULL,%s,%s,%s,%s,%s)
-        """, (
-            request.form["nombre"],
-            request.form["dni"],
-            request.form["correo"],
-            request.form["contacto"],
-            request.form["tipo_suministro"]
-        ))
-        db.commit()
-        db.close()
-        return redirect("/proveedores")
-    return render_template("proveedores_form.html", proveedor=None)
+def job_status(id):
+    job = visible_job(id)
+    if job is None:
+        return jsonify(error="not found"), 404
+    return jsonify(job)
+
 
-@app.route("/proveedores/editar/<int:id>", methods=["GET", "POST"])
+@app.cli.command("jobs-worker")
+@click.option("--threads", default=max(jobs.JOBS_WORKERS, 1), show_default=True)
+def jobs_worker(threads):
+    """Run background jobs in this process until interrupted."""
+    click.echo(f"{threads} hilos atendiendo la cola de trabajos")
+    for thread in jobs.workers.start(threads):
+        thread.join()
+
+
+# ---------------- CAMBIOS ----------------
+@app.cli.command("purge-cambios")
+@click.option("--dias", default=30, show_default=True, help="Keep the changes of the last N days")
+def purge_cambios(dias):
+    """Delete old rows of the cambios change feed."""
+    click.echo(f"{changes.purge(get_db(), dias)} cambios borrados")
+
+
+# ---------------- DB POOL ----------------
+@app.route("/db/pool")
 @login_required
-@role_required(action='edit')
-def editar_proveedor(id):
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
+@role_required('jefe')
+def db_pool_metrics():
+    # Checkouts, waits and wait time to size DB_POOL_SIZE; replica health and lag
+    return jsonify(dict(pool.metrics(), replicas=replicas.metrics()))
 
-    if request.method == "POST":
-        cursor.execute("""
-            UPDATE proveedores
-            SET nombre=%s, dni=%s, correo=%s, contacto=%s, tipo_suministro=%s
-            WHERE id=%s
-        """, (
-            request.form["nombre"],
-            request.form["dni"],
-            request.form["correo"],
-            request.form["contacto"],
-            request.form["tipo_suministro"],
-            id
-        ))
-        db.commit()
+
+@app.route("/cache/stats")
+@login_required
+@role_required('jefe')
+def cache_metrics():
+    return jsonify(lookups=lookups.metrics(), pages=pages.metrics(), statements=statements.metrics())
+
+
+# ---------------- SCHEMA ----------------
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply init_db.sql and any pending migrations (run once per deploy)."""
+    migrations.ensure_database()
+    db = connect()
+    try:
+        applied = migrations.migrate(db, log=click.echo)
+    finally:
         db.close()
-        return redirect("/proveedores")
+    click.echo(f"{applied} migraciones aplicadas, esquema en versión {migrations.latest_version()}")
 
-    # GET: traer datos del proveedor a editar
-    cursor.execute("SELECT * FROM proveedores WHERE id=%s", (id,))
-    proveedor = cursor.fetchone()
-    db.close()
-    return render_template("proveedores_form.html", proveedor=proveedor)
 
-@app.route("/proveedores/eliminar/<int:id>")
-@login_required
-@role_required(action='delete')
-def eliminar_proveedor(id):
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("DELETE FROM proveedores WHERE id=%s", (id,))
-    db.commit()
-    db.close()
-    return redirect("/proveedores")
+def check_schema():
+    # Startup only: one cheap query, no DDL on the request path
+    db = None
+    try:
+        db = connect()
+        migrations.check_schema(db)
+    except Exception as e:
+        app.logger.warning("Comprobación de esquema: %s", e)
+    finally:
+        if db:
+            db.close()
+
+
+def metrics_allowed():
+    # A scraper sends METRICS_TOKEN as a bearer token; without one set only a
+    # jefe session may read them, unless METRICS_PUBLIC=1 opts out
+    token = os.environ.get("METRICS_TOKEN")
+    if token:
+        return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if os.environ.get("METRICS_PUBLIC") == "1":
+        return True
+    return "empleado_id" in session and bool(current_perms() & roles_mask("jefe"))
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    # Prometheus scrape target: SQL, routes, pool sizes and replica lag, so not public by default
+    if not metrics_allowed():
+        return Response("unauthorized\n", status=401, mimetype="text/plain")
+    # Each object's ``stats`` dict holds its cumulative counts; the rest of
+    # its metrics() are point-in-time gauges
+    extra = metrics.stats("erp_db_pool", "Connection pool", [({}, pool.metrics())], pool.stats)
+    extra += metrics.stats("erp_lookup_cache", "Lookup cache", [({}, lookups.metrics())], lookups.stats)
+    extra += metrics.stats("erp_page_cache", "Rendered page cache", [({}, pages.metrics())], pages.stats)
+    extra += metrics.stats("erp_prepared_statements", "Prepared statement cache", [({}, statements.metrics())],
+                           statements.stats)
+    extra += metrics.stats("erp_jobs", "Background job workers", [({}, jobs.workers.metrics())], jobs.workers.stats)
+    replica_metrics = replicas.metrics()
+    extra += metrics.stats("erp_db_reads", "Read routing", [({}, replica_metrics)], replicas.stats)
+    # One family per figure, labelled by replica; erp_db_replica_info maps the label to its address
+    named = list(enumerate(sorted(replica_metrics["replicas"].items())))
+    per_replica = [({"replica": str(i)}, values) for i, (_, values) in named]
+    info = [({"replica": str(i), "address": name}, {"info": 1}) for i, (name, _) in named]
+    extra += metrics.stats("erp_db_replica", "Read replica", per_replica, pool.stats)
+    extra += metrics.stats("erp_db_replica", "Read replica", info)
+    return Response(metrics.render(extra), mimetype="text/plain; version=0.0.4")
 
 
 # ---------------- RUN ----------------
 if __name__ == "__main__":
+    check_schema()
     app.run(debug=True)
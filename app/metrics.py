@@ -0,0 +1,246 @@
+"""Lightweight in-process metrics in the Prometheus text format.
+
+Every route, normalized SQL statement and template render is timed into a
+fixed-bucket histogram; ``/metrics`` renders them. Metrics are per process:
+under gunicorn each worker reports its own numbers.
+"""
+import logging
+import os
+import re
+import threading
+import time
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+
+slow_log = logging.getLogger("app.sql.slow")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for labels, series in sorted(items):
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+request_seconds = Histogram("erp_http_request_duration_seconds", "Request latency by route", ("route", "method", "status"))
+query_seconds = Histogram("erp_sql_query_duration_seconds", "Statement latency by normalized SQL", ("statement",))
+query_rows = Counter("erp_sql_rows_total", "Rows fetched by normalized SQL", ("statement",))
+connect_seconds = Histogram("erp_db_connection_wait_seconds", "Time to get a pooled connection", ())
+render_seconds = Histogram("erp_template_render_seconds", "Template render time", ("template",))
+slow_queries = Counter("erp_sql_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ("statement",))
+
+# Set to a list to record every (sql, params) executed through get_db(),
+# see bench/explain_check.py
+statement_log = None
+
+_IN_LIST = re.compile(r"IN \((?:%s\s*,\s*)+%s\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+_normalized = {}
+
+
+def normalize_sql(sql):
+    # Statements are parameterized already; only whitespace and variable-length
+    # IN lists differ between calls. Results are memoized per raw string.
+    label = _normalized.get(sql)
+    if label is None:
+        label = _IN_LIST.sub("IN (...)", _SPACES.sub(" ", sql).strip())[:200]
+        if len(_normalized) < 4096:
+            _normalized[sql] = label
+    return label
+
+
+def observe_query(sql, seconds):
+    label = normalize_sql(sql)
+    query_seconds.observe((label,), seconds)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc((label,))
+        slow_log.warning("%.1f ms: %s", seconds * 1000, label)
+    return label
+
+
+class InstrumentedCursor:
+    """Cursor proxy timing execute/executemany and counting fetched rows."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._label = None
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        if statement_log is not None:
+            statement_log.append((sql, params))
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params, *args, **kwargs)
+        finally:
+            self._label = observe_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_params, *args, **kwargs)
+        finally:
+            self._label = observe_query(sql, time.perf_counter() - start)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None and self._label:
+            query_rows.inc((self._label,))
+        return row
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        if self._label:
+            query_rows.inc((self._label,), len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """Connection proxy handing out instrumented cursors; ``raw`` is the pooled connection."""
+
+    def __init__(self, conn):
+        self.raw = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self.raw.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def start_request(g):
+    g._metrics_start = time.perf_counter()
+
+
+def end_request(g, request, response):
+    """Observe the request started by ``start_request``; shared by the Flask and Quart (app.asgi) halves."""
+    start = g.pop("_metrics_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        request_seconds.observe((route, request.method, str(response.status_code)), time.perf_counter() - start)
+    return response
+
+
+def init_app(app):
+    """Time every request and template render of ``app``."""
+    from flask import g, request, template_rendered, before_render_template
+
+    @app.before_request
+    def start_timer():
+        start_request(g)
+
+    @app.after_request
+    def record_request(response):
+        return end_request(g, request, response)
+
+    def render_started(sender, template, context, **extra_kw):
+        g._render_start = time.perf_counter()
+
+    def render_done(sender, template, context, **extra_kw):
+        start = g.pop("_render_start", None)
+        if start is not None:
+            render_seconds.observe((template.name,), time.perf_counter() - start)
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_done, app, weak=False)
+
+
+def render(extra_lines=()):
+    lines = []
+    for metric in (request_seconds, query_seconds, query_rows, slow_queries, connect_seconds, render_seconds):
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
+
+
+def stats(prefix, help, series, counters=()):
+    """Exposition lines for flat dicts of numbers (pool, cache and job stats).
+
+    ``series`` holds ``(labels, values)`` pairs, one per instance (``labels``
+    is a dict, empty when there is only one). Keys in ``counters`` only ever
+    grow and are exported as ``<prefix>_<key>_total`` counters, the other
+    numbers as gauges; every key is a single family across all instances.
+    """
+    families = {}
+    for labels, values in series:
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                families.setdefault(key, []).append((labels, value))
+    lines = []
+    for key, samples in sorted(families.items()):
+        kind = "counter" if key in counters else "gauge"
+        name = f"{prefix}_{key}_total" if kind == "counter" else f"{prefix}_{key}"
+        lines.append(f"# HELP {name} {help} ({key})")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return lines
@@ -0,0 +1,198 @@
+import importlib.util
+import os
+import re
+
+import mysql.connector
+
+from app.db import DB_CONFIG
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "init_db.sql")
+MIGRATIONS_DIR = os.path.join(ROOT, "migrations")
+
+# init_db.sql recreates the whole database; the runner applies it to the
+# configured database instead, so these statements are skipped.
+_SKIP = re.compile(r"^(DROP|CREATE)\s+DATABASE\b|^USE\b", re.IGNORECASE)
+# Table, column, key or foreign key already there, or not there to drop: what
+# a DDL statement that already ran fails with when it runs again
+ALREADY_APPLIED = {1050, 1060, 1061, 1091, 1826}
+
+
+class SchemaOutdated(Exception):
+    pass
+
+
+def split_sql(text):
+    statements, current = [], []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("--"):
+            continue
+        current.append(line)
+        if stripped.endswith(";"):
+            statement = "\n".join(current).strip().rstrip(";")
+            current = []
+            if not _SKIP.match(statement):
+                statements.append(statement)
+    if current:
+        statements.append("\n".join(current).strip())
+    return statements
+
+
+def available_migrations():
+    """``(version, name, path)`` for every file in migrations/, in order."""
+    found = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = re.match(r"^(\d+)_(\w+)\.(sql|py)$", filename)
+        if match:
+            found.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return sorted(found)
+
+
+def latest_version():
+    migrations = available_migrations()
+    return migrations[-1][0] if migrations else 0
+
+
+def _table_exists(cursor, table):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,),
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def current_version(cursor):
+    if not _table_exists(cursor, "schema_migrations"):
+        return None
+    cursor.execute("SELECT MAX(version) FROM schema_migrations")
+    version = cursor.fetchone()[0]
+    return -1 if version is None else version
+
+
+def _steps_done(cursor, version):
+    """Statements of ``version`` a previous run completed, or None if it never started."""
+    cursor.execute("SELECT steps FROM schema_migration_steps WHERE version=%s", (version,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _record_steps(db, cursor, version, steps):
+    cursor.execute(
+        "INSERT INTO schema_migration_steps (version, steps) VALUES (%s, %s) ON DUPLICATE KEY UPDATE steps=VALUES(steps)",
+        (version, steps),
+    )
+    db.commit()
+
+
+def _run_file(db, cursor, version, path):
+    """Apply one migration file.
+
+    A .sql file runs statement by statement, and each completed statement is
+    recorded in schema_migration_steps (with the data of a DML statement, in
+    the same commit). After a failure the next run resumes at the statement
+    that failed. A DDL statement commits on its own, so a crash right after
+    it can leave it applied but unrecorded: only there, on a resumed file, an
+    ALREADY_APPLIED error counts as done. A .py migration's ``upgrade`` must
+    be safe to run again itself.
+    """
+    if path.endswith(".py"):
+        spec = importlib.util.spec_from_file_location(os.path.basename(path)[:-3], path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(cursor)
+        return
+    with open(path, encoding="utf-8") as f:
+        statements = split_sql(f.read())
+    done = _steps_done(cursor, version)
+    resumed = done is not None
+    if not resumed:
+        done = 0
+        _record_steps(db, cursor, version, 0)
+    for step in range(done, len(statements)):
+        try:
+            cursor.execute(statements[step])
+        except mysql.connector.Error as e:
+            if not (resumed and step == done and e.errno in ALREADY_APPLIED):
+                raise
+        _record_steps(db, cursor, version, step + 1)
+
+
+def _record(db, cursor, version, name):
+    cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+    cursor.execute("DELETE FROM schema_migration_steps WHERE version=%s", (version,))
+    db.commit()
+
+
+def ensure_database():
+    # Create the configured database on a brand-new server
+    params = {k: v for k, v in DB_CONFIG.items() if k != "database"}
+    conn = mysql.connector.connect(**params)
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{DB_CONFIG['database']}`")
+    cursor.close()
+    conn.close()
+
+
+def migrate(db, log=print):
+    """Apply init_db.sql (on an empty database) and every pending migration.
+
+    Meant to run once per deploy, never from a request. Each migration is
+    recorded in schema_migrations. MySQL commits DDL implicitly, so a
+    migration that fails halfway can't be undone: the run stops, and the next
+    one resumes that migration after its last completed statement (see
+    ``_run_file``) once the cause is fixed.
+    """
+    cursor = db.cursor()
+    version = current_version(cursor)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migration_steps (
+            version INT PRIMARY KEY,
+            steps INT NOT NULL
+        )
+    """)
+    if version is None:
+        # A database created from init_db.sql before migrations existed
+        # already has the baseline tables
+        legacy = _table_exists(cursor, "empleados")
+        cursor.execute("""
+            CREATE TABLE schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(200) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        version = -1
+        if legacy:
+            _record(db, cursor, 0, "init_db")
+            version = 0
+    if version < 0:
+        # A new database, or init_db.sql stopped halfway on a previous run
+        log("Aplicando init_db.sql")
+        _run_file(db, cursor, 0, BASELINE)
+        _record(db, cursor, 0, "init_db")
+        version = 0
+
+    applied = 0
+    for number, name, path in available_migrations():
+        if number <= version:
+            continue
+        log(f"Aplicando migración {number:03d}_{name}")
+        _run_file(db, cursor, number, path)
+        _record(db, cursor, number, name)
+        applied += 1
+    cursor.close()
+    return applied
+
+
+def check_schema(db):
+    """Cheap startup check: raise SchemaOutdated if migrations are pending."""
+    cursor = db.cursor()
+    version = current_version(cursor)
+    cursor.close()
+    expected = latest_version()
+    if version is None or version < expected:
+        raise SchemaOutdated(
+            f"Esquema en versión {version}, se esperaba {expected}: ejecuta 'flask --app app.main migrate'"
+        )
+    return version
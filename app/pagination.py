@@ -0,0 +1,156 @@
+import base64
+import json
+import os
+import time
+
+PER_PAGE = 10
+
+# Counts are cached for a short while; tables bigger than APPROX_COUNT_MIN rows
+# use the InnoDB row estimate instead of an exact COUNT(*) when unfiltered.
+COUNT_CACHE_TTL = float(os.environ.get("COUNT_CACHE_TTL", 30))
+APPROX_COUNT_MIN = int(os.environ.get("APPROX_COUNT_MIN", 100000))
+_count_cache = {}
+APPROX_COUNT_SQL = (
+    "SELECT TABLE_ROWS AS cnt FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+)
+
+
+def encode_cursor(values, page, direction):
+    raw = json.dumps({"k": values, "p": page, "d": direction}, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    # Invalid or tampered tokens simply fall back to the first page
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+        return list(data["k"]), max(1, int(data.get("p", 1))), data["d"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _seek(columns, values, op):
+    # (a, b) > (x, y)  ->  a > x OR (a = x AND b > y), which MySQL can range-scan
+    clauses, params = [], []
+    for i, col in enumerate(columns):
+        parts = [f"{c} = %s" for c in columns[:i]] + [f"{col} {op} %s"]
+        clauses.append("(" + " AND ".join(parts) + ")")
+        params.extend(values[:i + 1])
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+def keyset_query(select, where, params, columns, token=None, descending=False, per_page=PER_PAGE):
+    """Build the seek query for one page; see ``keyset_page``.
+
+    Returns ``(sql, params, state)`` where ``state`` is handed to
+    ``keyset_result`` together with the fetched rows.
+    """
+    decoded = decode_cursor(token)
+    conds = [f"({where})"] if where else []
+    params = list(params)
+    page, backwards = 1, False
+    sql_desc = descending
+    if decoded and len(decoded[0]) == len(columns):
+        values, page, direction = decoded
+        backwards = direction == "prev"
+        sql_desc = descending != backwards
+        cond, seek_params = _seek(columns, values, "<" if sql_desc else ">")
+        conds.append(cond)
+        params += seek_params
+    else:
+        decoded = None
+
+    order = ", ".join(f"{c} {'DESC' if sql_desc else 'ASC'}" for c in columns)
+    sql = select
+    if conds:
+        sql += " WHERE " + " AND ".join(conds)
+    sql += f" ORDER BY {order} LIMIT %s"
+    state = {"page": page, "backwards": backwards, "seeking": decoded is not None, "per_page": per_page}
+    return sql, tuple(params + [per_page + 1]), state
+
+
+def keyset_result(rows, state, fields):
+    per_page = state["per_page"]
+    page, backwards = state["page"], state["backwards"]
+    rows = list(rows)
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        if not more:
+            # Walked back to the start of the listing
+            page = 1
+
+    def key(row):
+        return [row[f] for f in fields]
+
+    next_token = prev_token = None
+    if rows:
+        if more or backwards:
+            next_token = encode_cursor(key(rows[-1]), page + 1, "next")
+        if (more and backwards) or (state["seeking"] and not backwards):
+            prev_token = encode_cursor(key(rows[0]), page - 1, "prev")
+    return {"rows": rows, "page": page, "next": next_token, "prev": prev_token}
+
+
+def keyset_page(cursor, select, where, params, columns, fields, token=None, descending=False, per_page=PER_PAGE):
+    """Fetch one page of ``select`` ordered by ``columns`` using a seek condition.
+
+    ``select`` is a ``SELECT ... FROM ...`` without WHERE/ORDER/LIMIT, ``where``
+    an optional filter condition and ``fields`` the row keys holding the values
+    of ``columns`` (used to build the next/prev tokens). Returns a dict with
+    ``rows``, ``page``, ``next`` and ``prev``.
+    """
+    sql, params, state = keyset_query(select, where, params, columns, token, descending, per_page)
+    cursor.execute(sql, params)
+    return keyset_result(cursor.fetchall(), state, fields)
+
+
+def count_sql(from_sql, where):
+    sql = f"SELECT COUNT(*) AS cnt FROM {from_sql}"
+    if where:
+        sql += f" WHERE {where}"
+    return sql
+
+
+def cached_count(sql, params):
+    hit = _count_cache.get((sql, tuple(params)))
+    if hit and hit[1] > time.monotonic():
+        return hit[0]
+    return None
+
+
+def store_count(sql, params, total):
+    if len(_count_cache) > 1024:
+        _count_cache.clear()
+    _count_cache[(sql, tuple(params))] = (total, time.monotonic() + COUNT_CACHE_TTL)
+
+
+def count_rows(cursor, from_sql, where, params, table=None):
+    """Row count for a listing, cached for COUNT_CACHE_TTL seconds.
+
+    Unfiltered counts over a big ``table`` use the InnoDB estimate from
+    information_schema instead of scanning the table.
+    """
+    sql = count_sql(from_sql, where)
+    total = cached_count(sql, params)
+    if total is not None:
+        return total
+
+    if not where and table:
+        cursor.execute(APPROX_COUNT_SQL, (table,))
+        row = cursor.fetchone()
+        if row and row["cnt"] is not None and row["cnt"] >= APPROX_COUNT_MIN:
+            total = int(row["cnt"])
+    if total is None:
+        cursor.execute(sql, tuple(params))
+        total = cursor.fetchone()["cnt"]
+    store_count(sql, params, total)
+    return total
+
+
+def page_count(total, per_page=PER_PAGE):
+    return max(1, (total + per_page - 1) // per_page)
@@ -0,0 +1,424 @@
+"""Data access for the six ERP entities.
+
+Each entity is described once here: its readable and writable columns, the
+HTML form field names, the list source and the keyset order. The views, the
+JSON API, the exports, the CSV importer and the async views all build their
+SQL from these descriptions, so a query is tuned in one place for all of them.
+
+Every write also records its rows in the ``cambios`` outbox, in the same
+transaction (``record``; the feed is read by app.changes).
+
+Statements run on server-side prepared cursors kept per pooled connection
+(``StatementCache``): MySQL parses a statement once per connection and after
+that only its parameters travel.
+"""
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app import facets, inventory
+from app.cache import lookups
+from app.pagination import PER_PAGE, count_rows, keyset_query, keyset_result
+from app.search import filter_source
+
+# Prepared statements kept open per connection (0 runs everything on plain cursors)
+STATEMENT_CACHE_SIZE = int(os.environ.get("STATEMENT_CACHE_SIZE", 64))
+# Largest id list sent in one IN (...); shorter lists are padded to a few fixed
+# sizes so they share prepared statements
+IN_SIZES = (8, 32, 128, 512)
+
+
+class StatementCache:
+    """LRU of prepared cursors per connection, keyed by SQL text.
+
+    A pooled connection serves one request at a time, so only the registry of
+    connections is locked, not each connection's own statements.
+    """
+
+    def __init__(self, size=STATEMENT_CACHE_SIZE):
+        self.size = size
+        self._conns = weakref.WeakKeyDictionary()  # raw connection -> OrderedDict(sql -> (sql, cursor))
+        self._lock = threading.Lock()
+        self.stats = {"prepared": 0, "reused": 0, "evicted": 0}
+
+    def cursor(self, db, sql):
+        """``(sql, cursor)`` to run ``sql`` on ``db``.
+
+        The returned string must be the one executed: mysql-connector only
+        skips the re-prepare when it is the very same object it prepared.
+        """
+        raw = getattr(db, "raw", db)
+        with self._lock:
+            statements = self._conns.get(raw)
+            if statements is None:
+                statements = self._conns[raw] = OrderedDict()
+        entry = statements.get(sql)
+        if entry is not None:
+            statements.move_to_end(sql)
+            with self._lock:
+                self.stats["reused"] += 1
+            return entry
+        entry = statements[sql] = (sql, db.cursor(prepared=True, dictionary=True))
+        evicted = 0
+        while len(statements) > self.size:
+            evicted += 1
+            statements.popitem(last=False)[1][1].close()
+        with self._lock:
+            self.stats["prepared"] += 1
+            self.stats["evicted"] += evicted
+        return entry
+
+    def metrics(self):
+        with self._lock:
+            data = dict(self.stats)
+            data["connections"] = len(self._conns)
+            data["statements"] = sum(len(s) for s in self._conns.values())
+        return data
+
+
+statements = StatementCache()
+
+
+class Statements:
+    """Cursor-like front over ``statements``, usable wherever a dictionary cursor is.
+
+    Every result is read in full on execute, so the cached cursors are free
+    for the next statement as soon as this one returns.
+    """
+
+    def __init__(self, db, cache=statements):
+        self.db = db
+        self.cache = cache
+        self.rowcount = -1
+        self.lastrowid = None
+        self._rows = []
+
+    def _cursor(self, sql):
+        if not self.cache.size:
+            return sql, self.db.cursor(dictionary=True)
+        return self.cache.cursor(self.db, sql)
+
+    def _done(self, cursor, rows):
+        self._rows = rows
+        self.rowcount = cursor.rowcount
+        self.lastrowid = cursor.lastrowid
+        if not self.cache.size:
+            cursor.close()
+
+    def execute(self, sql, params=()):
+        sql, cursor = self._cursor(sql)
+        cursor.execute(sql, tuple(params))
+        self._done(cursor, cursor.fetchall() if cursor.with_rows else [])
+
+    def executemany(self, sql, seq_params):
+        sql, cursor = self._cursor(sql)
+        cursor.executemany(sql, [tuple(p) for p in seq_params])
+        self._done(cursor, [])
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        self._rows = []
+
+
+@contextmanager
+def transaction(db, *names):
+    """Commit the writes made in the block, invalidating the ``names`` cache versions with them.
+
+    Yields a plain cursor for statements that need one (rollups, roles_changed).
+    """
+    cursor = db.cursor()
+    try:
+        yield cursor
+        for name in names:
+            lookups.invalidate(cursor, name)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+    # This worker drops its entries only once the new rows are visible
+    for name in names:
+        lookups.forget(name)
+
+
+def in_batches(ids):
+    """Split ``ids`` into IN lists of the sizes in IN_SIZES, padded with their last id."""
+    ids = list(ids)
+    for start in range(0, len(ids), IN_SIZES[-1]):
+        chunk = ids[start:start + IN_SIZES[-1]]
+        size = next(s for s in IN_SIZES if s >= len(chunk))
+        yield chunk + [chunk[-1]] * (size - len(chunk))
+
+
+class Repository:
+    """SQL of one entity.
+
+    ``columns`` are the readable columns (never a password hash), ``writable``
+    the ones the app may set, ``api_writable`` whether the JSON API may write
+    them too, ``form`` maps columns to HTML form field names where they
+    differ and ``var`` is the record's name in ``<entity>_form.html``.
+    ``list_columns``/``alias`` and ``order`` describe the list source and
+    its keyset order as ``(columns, row fields, descending)``.
+
+    ``on_write(cursor, old_rows, new_rows)``, when given, is called inside
+    every write's transaction with the ``tracked`` columns of the affected
+    rows before and after it (locked FOR UPDATE), for rollups kept in step
+    with the table.
+    """
+
+    def __init__(self, name, columns, writable, var, form=None, api_writable=True, list_columns=None, alias="",
+                 order=(["id"], ["id"], False), on_write=None, tracked=None):
+        self.name = name
+        self.columns = columns
+        self.writable = writable
+        self.var = var
+        self.form = form or {}
+        self.api_writable = api_writable
+        self.alias = alias
+        self.list_columns = list_columns or [alias + c for c in columns]
+        self.order = order
+        self.on_write = on_write
+        self.tracked = tracked or ["id"]
+        self.table = f"{name} {alias[:-1]}" if alias else name
+        self._sql = {}
+
+    def sql(self, key, build):
+        # Built statements are kept so the same string object reaches the statement cache
+        sql = self._sql.get(key)
+        if sql is None:
+            sql = build()
+            # API field selections are user input: stop remembering new shapes past a bound
+            if len(self._sql) < 1024:
+                sql = self._sql.setdefault(key, sql)
+        return sql
+
+    def select(self, fields=None):
+        if fields is None:
+            return ", ".join(self.list_columns)
+        return ", ".join(self.alias + f for f in fields)
+
+    # ---- reads ----
+    def _filtered(self, q, filters):
+        source, where, params = filter_source(self.name, q)
+        if filters and filters[0]:
+            where = f"({where}) AND ({filters[0]})" if where else filters[0]
+            params = list(params) + list(filters[1])
+        return source, where, params
+
+    def list_query(self, q="", token=None, per_page=PER_PAGE, fields=None, filters=None):
+        """``(sql, params, state)`` of one keyset page of the list filtered by ``q``.
+
+        ``filters`` is an extra ``(where, params)`` condition on the entity's columns.
+        """
+        source, where, params = self._filtered(q, filters)
+        columns, _, descending = self.order
+        sql, params, state = keyset_query(f"SELECT {self.select(fields)} FROM {source}", where, params, columns,
+                                          token, descending, per_page)
+        return self.sql(sql, lambda: sql), params, state
+
+    def count_query(self, q="", filters=None):
+        """``(from_sql, where, params, table)`` for app.pagination.count_rows."""
+        if not q and not (filters and filters[0]):
+            return self.name, "", [], self.name
+        source, where, params = self._filtered(q, filters)
+        return source, where, params, None
+
+    def page(self, db, q="", token=None, per_page=PER_PAGE, fields=None, filters=None):
+        sql, params, state = self.list_query(q, token, per_page, fields, filters)
+        cursor = Statements(db)
+        cursor.execute(sql, params)
+        return keyset_result(cursor.fetchall(), state, self.order[1])
+
+    def count(self, db, q="", filters=None):
+        return count_rows(Statements(db), *self.count_query(q, filters))
+
+    def get_sql(self, fields=None):
+        fields = tuple(fields or self.columns)
+        return self.sql(("get", fields), lambda: f"SELECT {', '.join(fields)} FROM {self.name} WHERE id=%s")
+
+    def get(self, db, id, fields=None):
+        cursor = Statements(db)
+        cursor.execute(self.get_sql(fields), (id,))
+        return cursor.fetchone()
+
+    def get_many(self, db, ids, fields=None):
+        """Rows with an id in ``ids``, in id order, a few IN queries for any number of ids."""
+        fields = tuple(fields or self.columns)
+        cursor = Statements(db)
+        rows = {}
+        for batch in in_batches(sorted(set(ids))):
+            sql = self.sql(("get_many", fields, len(batch)), lambda: (
+                f"SELECT {', '.join(fields)} FROM {self.name} WHERE id IN ({','.join(['%s'] * len(batch))})"))
+            cursor.execute(sql, batch)
+            rows.update((row["id"], row) for row in cursor.fetchall())
+        return [rows[i] for i in sorted(rows)]
+
+    def export_query(self, q=""):
+        """``(sql, params, header)`` of the whole list filtered by ``q``, in id order."""
+        source, where, params = filter_source(self.name, q)
+        if where:
+            where = f" WHERE {where}"
+        sql = f"SELECT {self.select()} FROM {source}{where} ORDER BY {self.alias}id"
+        header = [c.split(" AS ")[-1].split(".")[-1] for c in self.list_columns]
+        return sql, params, header
+
+    # ---- writes (inside transaction(db, repo.name)) ----
+    def from_form(self, form, columns=None):
+        """Values of ``columns`` (default: every writable one) posted by ``<entity>_form.html``."""
+        return {col: form[self.form.get(col, col)] for col in columns or self.writable}
+
+    def _columns(self, values):
+        cols = tuple(c for c in self.writable if c in values)
+        unknown = set(values) - set(cols)
+        if unknown:
+            raise ValueError("Campos no editables: " + ", ".join(sorted(unknown)))
+        return cols
+
+    def insert_sql(self, cols):
+        return self.sql(("insert", cols), lambda: (
+            f"INSERT INTO {self.name} ({', '.join(cols)}) VALUES ({', '.join(['%s'] * len(cols))})"))
+
+    def update_sql(self, cols):
+        return self.sql(("update", cols), lambda: (
+            f"UPDATE {self.name} SET {', '.join(f'{c}=%s' for c in cols)} WHERE id=%s"))
+
+    def delete_sql(self, count=1):
+        if count == 1:
+            return self.sql("delete", lambda: f"DELETE FROM {self.name} WHERE id=%s")
+        return self.sql(("delete", count), lambda: (
+            f"DELETE FROM {self.name} WHERE id IN ({','.join(['%s'] * count)})"))
+
+    def _tracked(self, db, ids):
+        if not self.on_write:
+            return []
+        cursor = Statements(db)
+        rows = []
+        for batch in in_batches(sorted(set(ids))):
+            sql = self.sql(("tracked", len(batch)), lambda: (
+                f"SELECT {', '.join(self.tracked)} FROM {self.name} "
+                f"WHERE id IN ({','.join(['%s'] * len(batch))}) FOR UPDATE"))
+            cursor.execute(sql, batch)
+            rows.extend(cursor.fetchall())
+        return rows
+
+    def written(self, db, old, ids):
+        """Run ``on_write`` for ``ids``, given the ``old`` tracked rows; bulk loads call it themselves."""
+        if self.on_write:
+            self.on_write(Statements(db), old, self._tracked(db, ids))
+
+    def change_sql(self, operacion, count):
+        def build():
+            datos = ", ".join(f"'{c}', {c}" for c in self.columns)
+            return (f"INSERT INTO cambios (entidad, entidad_id, operacion, datos) "
+                    f"SELECT '{self.name}', id, '{operacion}', JSON_OBJECT({datos}) "
+                    f"FROM {self.name} WHERE id IN ({','.join(['%s'] * count)})")
+        return self.sql(("change", operacion, count), build)
+
+    def record(self, cursor, operacion, ids):
+        """Add the cambios rows of ``ids`` on ``cursor``: after an insert or update, before a delete."""
+        for batch in in_batches(sorted(set(ids))):
+            cursor.execute(self.change_sql(operacion, len(batch)), tuple(batch))
+
+    def insert(self, db, values):
+        """Insert one row from a column -> value dict; returns its id."""
+        cols = self._columns(values)
+        cursor = Statements(db)
+        cursor.execute(self.insert_sql(cols), tuple(values[c] for c in cols))
+        id = cursor.lastrowid
+        self.record(cursor, "insert", [id])
+        self.written(db, [], [id])
+        return id
+
+    def insert_many(self, db, items):
+        """Insert every dict in ``items`` (row by row, on the cached statements); returns their ids in order."""
+        return [self.insert(db, item) for item in items]
+
+    def update(self, db, id, values):
+        cols = self._columns(values)
+        old = self._tracked(db, [id])
+        cursor = Statements(db)
+        cursor.execute(self.update_sql(cols), tuple(values[c] for c in cols) + (id,))
+        updated = cursor.rowcount
+        self.record(cursor, "update", [id])
+        self.written(db, old, [id])
+        return updated
+
+    def update_many(self, db, items):
+        """Apply ``{"id": .., col: ..}`` dicts; items changing the same columns share one executemany."""
+        groups = {}
+        for item in items:
+            values = {k: v for k, v in item.items() if k != "id"}
+            cols = self._columns(values)
+            if not cols:
+                raise ValueError("Nada que actualizar en el id %s" % item["id"])
+            groups.setdefault(cols, []).append(tuple(values[c] for c in cols) + (item["id"],))
+        ids = [item["id"] for item in items]
+        old = self._tracked(db, ids)
+        cursor = Statements(db)
+        updated = 0
+        for cols, rows in groups.items():
+            cursor.executemany(self.update_sql(cols), rows)
+            updated += cursor.rowcount
+        self.record(cursor, "update", ids)
+        self.written(db, old, ids)
+        return updated
+
+    def delete(self, db, id):
+        old = self._tracked(db, [id])
+        cursor = Statements(db)
+        self.record(cursor, "delete", [id])
+        cursor.execute(self.delete_sql(), (id,))
+        deleted = cursor.rowcount
+        self.written(db, old, [])
+        return deleted
+
+    def delete_many(self, db, ids):
+        old = self._tracked(db, ids)
+        cursor = Statements(db)
+        self.record(cursor, "delete", ids)
+        deleted = 0
+        for batch in in_batches(sorted(set(ids))):
+            cursor.execute(self.delete_sql(len(batch)), batch)
+            deleted += cursor.rowcount
+        self.written(db, old, [])
+        return deleted
+
+
+repositories = {
+    "clientes": Repository(
+        "clientes", ["id", "nombre", "dni", "correo", "telefono", "pais", "tipo"],
+        ["nombre", "dni", "correo", "telefono", "pais", "tipo"], "cliente"),
+    "proveedores": Repository(
+        "proveedores", ["id", "nombre", "dni", "correo", "contacto", "tipo_suministro"],
+        ["nombre", "dni", "correo", "contacto", "tipo_suministro"], "proveedor"),
+    "vehiculos": Repository(
+        "vehiculos", ["id", "modelo", "tipo", "anio", "color", "precio_venta", "costo_fabricante"],
+        ["modelo", "tipo", "anio", "color", "precio_venta", "costo_fabricante"], "vehiculo",
+        form={"precio_venta": "precio", "costo_fabricante": "costo"},
+        on_write=facets.vehiculos_changed, tracked=facets.COLUMNS),
+    "almacenes": Repository(
+        "almacenes", ["id", "ubicacion", "correo", "tipo_almacen", "capacidad", "disponible"],
+        ["ubicacion", "correo", "tipo_almacen", "capacidad", "disponible"], "almacen",
+        on_write=inventory.almacenes_changed, tracked=inventory.COLUMNS),
+    # Passwords and roles only change through the empleado forms
+    "empleados": Repository(
+        "empleados", ["id", "nombre", "dni", "correo", "direccion", "departamento", "role", "salario"],
+        ["nombre", "dni", "correo", "direccion", "departamento", "salario", "contrasena", "role"], "empleado",
+        api_writable=False),
+    # Ventas move stock and the daily rollup, so they are created through app.sales
+    "ventas": Repository(
+        "ventas", ["id", "fecha", "total", "empleado_id", "cliente_id"],
+        ["fecha", "total", "empleado_id", "cliente_id"], "venta",
+        form={"empleado_id": "empleado"}, api_writable=False,
+        list_columns=["v.id", "v.fecha", "v.total", "e.nombre AS empleado"], alias="v.",
+        order=(["v.fecha", "v.id"], ["fecha", "id"], True)),
+}
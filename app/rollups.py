@@ -0,0 +1,76 @@
+# Daily x empleado sales rollup kept in ventas_diarias.
+# Every write to ventas applies its delta here inside the same transaction,
+# so the dashboard never has to aggregate the raw ventas table.
+# Totals stay Decimal all the way to the DECIMAL column.
+from decimal import Decimal
+
+
+def apply_venta(cursor, fecha, empleado_id, total, sign=1):
+    if not fecha or not empleado_id:
+        return
+    cursor.execute("""
+        INSERT INTO ventas_diarias (fecha, empleado_id, total, num_ventas)
+        VALUES (%s,%s,%s,%s)
+        ON DUPLICATE KEY UPDATE total = total + VALUES(total), num_ventas = num_ventas + VALUES(num_ventas)
+    """, (fecha, empleado_id, sign * Decimal(total or 0), sign))
+    if sign < 0:
+        cursor.execute(
+            "DELETE FROM ventas_diarias WHERE fecha=%s AND empleado_id=%s AND num_ventas <= 0",
+            (fecha, empleado_id),
+        )
+
+
+def lock_venta(cursor, venta_id):
+    # Old values of a venta about to change, row-locked until commit
+    cursor.execute("SELECT fecha, total, empleado_id FROM ventas WHERE id=%s FOR UPDATE", (venta_id,))
+    return cursor.fetchone()
+
+
+def remove_venta(cursor, old):
+    if old:
+        fecha, total, empleado_id = old
+        apply_venta(cursor, fecha, empleado_id, total, sign=-1)
+
+
+def backfill(db):
+    """Rebuild ventas_diarias from scratch out of the ventas table."""
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM ventas_diarias")
+    cursor.execute("""
+        INSERT INTO ventas_diarias (fecha, empleado_id, total, num_ventas)
+        SELECT fecha, empleado_id, COALESCE(SUM(total), 0), COUNT(*)
+        FROM ventas
+        WHERE fecha IS NOT NULL AND empleado_id IS NOT NULL
+        GROUP BY fecha, empleado_id
+    """)
+    rows = cursor.rowcount
+    db.commit()
+    cursor.close()
+    return rows
+
+
+def totals_by_period(cursor, desde, hasta, granularity="dia"):
+    period = "fecha" if granularity == "dia" else "DATE_FORMAT(fecha, '%%Y-%%m')"
+    cursor.execute(f"""
+        SELECT {period} AS periodo, SUM(total) AS total, SUM(num_ventas) AS num_ventas
+        FROM ventas_diarias
+        WHERE fecha BETWEEN %s AND %s
+        GROUP BY periodo
+        ORDER BY periodo
+    """, (desde, hasta))
+    return cursor.fetchall()
+
+
+def totals_by_empleado(cursor, desde, hasta):
+    cursor.execute("""
+        SELECT e.id, e.nombre, t.total, t.num_ventas
+        FROM (
+            SELECT empleado_id, SUM(total) AS total, SUM(num_ventas) AS num_ventas
+            FROM ventas_diarias
+            WHERE fecha BETWEEN %s AND %s
+            GROUP BY empleado_id
+        ) t
+        JOIN empleados e ON e.id = t.empleado_id
+        ORDER BY t.total DESC
+    """, (desde, hasta))
+    return cursor.fetchall()
@@ -0,0 +1,155 @@
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from app import inventory, rollups
+from app.cache import lookups
+from app.repository import repositories
+
+# Deadlocks and lock-wait timeouts are retried a few times before giving up
+RETRY_ERRORS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+MAX_RETRIES = 3
+
+
+class StockInsuficiente(Exception):
+    pass
+
+
+def parse_lines(form):
+    """Line items from the parallel vehiculo_id/almacen_id/cantidad/precio fields of the venta form."""
+    lines = []
+    for vehiculo, almacen, cantidad, precio in zip(
+        form.getlist("vehiculo_id"), form.getlist("almacen_id"), form.getlist("cantidad"), form.getlist("precio_unitario")
+    ):
+        if not vehiculo:
+            continue
+        cantidad = int(cantidad or 1)
+        if cantidad <= 0:
+            raise ValueError("La cantidad debe ser mayor que cero")
+        try:
+            precio = Decimal(precio or 0)
+        except InvalidOperation:
+            raise ValueError("Precio no numérico")
+        lines.append({
+            "vehiculo_id": int(vehiculo),
+            "almacen_id": int(almacen),
+            "cantidad": cantidad,
+            "precio_unitario": precio,
+        })
+    return lines
+
+
+def parse_total(value):
+    """The total typed into the venta form, as a Decimal (ValueError if it isn't a number)."""
+    try:
+        return Decimal(value or 0)
+    except InvalidOperation:
+        raise ValueError("Total no numérico")
+
+
+def lines_total(cursor, venta_id):
+    """Sum of a venta's line items, or None for a venta without them."""
+    cursor.execute("SELECT SUM(cantidad * precio_unitario) FROM venta_lineas WHERE venta_id=%s", (venta_id,))
+    return cursor.fetchone()[0]
+
+
+def _reserve_stock(cursor, lines):
+    # One conditional UPDATE per almacen: the row lock and the stock check are
+    # a single atomic statement, so two sales can never both take the last unit.
+    # Almacenes are always locked in id order so concurrent sales can't deadlock
+    # on each other.
+    needed = defaultdict(int)
+    for line in lines:
+        needed[line["almacen_id"]] += line["cantidad"]
+    for almacen_id in sorted(needed):
+        cursor.execute(
+            "UPDATE almacenes SET disponible = disponible - %s WHERE id=%s AND disponible >= %s",
+            (needed[almacen_id], almacen_id, needed[almacen_id]),
+        )
+        if cursor.rowcount != 1:
+            raise StockInsuficiente(f"Stock insuficiente en el almacén {almacen_id}")
+    return {almacen_id: -n for almacen_id, n in needed.items()}
+
+
+def _release_stock(cursor, venta_id):
+    cursor.execute("""
+        SELECT almacen_id, SUM(cantidad) FROM venta_lineas
+        WHERE venta_id=%s GROUP BY almacen_id ORDER BY almacen_id
+    """, (venta_id,))
+    released = dict(cursor.fetchall())
+    for almacen_id, cantidad in released.items():
+        cursor.execute("UPDATE almacenes SET disponible = disponible + %s WHERE id=%s", (cantidad, almacen_id))
+    return released
+
+
+def _with_retries(db, work):
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            result = work()
+            db.commit()
+            return result
+        except mysql.connector.Error as e:
+            db.rollback()
+            if e.errno not in RETRY_ERRORS or attempt == MAX_RETRIES:
+                raise
+            time.sleep(0.01 * (attempt + 1))
+        except Exception:
+            db.rollback()
+            raise
+
+
+def create_sale(db, fecha, empleado_id, lines, cliente_id=None, total=None):
+    """Insert a venta with its line items and take the stock, in one transaction.
+
+    Without ``lines`` this is a plain venta with the given ``total``, as before
+    line items existed. Raises StockInsuficiente (nothing is written) when an
+    almacen can't cover the quantities.
+    """
+    if lines:
+        total = sum(line["cantidad"] * line["precio_unitario"] for line in lines)
+
+    def work():
+        cursor = db.cursor()
+        deltas = _reserve_stock(cursor, lines) if lines else {}
+        cursor.execute(
+            "INSERT INTO ventas (fecha, total, empleado_id, cliente_id) VALUES (%s,%s,%s,%s)",
+            (fecha, total, empleado_id, cliente_id or None),
+        )
+        venta_id = cursor.lastrowid
+        repositories["ventas"].record(cursor, "insert", [venta_id])
+        if lines:
+            cursor.executemany("""
+                INSERT INTO venta_lineas (venta_id, vehiculo_id, almacen_id, cantidad, precio_unitario)
+                VALUES (%s,%s,%s,%s,%s)
+            """, [(venta_id, l["vehiculo_id"], l["almacen_id"], l["cantidad"], l["precio_unitario"]) for l in lines])
+        # Rollups in the same order as delete_sale: inventory, then ventas_diarias
+        inventory.stock_moved(db, deltas)
+        rollups.apply_venta(cursor, fecha, empleado_id, total)
+        repositories["almacenes"].record(cursor, "update", sorted(deltas))
+        cursor.close()
+        return venta_id
+
+    venta_id = _with_retries(db, work)
+    # Bumped after the commit, so concurrent sales don't queue on the version rows
+    lookups.bump(db, "ventas", *(["almacenes"] if lines else []))
+    return venta_id
+
+
+def delete_sale(db, venta_id):
+    """Delete a venta, give its units back to their almacenes and update the rollup."""
+    def work():
+        cursor = db.cursor()
+        old = rollups.lock_venta(cursor, venta_id)
+        deltas = _release_stock(cursor, venta_id)
+        inventory.stock_moved(db, deltas)
+        repositories["almacenes"].record(cursor, "update", sorted(deltas))
+        repositories["ventas"].record(cursor, "delete", [venta_id])
+        cursor.execute("DELETE FROM ventas WHERE id=%s", (venta_id,))
+        rollups.remove_venta(cursor, old)
+        cursor.close()
+
+    _with_retries(db, work)
+    lookups.bump(db, "ventas", "almacenes")
@@ -0,0 +1,105 @@
+import re
+from datetime import date, timedelta
+
+# ngram_token_size used by the FULLTEXT ... WITH PARSER ngram indexes (migrations 003, 008, 013 and 015)
+NGRAM_TOKEN_SIZE = 2
+
+# Per entity: the full-text indexed columns (each with its own ngram index,
+# matched anywhere in the value) and identifiers matched by exact prefix
+# (backed by B-tree indexes).
+SEARCH_FIELDS = {
+    "clientes": {"text": ["nombre"], "prefix": ["dni", "correo"]},
+    "proveedores": {"text": ["nombre"], "prefix": ["dni", "correo"]},
+    "empleados": {"text": ["nombre", "departamento", "role"], "prefix": ["dni", "correo"]},
+    "vehiculos": {"text": ["modelo", "tipo", "color"], "prefix": []},
+    "almacenes": {"text": ["ubicacion", "tipo_almacen"], "prefix": []},
+}
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def fulltext_query(q):
+    # Boolean-mode query requiring every word; quoting makes the ngram parser
+    # match each word as a substring, like the old LIKE '%q%' did.
+    tokens = [t for t in re.findall(r"\w+", q) if len(t) >= NGRAM_TOKEN_SIZE]
+    return " ".join(f'+"{t}"' for t in tokens)
+
+
+def search_source(entity, q):
+    """FROM clause restricting ``entity`` to the rows matching ``q``.
+
+    Each branch of the UNION is resolved by its own index (FULLTEXT on the
+    name and other text, B-tree prefix range on dni/correo), then joined back by id so the
+    listing can keep seeking on ``id``. Returns ``(from_sql, params)``.
+    """
+    fields = SEARCH_FIELDS[entity]
+    prefix = _escape_like(q) + "%"
+    branches, params = [], []
+    ft = fulltext_query(q)
+    for col in fields["text"]:
+        if ft:
+            branches.append(f"SELECT id FROM {entity} WHERE MATCH({col}) AGAINST (%s IN BOOLEAN MODE)")
+            params.append(ft)
+        else:
+            branches.append(f"SELECT id FROM {entity} WHERE {col} LIKE %s")
+            params.append(prefix)
+    for col in fields["prefix"]:
+        branches.append(f"SELECT id FROM {entity} WHERE {col} LIKE %s")
+        params.append(prefix)
+    return f"{entity} JOIN ({' UNION '.join(branches)}) AS hits USING (id)", params
+
+
+LIST_SOURCES = {"ventas": "ventas v JOIN empleados e ON v.empleado_id = e.id"}
+DATE_PREFIX = re.compile(r"^(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$")
+
+
+def _date_span(q):
+    # "2024", "2024-03" or "2024-03-15" -> first and last day covered
+    m = DATE_PREFIX.match(q)
+    if not m:
+        return None
+    year, month, day = (int(g) if g else None for g in m.groups())
+    try:
+        if day:
+            start = end = date(year, month, day)
+        elif month:
+            start = date(year, month, 1)
+            end = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        else:
+            start, end = date(year, 1, 1), date(year, 12, 31)
+    except ValueError:
+        return None
+    return [start, end]
+
+
+def ventas_filter(q):
+    """``(where, params)`` for the ventas list: by id, by fecha prefix or by empleado name.
+
+    Each form is resolved by an index (primary key, idx_ventas_fecha_id, the
+    empleados FULLTEXT index plus the empleado_id foreign key).
+    """
+    span = _date_span(q)
+    if q.isdigit():
+        if span:
+            return "(v.id = %s OR v.fecha BETWEEN %s AND %s)", [int(q)] + span
+        return "v.id = %s", [int(q)]
+    if span:
+        return "v.fecha BETWEEN %s AND %s", span
+    ft = fulltext_query(q)
+    if ft:
+        return "v.empleado_id IN (SELECT id FROM empleados WHERE MATCH(nombre) AGAINST (%s IN BOOLEAN MODE))", [ft]
+    return "e.nombre LIKE %s", [_escape_like(q) + "%"]
+
+
+def filter_source(entity, q):
+    """``(from_sql, where, params)`` for the list of ``entity`` filtered by ``q``."""
+    source = LIST_SOURCES.get(entity, entity)
+    if not q:
+        return source, "", []
+    if entity == "ventas":
+        where, params = ventas_filter(q)
+        return source, where, params
+    source, params = search_source(entity, q)
+    return source, "", params
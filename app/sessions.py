@@ -0,0 +1,242 @@
+"""Server-side sessions.
+
+The cookie only carries a random session id; the payload lives in a store
+chosen with ``SESSION_STORE``:
+
+* ``sqlite:///path/to/sessions.db``: shared by every worker on the host; the
+  default is ``instance/sessions.db`` next to the ``app`` package, in a
+  directory only the app's user can enter
+* ``memory``: one process only (dev server, single uvicorn worker)
+* ``redis://host:6379/0``: shared across hosts, needs the ``redis`` package
+
+Every session of an empleado records that empleado's generation number when
+it is written; ``revoke(empleado_id)`` bumps the number, which invalidates all
+of their sessions at once without touching them. Validating a request is one
+lookup in the store, never a MySQL round-trip.
+"""
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+SESSION_TTL = int(os.environ.get("SESSION_TTL", 8 * 3600))
+# Flask's default instance folder for this app; never a shared directory like /tmp
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance")
+DEFAULT_STORE = "sqlite:///" + os.path.join(INSTANCE_DIR, "sessions.db")
+
+serializer = TaggedJSONSerializer()
+
+
+class MemoryStore:
+    def __init__(self):
+        self._sessions = {}  # sid -> (payload, empleado_id, expires)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        entry = self._sessions.get(sid)
+        if entry is None or entry[2] < time.time():
+            return None, 0
+        return entry[0], self._generations.get(entry[1], 0)
+
+    def save(self, sid, payload, empleado_id, ttl):
+        with self._lock:
+            self._sessions[sid] = (payload, empleado_id, time.time() + ttl)
+            if len(self._sessions) % 1000 == 0:
+                now = time.time()
+                self._sessions = {k: v for k, v in self._sessions.items() if v[2] >= now}
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def generation(self, empleado_id):
+        return self._generations.get(empleado_id, 0)
+
+    def revoke(self, empleado_id):
+        with self._lock:
+            self._generations[empleado_id] = self._generations.get(empleado_id, 0) + 1
+
+
+class SQLiteStore:
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        # Session rows are bearer credentials: keep the directory and the
+        # database (WAL and shm files included) private to this user
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if os.stat(directory).st_mode & 0o077:
+            raise RuntimeError(f"{directory} es accesible por otros usuarios; usa un directorio con permisos 0700")
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    sid TEXT PRIMARY KEY, payload TEXT NOT NULL, empleado_id INTEGER, expires REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS generations (empleado_id INTEGER PRIMARY KEY, generation INTEGER)")
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork (gunicorn preload)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def load(self, sid):
+        row = self._connection().execute("""
+            SELECT s.payload, COALESCE(g.generation, 0) FROM sessions s
+            LEFT JOIN generations g ON g.empleado_id = s.empleado_id
+            WHERE s.sid = ? AND s.expires >= ?
+        """, (sid, time.time())).fetchone()
+        return row if row else (None, 0)
+
+    def save(self, sid, payload, empleado_id, ttl):
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)", (sid, payload, empleado_id, time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM sessions WHERE expires < ?", (time.time(),))
+
+    def delete(self, sid):
+        self._connection().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def generation(self, empleado_id):
+        row = self._connection().execute(
+            "SELECT generation FROM generations WHERE empleado_id = ?", (empleado_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def revoke(self, empleado_id):
+        self._connection().execute("""
+            INSERT INTO generations VALUES (?, 1)
+            ON CONFLICT (empleado_id) DO UPDATE SET generation = generation + 1
+        """, (empleado_id,))
+
+
+class RedisStore:
+    def __init__(self, url):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+
+    def load(self, sid):
+        payload = self.redis.get(f"session:{sid}")
+        if payload is None:
+            return None, 0
+        payload = payload.decode()
+        empleado_id = serializer.loads(payload).get("empleado_id")
+        return payload, self.generation(empleado_id) if empleado_id is not None else 0
+
+    def save(self, sid, payload, empleado_id, ttl):
+        self.redis.set(f"session:{sid}", payload, ex=ttl)
+
+    def delete(self, sid):
+        self.redis.delete(f"session:{sid}")
+
+    def generation(self, empleado_id):
+        return int(self.redis.get(f"session-gen:{empleado_id}") or 0)
+
+    def revoke(self, empleado_id):
+        self.redis.incr(f"session-gen:{empleado_id}")
+
+
+def open_store(url):
+    if url == "memory":
+        return MemoryStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(url)
+    raise ValueError(f"SESSION_STORE no soportado: {url}")
+
+
+store = open_store(os.environ.get("SESSION_STORE", DEFAULT_STORE))
+
+
+def revoke(empleado_id):
+    """End every session of ``empleado_id`` (deleted or locked out empleado)."""
+    store.revoke(empleado_id)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, generation=0):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.generation = generation
+        self.owner = (initial or {}).get("empleado_id")
+        self.modified = False
+        self.accessed = False
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface over a session store; app.asgi reuses ``load``/``write``."""
+
+    def __init__(self, store, ttl=SESSION_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def load(self, sid):
+        if sid:
+            payload, generation = self.store.load(sid)
+            if payload is not None:
+                data = serializer.loads(payload)
+                # Sessions written before a revoke() carry an older generation
+                if data.pop("_gen", 0) == generation or data.get("empleado_id") is None:
+                    return ServerSession(data, sid, generation)
+        return ServerSession()
+
+    def write(self, cookies, app, session, response):
+        """Persist ``session`` and set its cookie; ``cookies`` provides the get_cookie_* settings."""
+        name = cookies.get_cookie_name(app)
+        domain = cookies.get_cookie_domain(app)
+        path = cookies.get_cookie_path(app)
+        if not session:
+            if session.sid:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified and session.sid:
+            return
+        empleado_id = session.get("empleado_id")
+        if session.sid is None or empleado_id != session.owner:
+            # New id whenever the session changes hands (login), against fixation
+            if session.sid:
+                self.store.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.owner = empleado_id
+            session.generation = self.store.generation(empleado_id) if empleado_id is not None else 0
+        payload = serializer.dumps({**session, "_gen": session.generation})
+        self.store.save(session.sid, payload, empleado_id, self.ttl)
+        response.set_cookie(
+            name,
+            session.sid,
+            max_age=self.ttl,
+            httponly=cookies.get_cookie_httponly(app),
+            secure=cookies.get_cookie_secure(app),
+            samesite=cookies.get_cookie_samesite(app),
+            domain=domain,
+            path=path,
+        )
+
+    def open_session(self, app, request):
+        return self.load(request.cookies.get(self.get_cookie_name(app)))
+
+    def save_session(self, app, session, response):
+        self.write(self, app, session, response)
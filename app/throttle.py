@@ -0,0 +1,133 @@
+"""Login throttling: token buckets, a negative cache and a bounded hashing pool.
+
+The hashing pool also hashes new passwords (register, empleado forms), so a
+burst of sign-ups can't take more CPU than a burst of logins.
+
+All state is per worker process, so the effective limits are multiplied by
+the number of workers; they exist to keep a burst of bad logins from eating
+every CPU and DB connection, not as an exact quota.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app.cache import lookups
+
+LOGIN_IP_RATE = float(os.environ.get("LOGIN_IP_RATE", 1))  # attempts per second
+LOGIN_IP_BURST = int(os.environ.get("LOGIN_IP_BURST", 20))
+LOGIN_ACCOUNT_RATE = float(os.environ.get("LOGIN_ACCOUNT_RATE", 0.1))  # failures per second
+LOGIN_ACCOUNT_BURST = int(os.environ.get("LOGIN_ACCOUNT_BURST", 5))
+LOGIN_HASH_WORKERS = int(os.environ.get("LOGIN_HASH_WORKERS", 2))
+LOGIN_HASH_QUEUE = int(os.environ.get("LOGIN_HASH_QUEUE", 16))
+UNKNOWN_CORREO_TTL = float(os.environ.get("UNKNOWN_CORREO_TTL", 300))
+
+# Checked instead of a real hash for unknown correos, so they cost the same
+# as a wrong password and response times don't reveal which accounts exist
+DUMMY_HASH = generate_password_hash("erp_toyota-dummy")
+
+
+class HashPoolBusy(Exception):
+    pass
+
+
+class TokenBuckets:
+    """One token bucket per key, the least recently used keys dropped past ``max_keys``."""
+
+    def __init__(self, rate, burst, max_keys=50000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def _tokens(self, key, now):
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def wait_time(self, key):
+        """Seconds until ``key`` has a token again (0 if it has one now)."""
+        with self._lock:
+            tokens = self._tokens(key, time.monotonic())
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def take(self, key):
+        """Spend one token; returns the wait time instead when the bucket is empty."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(key, now)
+            if tokens < 1:
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0.0
+
+
+class NegativeCache:
+    """Correos known not to belong to any empleado.
+
+    Entries are tagged with the ``empleados`` cache version, so registering an
+    empleado anywhere (which invalidates it) makes every worker forget them.
+    ``db`` may be get_db itself: a hit then needs no connection at all.
+    """
+
+    def __init__(self, ttl=UNKNOWN_CORREO_TTL, max_keys=50000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # correo -> (version, expires)
+        self._lock = threading.Lock()
+
+    def hit(self, db, correo):
+        entry = self._entries.get(correo)
+        return bool(entry) and entry[1] > time.monotonic() and entry[0] == lookups.version(db, "empleados")
+
+    def add(self, db, correo):
+        version = lookups.version(db, "empleados")
+        with self._lock:
+            self._entries[correo] = (version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(correo)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+
+class HashPool:
+    """Password checks and hashing on a few dedicated threads, refusing work past a bounded queue."""
+
+    def __init__(self, workers=LOGIN_HASH_WORKERS, queue=LOGIN_HASH_QUEUE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="login-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue)
+
+    def check(self, pwhash, password, timeout=10):
+        """Check ``password`` against ``pwhash``, or against DUMMY_HASH (always False) without one."""
+        if not pwhash:
+            self._run(check_password_hash, (DUMMY_HASH, password), timeout)
+            return False
+        return self._run(check_password_hash, (pwhash, password), timeout)
+
+    def hash(self, password, timeout=10):
+        return self._run(generate_password_hash, (password,), timeout)
+
+    def _run(self, fn, args, timeout):
+        if not self._slots.acquire(blocking=False):
+            raise HashPoolBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            raise HashPoolBusy()
+
+
+ip_buckets = TokenBuckets(LOGIN_IP_RATE, LOGIN_IP_BURST)
+account_buckets = TokenBuckets(LOGIN_ACCOUNT_RATE, LOGIN_ACCOUNT_BURST)
+unknown_correos = NegativeCache()
+hashes = HashPool()
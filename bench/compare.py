@@ -0,0 +1,46 @@
+"""Compare two bench.load result files and flag latency regressions.
+
+    python -m bench.compare bench/results/before.json bench/results/after.json --threshold 10
+
+Exits with status 1 when any scenario's p95 got worse by more than
+--threshold percent, or its error count went up.
+"""
+import argparse
+import json
+
+
+def compare(before, after, threshold):
+    rows, regressions = [], []
+    for name, new in after["scenarios"].items():
+        old = before["scenarios"].get(name)
+        if not old or not old["count"] or not new["count"]:
+            continue
+        change = (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+        rows.append((name, old["p95_ms"], new["p95_ms"], change, old["per_sec"], new["per_sec"]))
+        if change > threshold or new["errors"] > old["errors"]:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10, help="allowed p95 increase, in percent")
+    args = parser.parse_args()
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    rows, regressions = compare(before, after, args.threshold)
+    print(f"{before.get('revision')} -> {after.get('revision')}")
+    print(f"{'scenario':<16}{'p95 before':>12}{'p95 after':>12}{'change':>9}{'/s before':>11}{'/s after':>10}")
+    for name, old, new, change, old_rate, new_rate in rows:
+        mark = "  <-- regression" if name in regressions else ""
+        print(f"{name:<16}{old:>12}{new:>12}{change:>8.1f}%{old_rate:>11}{new_rate:>10}{mark}")
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
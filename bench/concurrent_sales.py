@@ -0,0 +1,127 @@
+"""Concurrent sales against one almacen: throughput and oversell check.
+
+    python -m bench.concurrent_sales --threads 64 --stock 5000 --duration 10
+
+Creates a throw-away empleado, vehiculo and almacen, lets every thread sell
+one unit at a time through app.sales.create_sale on its own connection, then
+checks that the units sold match the stock taken and that disponible never
+went negative. The test rows are removed afterwards.
+"""
+import argparse
+import threading
+import time
+import uuid
+from datetime import date
+from decimal import Decimal
+
+import mysql.connector
+
+from app.db import connect
+from app.repository import repositories, transaction
+from app.sales import StockInsuficiente, create_sale
+
+
+def setup(stock):
+    # Through app.repository, so the inventory rollup, the vehiculo facets and
+    # the cambios feed see the test rows like any other
+    db = connect()
+    tag = uuid.uuid4().hex[:8]
+    with transaction(db, "empleados", "vehiculos", "almacenes"):
+        empleado_id = repositories["empleados"].insert(db, {
+            "nombre": f"bench {tag}", "dni": f"bench-{tag}", "correo": f"bench-{tag}@example.com",
+            "contrasena": "x", "role": "empleado"})
+        vehiculo_id = repositories["vehiculos"].insert(db, {"modelo": f"bench {tag}", "precio_venta": 1000})
+        almacen_id = repositories["almacenes"].insert(db, {
+            "ubicacion": f"bench {tag}", "capacidad": stock, "disponible": stock})
+    db.close()
+    return empleado_id, vehiculo_id, almacen_id
+
+
+def teardown(empleado_id, vehiculo_id, almacen_id):
+    db = connect()
+    with transaction(db, "empleados", "vehiculos", "almacenes"):
+        # ventas (and their lines / rollup rows) cascade from the empleado
+        repositories["empleados"].delete(db, empleado_id)
+        repositories["vehiculos"].delete(db, vehiculo_id)
+        repositories["almacenes"].delete(db, almacen_id)
+    db.close()
+
+
+def run(threads, stock, duration):
+    empleado_id, vehiculo_id, almacen_id = setup(stock)
+    stats = {"sold": 0, "rejected": 0, "errors": 0}
+    latencies = []
+    lock = threading.Lock()
+    stop = time.monotonic() + duration
+    line = [{"vehiculo_id": vehiculo_id, "almacen_id": almacen_id, "cantidad": 1, "precio_unitario": Decimal("1000")}]
+
+    def worker():
+        db = connect()
+        sold = rejected = errors = 0
+        local = []
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            try:
+                create_sale(db, date.today(), empleado_id, line)
+                sold += 1
+            except StockInsuficiente:
+                rejected += 1
+                break
+            except mysql.connector.Error:
+                errors += 1
+            local.append(time.perf_counter() - start)
+        db.close()
+        with lock:
+            stats["sold"] += sold
+            stats["rejected"] += rejected
+            stats["errors"] += errors
+            latencies.extend(local)
+
+    started = time.monotonic()
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    db = connect()
+    cur = db.cursor()
+    cur.execute("SELECT disponible FROM almacenes WHERE id=%s", (almacen_id,))
+    disponible = cur.fetchone()[0]
+    cur.execute(
+        "SELECT COALESCE(SUM(cantidad), 0) FROM venta_lineas WHERE almacen_id=%s", (almacen_id,)
+    )
+    lines_sold = int(cur.fetchone()[0])
+    db.close()
+    teardown(empleado_id, vehiculo_id, almacen_id)
+
+    latencies.sort()
+    result = dict(stats)
+    result.update(
+        threads=threads,
+        seconds=round(elapsed, 2),
+        sales_per_sec=round(stats["sold"] / elapsed, 1),
+        p50_ms=round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+        p99_ms=round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None,
+        disponible_final=disponible,
+        consistent=disponible >= 0 and stock - disponible == stats["sold"] == lines_sold,
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--stock", type=int, default=5000)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+    result = run(args.threads, args.stock, args.duration)
+    for key, value in result.items():
+        print(f"{key}: {value}")
+    if not result["consistent"]:
+        raise SystemExit("Inconsistent stock: oversold or lost units")
+
+
+if __name__ == "__main__":
+    main()
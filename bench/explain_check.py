@@ -0,0 +1,179 @@
+"""Query-plan regression check for the statements the app issues.
+
+    python -m bench.seed --reset                  # a realistically sized DB
+    python -m bench.explain_check --min-rows 10000
+
+Logs in as the bench jefe, requests every list (plain, searched and a second
+page), form, dashboard and API read through the Flask test client, and
+records each statement executed on the request connection. Every distinct
+SELECT is then run through EXPLAIN; a table access that reads the whole
+table (type ALL, or a full index scan) with at least --min-rows estimated
+rows is reported and the command exits with status 1.
+
+It also checks that the facet total of a few /vehiculos selections (see
+app.facets) matches a COUNT(*) of the same filter on vehiculos.
+
+Unfiltered COUNT(*) statements are skipped: app.pagination only runs them
+on tables below APPROX_COUNT_MIN and caches the result. Exports and the
+cached empleado options (WHOLE_TABLE) are skipped too, since reading the
+whole table is their purpose.
+"""
+import argparse
+import re
+import sys
+
+from werkzeug.datastructures import MultiDict
+
+from app import facets, metrics
+from app.db import connect
+from app.pagination import APPROX_COUNT_MIN
+from bench.seed import BENCH_PASSWORD, BENCH_USER
+
+NEXT_CURSOR = re.compile(r'href="\?cursor=([A-Za-z0-9_-]+)[^"]*">Siguiente')
+SEARCHES = {
+    "clientes": ["Garcia", "C000000001", "cliente1@example.com"],
+    "empleados": ["Maria", "ventas", "supervisor", "admin", "visor"],
+    "proveedores": ["Proveedor", "P000000001"],
+    "vehiculos": ["Hilux", "rojo", "roj", "sed"],
+    "almacenes": ["Peru", "central", "regio"],
+    "ventas": ["2024", "2024-03", "2024-03-15", "17", "Maria"],
+}
+FORMS = ["clientes", "empleados", "vehiculos", "almacenes", "proveedores", "ventas"]
+UNFILTERED_COUNT = re.compile(r"^SELECT COUNT\(\*\) AS cnt FROM \w+$")
+SKIP_TABLES = ("information_schema", "cache_versions", "schema_migrations")
+# Whole-table reads on purpose, loaded once per worker and cached by app.cache
+WHOLE_TABLE = {"SELECT id, nombre FROM empleados ORDER BY nombre"}
+FACET_SELECTIONS = [
+    {},
+    {"anio_hasta": "2015"},
+    {"anio_desde": "2010", "anio_hasta": "2018", "tipo": "suv"},
+    {"banda_precio": "2", "color": "rojo"},
+]
+
+
+def sample_ids():
+    db = connect()
+    cursor = db.cursor()
+    ids = {}
+    for table in FORMS:
+        cursor.execute(f"SELECT MIN(id) FROM {table}")
+        ids[table] = cursor.fetchone()[0]
+    db.close()
+    return ids
+
+
+def urls(ids):
+    yield "/"
+    for entity, terms in SEARCHES.items():
+        yield f"/{entity}"
+        for q in terms:
+            yield f"/{entity}?q={q}"
+        yield f"/api/v1/{entity}?limit=50"
+        yield f"/api/v1/{entity}?q={terms[0]}"
+    yield "/ventas/dashboard"
+    yield "/ventas/dashboard?por=mes&desde=2020-01-01"
+    yield "/almacenes/inventario"
+    yield "/vehiculos?tipo=suv"
+    yield "/vehiculos?banda_precio=2&anio_desde=2015"
+    yield "/vehiculos?tipo=sedan&color=rojo&anio_desde=2010&anio_hasta=2018"
+    yield "/api/v1/vehiculos/facetas?color=rojo&limit=50"
+    yield "/ventas/nuevo"
+    yield "/empleados/nuevo"
+    for entity in FORMS:
+        if ids.get(entity):
+            yield f"/{entity}/editar/{ids[entity]}"
+            yield f"/api/v1/{entity}/{ids[entity]}"
+            yield f"/api/v1/{entity}?ids={ids[entity]},{ids[entity] + 1},{ids[entity] + 2}"
+
+
+def capture(ids):
+    from app.main import app
+
+    client = app.test_client()
+    response = client.post("/login", data={"correo": BENCH_USER, "contrasena": BENCH_PASSWORD})
+    if response.status_code != 302:
+        raise SystemExit(f"Login as {BENCH_USER} failed; run bench.seed first")
+    metrics.statement_log = log = []
+    failed = []
+    for url in urls(ids):
+        response = client.get(url)
+        if response.status_code >= 500:
+            failed.append(url)
+        elif "?" not in url and url.count("/") == 1:
+            # Second page of every list, through its keyset cursor
+            match = NEXT_CURSOR.search(response.get_data(as_text=True))
+            if match:
+                client.get(f"{url}?cursor={match.group(1)}")
+    metrics.statement_log = None
+    return log, failed
+
+
+def distinct_selects(log):
+    seen = {}
+    for sql, params in log:
+        label = metrics.normalize_sql(sql)
+        if not label.upper().startswith("SELECT") or label in seen:
+            continue
+        if UNFILTERED_COUNT.match(label) or label in WHOLE_TABLE or any(t in label for t in SKIP_TABLES):
+            continue
+        seen[label] = (sql, params)
+    return seen
+
+
+def full_scans(cursor, sql, params, min_rows):
+    cursor.execute("EXPLAIN " + sql, params or ())
+    scans = []
+    for row in cursor.fetchall():
+        table = row.get("table") or ""
+        # Derived tables and UNION results are temporary and already bounded
+        if table.startswith("<"):
+            continue
+        if row.get("type") in ("ALL", "index") and (row.get("rows") or 0) >= min_rows:
+            scans.append(row)
+    return scans
+
+
+def facet_mismatches(cursor):
+    """Selections whose facet total differs from the list's own count."""
+    mismatches = []
+    for args in FACET_SELECTIONS:
+        seleccion = facets.parse(MultiDict(args))
+        total = facets.counts(cursor, seleccion)["total"]
+        cond, params = facets.where(seleccion)
+        cursor.execute(f"SELECT COUNT(*) AS cnt FROM vehiculos{' WHERE ' + cond if cond else ''}", tuple(params))
+        count = cursor.fetchone()["cnt"]
+        if total != count:
+            mismatches.append((args, total, count))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--min-rows", type=int, default=min(10000, APPROX_COUNT_MIN),
+                        help="estimated rows from which a full scan fails the check")
+    args = parser.parse_args()
+
+    log, failed = capture(sample_ids())
+    statements = distinct_selects(log)
+    db = connect()
+    cursor = db.cursor(dictionary=True)
+    problems = 0
+    for label, (sql, params) in statements.items():
+        for row in full_scans(cursor, sql, params, args.min_rows):
+            problems += 1
+            print(f"FULL SCAN {row['table']} type={row['type']} rows={row['rows']} key={row.get('key')}")
+            print(f"    {label}")
+    mismatches = facet_mismatches(cursor)
+    for args, total, count in mismatches:
+        print(f"FACET TOTAL {args}: vehiculos_facetas={total} vehiculos={count}")
+    db.close()
+    for url in failed:
+        print(f"HTTP 5xx: {url}")
+    print(f"{len(statements)} statements checked, {problems} full scans, {len(failed)} failed requests, "
+          f"{len(mismatches)} facet mismatches")
+    if problems or failed or mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
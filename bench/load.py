@@ -0,0 +1,256 @@
+"""HTTP load test of the main flows against a running server.
+
+    python -m bench.seed --reset                  # once, see bench/seed.py
+    LOGIN_IP_RATE=1000 LOGIN_IP_BURST=1000 gunicorn -c gunicorn.conf.py wsgi:app
+    python -m bench.load --users 32 --duration 30 --base-url http://127.0.0.1:8000
+
+Every simulated user logs in once and then loops over the scenarios picked by
+weight: list pages, ventas search, walking deep into clientes with the keyset
+cursor, login, and a create/edit/delete round-trip on clientes. Latency
+percentiles and throughput per scenario are printed and written as JSON to
+bench/results/ (or --output) so runs from different releases can be diffed
+with bench.compare. All users share one client IP, so raise the login
+throttle (app/throttle.py) as above or the login scenario measures 429s.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+from bench.seed import BENCH_PASSWORD, BENCH_USER
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+NEXT_CURSOR = re.compile(r'href="\?cursor=([A-Za-z0-9_-]+)[^"]*">Siguiente')
+CLIENTE_ID = re.compile(r'/clientes/editar/(\d+)"')
+SEARCH_TERMS = ["Garcia", "Quispe", "2024-01", "Maria", "Hilux", "Lucia Ramos"]
+
+
+class Client:
+    """Keep-alive HTTP client holding the session cookie of one simulated user."""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+        self.conn = None
+
+    def request(self, method, path, form=None):
+        body = urlencode(form) if form is not None else None
+        headers = {"Cookie": "; ".join(f"{k}={v}" for k, v in self.cookies.items())}
+        if body is not None:
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # Keep-alive connection closed by the server (worker recycled)
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+        for header, value in response.getheaders():
+            if header.lower() == "set-cookie":
+                name, _, rest = value.partition("=")
+                self.cookies[name] = rest.split(";", 1)[0]
+        if response.status >= 500:
+            raise http.client.HTTPException(f"{method} {path}: HTTP {response.status}")
+        return response.status, data.decode("utf-8", "replace")
+
+    def login(self):
+        status, _ = self.request("POST", "/login", {"correo": BENCH_USER, "contrasena": BENCH_PASSWORD})
+        if status != 302:
+            raise RuntimeError(f"Login as {BENCH_USER} failed (HTTP {status}); run bench.seed first")
+
+
+# ---------------- SCENARIOS ----------------
+def list_clientes(client, rnd):
+    client.request("GET", "/clientes")
+
+
+def list_vehiculos(client, rnd):
+    client.request("GET", "/vehiculos")
+
+
+def search_ventas(client, rnd):
+    client.request("GET", "/ventas?" + urlencode({"q": rnd.choice(SEARCH_TERMS)}))
+
+
+def search_clientes(client, rnd):
+    client.request("GET", "/clientes?" + urlencode({"q": rnd.choice(SEARCH_TERMS)}))
+
+
+def deep_page(client, rnd, depth=20):
+    # Follow "Siguiente" links: with keyset pagination page N costs the same as page 1
+    path = "/clientes"
+    for _ in range(depth):
+        _, html = client.request("GET", path)
+        match = NEXT_CURSOR.search(html)
+        if not match:
+            break
+        path = "/clientes?cursor=" + match.group(1)
+
+
+def login(client, rnd):
+    client.login()
+
+
+def crud_cliente(client, rnd):
+    tag = uuid.uuid4().hex[:12]
+    form = {"nombre": f"Bench {tag}", "dni": f"B{tag}", "correo": f"{tag}@bench.example.com",
+            "telefono": "999999999", "pais": "Peru", "tipo": "particular"}
+    client.request("POST", "/clientes/nuevo", form)
+    _, html = client.request("GET", "/clientes?" + urlencode({"q": form["dni"]}))
+    match = CLIENTE_ID.search(html)
+    if not match:
+        raise RuntimeError("Created cliente not found")
+    cliente_id = match.group(1)
+    form["tipo"] = "empresa"
+    client.request("POST", f"/clientes/editar/{cliente_id}", form)
+    client.request("GET", f"/clientes/eliminar/{cliente_id}")
+
+
+SCENARIOS = {
+    "list_clientes": (list_clientes, 30),
+    "list_vehiculos": (list_vehiculos, 15),
+    "search_ventas": (search_ventas, 15),
+    "search_clientes": (search_clientes, 15),
+    "deep_page": (deep_page, 5),
+    "login": (login, 10),
+    "crud_cliente": (crud_cliente, 10),
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 2)
+
+
+def summarize(latencies, errors, elapsed):
+    summary = {}
+    for name in SCENARIOS:
+        values = sorted(latencies.get(name, []))
+        summary[name] = {
+            "count": len(values),
+            "errors": errors.get(name, 0),
+            "per_sec": round(len(values) / elapsed, 1),
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+            "max_ms": round(values[-1] * 1000, 2) if values else None,
+        }
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(base_url, users, duration, scenarios, seed=0):
+    names = list(scenarios)
+    weights = [SCENARIOS[name][1] for name in names]
+    latencies, errors = {}, {}
+    lock = threading.Lock()
+    clock = {}
+
+    def start_clock():
+        clock["started"] = time.monotonic()
+        clock["stop"] = clock["started"] + duration
+
+    # Logins happen before the clock starts, so every user begins at once
+    ready = threading.Barrier(users + 1, action=start_clock)
+
+    def user(n):
+        rnd = random.Random(seed + n)
+        client = Client(base_url)
+        local, local_errors = {}, {}
+        try:
+            client.login()
+        finally:
+            ready.wait()
+        while time.monotonic() < clock["stop"]:
+            name = rnd.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                SCENARIOS[name][0](client, rnd)
+            except Exception:
+                local_errors[name] = local_errors.get(name, 0) + 1
+                continue
+            local.setdefault(name, []).append(time.perf_counter() - start)
+        with lock:
+            for name, values in local.items():
+                latencies.setdefault(name, []).extend(values)
+            for name, count in local_errors.items():
+                errors[name] = errors.get(name, 0) + count
+
+    threads = [threading.Thread(target=user, args=(n,), daemon=True) for n in range(users)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - clock["started"]
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "base_url": base_url,
+        "users": users,
+        "seconds": round(elapsed, 2),
+        "total": total,
+        "per_sec": round(total / elapsed, 1),
+        "errors": sum(errors.values()),
+        "scenarios": summarize(latencies, errors, elapsed),
+    }
+
+
+def print_table(result):
+    print(f"{result['users']} users, {result['seconds']}s, {result['per_sec']} flows/s, {result['errors']} errors")
+    print(f"{'scenario':<16}{'count':>8}{'err':>6}{'/s':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, s in result["scenarios"].items():
+        if s["count"] or s["errors"]:
+            print(f"{name:<16}{s['count']:>8}{s['errors']:>6}{s['per_sec']:>8}"
+                  f"{s['p50_ms']!s:>10}{s['p95_ms']!s:>10}{s['p99_ms']!s:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="run only this scenario (repeatable)")
+    parser.add_argument("--output", help="JSON file for the results (default: bench/results/<timestamp>.json)")
+    args = parser.parse_args()
+    result = run(args.base_url.rstrip("/"), args.users, args.duration, args.scenario or list(SCENARIOS))
+    print_table(result)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Seed erp_toyota with synthetic data for the benchmarks.
+
+    python -m bench.seed --clientes 1000000 --ventas 5000000 --reset
+
+Applies init_db.sql and the migrations first, then bulk-inserts the requested
+volumes in multi-row batches (unique and foreign key checks off for the load)
+and rebuilds the ventas_diarias and inventory rollups. A jefe account is always created so
+bench.load can log in:
+
+    bench@example.com / bench
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from app import facets, inventory, migrations, rollups
+from app.db import connect
+
+BENCH_USER = "bench@example.com"
+BENCH_PASSWORD = "bench"
+
+DEFAULTS = {
+    # Above explain_check's --min-rows, so a scan of empleados is caught
+    "empleados": 20000,
+    "clientes": 100000,
+    "proveedores": 5000,
+    "vehiculos": 20000,
+    "almacenes": 2000,
+    "ventas": 500000,
+}
+# Child tables first, so --reset never trips over a foreign key
+TABLES = ["venta_lineas", "ventas_diarias", "ventas", "clientes", "proveedores", "vehiculos", "almacenes", "empleados"]
+
+PAISES = ["Peru", "Chile", "Colombia", "Ecuador", "Bolivia", "Argentina", "Mexico"]
+TIPOS_CLIENTE = ["particular", "empresa", "flota", "gobierno"]
+DEPARTAMENTOS = ["ventas", "taller", "almacen", "administracion", "marketing"]
+MODELOS = ["Corolla", "Hilux", "Yaris", "RAV4", "Land Cruiser", "Prius", "Camry", "Fortuner", "Rush", "Hiace"]
+TIPOS_VEHICULO = ["sedan", "pickup", "hatchback", "suv", "van"]
+COLORES = ["blanco", "negro", "gris", "rojo", "azul", "plata"]
+TIPOS_ALMACEN = ["central", "regional", "tienda", "taller"]
+SUMINISTROS = ["repuestos", "llantas", "lubricantes", "baterias", "accesorios"]
+NOMBRES = ["Ana", "Luis", "Carlos", "Maria", "Jose", "Lucia", "Pedro", "Rosa", "Jorge", "Elena", "Diego", "Sofia"]
+APELLIDOS = ["Garcia", "Quispe", "Flores", "Rojas", "Torres", "Mendoza", "Vargas", "Castillo", "Ramos", "Huaman"]
+
+
+def nombre(rnd):
+    return f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}"
+
+
+def gen_empleados(rnd, n, offset):
+    hashed = generate_password_hash("x")
+    for i in range(offset, offset + n):
+        yield (nombre(rnd), f"E{i:09d}", f"empleado{i}@example.com", rnd.choice(DEPARTAMENTOS),
+               round(rnd.uniform(1200, 9000), 2), hashed, rnd.choice(["empleado"] * 8 + ["supervisor"]))
+
+
+def gen_clientes(rnd, n, offset):
+    for i in range(offset, offset + n):
+        yield (nombre(rnd), f"C{i:09d}", f"cliente{i}@example.com", f"9{rnd.randrange(10**8):08d}",
+               rnd.choice(PAISES), rnd.choice(TIPOS_CLIENTE))
+
+
+def gen_proveedores(rnd, n, offset):
+    for i in range(offset, offset + n):
+        yield (f"Proveedor {rnd.choice(APELLIDOS)} {i}", f"P{i:09d}", f"proveedor{i}@example.com", nombre(rnd),
+               rnd.choice(SUMINISTROS))
+
+
+def gen_vehiculos(rnd, n, offset):
+    for _ in range(n):
+        precio = round(rnd.uniform(15000, 120000), 2)
+        yield (rnd.choice(MODELOS), rnd.choice(TIPOS_VEHICULO), rnd.randint(2005, 2026), rnd.choice(COLORES),
+               precio, round(precio * rnd.uniform(0.6, 0.85), 2))
+
+
+def gen_almacenes(rnd, n, offset):
+    for i in range(offset, offset + n):
+        capacidad = rnd.randint(50, 5000)
+        yield (f"Almacen {rnd.choice(PAISES)} {i}", f"almacen{i}@example.com", rnd.choice(TIPOS_ALMACEN),
+               capacidad, rnd.randint(0, capacidad))
+
+
+def gen_ventas(rnd, n, empleado_ids, cliente_ids):
+    start = date.today() - timedelta(days=5 * 365)
+    for _ in range(n):
+        cliente = rnd.randint(*cliente_ids) if cliente_ids[0] and rnd.random() < 0.9 else None
+        yield (start + timedelta(days=rnd.randrange(5 * 365)), round(rnd.uniform(15000, 150000), 2),
+               rnd.randint(*empleado_ids), cliente)
+
+
+INSERTS = {
+    "empleados": "INSERT INTO empleados (nombre, dni, correo, departamento, salario, contrasena, role) "
+                 "VALUES (%s,%s,%s,%s,%s,%s,%s)",
+    "clientes": "INSERT INTO clientes (nombre, dni, correo, telefono, pais, tipo) VALUES (%s,%s,%s,%s,%s,%s)",
+    "proveedores": "INSERT INTO proveedores (nombre, dni, correo, contacto, tipo_suministro) VALUES (%s,%s,%s,%s,%s)",
+    "vehiculos": "INSERT INTO vehiculos (modelo, tipo, anio, color, precio_venta, costo_fabricante) "
+                 "VALUES (%s,%s,%s,%s,%s,%s)",
+    "almacenes": "INSERT INTO almacenes (ubicacion, correo, tipo_almacen, capacidad, disponible) "
+                 "VALUES (%s,%s,%s,%s,%s)",
+    "ventas": "INSERT INTO ventas (fecha, total, empleado_id, cliente_id) VALUES (%s,%s,%s,%s)",
+}
+
+
+def insert_rows(db, table, rows, batch_size, log):
+    # executemany on a plain INSERT is sent as one multi-row statement per batch
+    cursor = db.cursor()
+    batch, done, started = [], 0, time.monotonic()
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            cursor.executemany(INSERTS[table], batch)
+            db.commit()
+            done += len(batch)
+            batch = []
+            if done % (batch_size * 50) == 0:
+                log(f"  {table}: {done} filas")
+    if batch:
+        cursor.executemany(INSERTS[table], batch)
+        db.commit()
+        done += len(batch)
+    cursor.close()
+    log(f"{table}: {done} filas en {time.monotonic() - started:.1f}s")
+    return done
+
+
+def id_range(db, table):
+    cursor = db.cursor()
+    cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table}")
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+
+def seed(volumes, reset=False, batch_size=5000, seed_value=42, log=print):
+    migrations.ensure_database()
+    db = connect()
+    try:
+        migrations.migrate(db, log=log)
+        cursor = db.cursor()
+        cursor.execute("SET unique_checks=0, foreign_key_checks=0")
+        if reset:
+            for table in TABLES:
+                cursor.execute(f"TRUNCATE TABLE {table}")
+        cursor.execute("""
+            INSERT INTO empleados (nombre, dni, correo, departamento, contrasena, role)
+            VALUES ('Bench Jefe', %s, %s, 'administracion', %s, 'jefe')
+            ON DUPLICATE KEY UPDATE contrasena=VALUES(contrasena), role='jefe'
+        """, ("BENCH-JEFE", BENCH_USER, generate_password_hash(BENCH_PASSWORD)))
+        db.commit()
+        cursor.close()
+
+        rnd = random.Random(seed_value)
+        for table, gen in (("empleados", gen_empleados), ("clientes", gen_clientes), ("proveedores", gen_proveedores),
+                           ("vehiculos", gen_vehiculos), ("almacenes", gen_almacenes)):
+            # Keep dni/correo unique when seeding on top of existing rows
+            offset = (id_range(db, table)[1] or 0) + 1
+            insert_rows(db, table, gen(rnd, volumes[table], offset), batch_size, log)
+        rows = gen_ventas(rnd, volumes["ventas"], id_range(db, "empleados"), id_range(db, "clientes"))
+        insert_rows(db, "ventas", rows, batch_size, log)
+
+        cursor = db.cursor()
+        cursor.execute("SET unique_checks=1, foreign_key_checks=1")
+        for table in INSERTS:
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+        cursor.close()
+        log(f"ventas_diarias: {rollups.backfill(db)} filas")
+        log(f"alertas_stock: {inventory.backfill(db)} almacenes")
+        log(f"vehiculos_facetas: {facets.backfill(db)} combinaciones")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    for table, default in DEFAULTS.items():
+        parser.add_argument(f"--{table}", type=int, default=default)
+    parser.add_argument("--reset", action="store_true", help="truncate the tables before seeding")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42, help="random seed, for reproducible data")
+    args = parser.parse_args()
+    volumes = {table: getattr(args, table) for table in DEFAULTS}
+    seed(volumes, reset=args.reset, batch_size=args.batch_size, seed_value=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+# Every setting can be overridden from the environment; see docs/deploy.md.
+import multiprocessing
+import os
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", 4))
+
+# Import the app once in the master; workers fork from it and share its
+# memory copy-on-write. No DB connection is opened before the fork.
+preload_app = True
+
+# Recycle workers after N requests (with jitter so they don't all restart together)
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", 2000))
+max_requests_jitter = int(os.environ.get("WEB_MAX_REQUESTS_JITTER", 200))
+
+timeout = int(os.environ.get("WEB_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+pidfile = os.environ.get("WEB_PIDFILE", "/tmp/erp_toyota-gunicorn.pid")
+accesslog = os.environ.get("WEB_ACCESSLOG", "-") or None
+
+# One pooled connection per worker thread unless configured otherwise
+os.environ.setdefault("DB_POOL_SIZE", str(threads))
+# No job threads in the web workers: max_requests recycles them and gives an
+# import only graceful_timeout to finish. Run `flask --app app.main jobs-worker`
+# as its own service instead (docs/deploy.md).
+os.environ.setdefault("JOBS_WORKERS", "0")
@@ -0,0 +1,12 @@
+# Rol de acceso de cada empleado (antes lo añadía ensure_role_column en cada worker)
+
+
+def upgrade(cursor):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'empleados' AND COLUMN_NAME = 'role'"
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute("ALTER TABLE empleados ADD COLUMN role VARCHAR(20) NOT NULL DEFAULT 'empleado'")
+    cursor.execute("UPDATE empleados SET role='empleado' WHERE role IS NULL OR role = ''")
+    cursor.execute("UPDATE empleados SET role='jefe' WHERE correo=%s", ('admin@example.com',))
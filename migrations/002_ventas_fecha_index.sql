@@ -0,0 +1,2 @@
+-- Listado de ventas paginado por (fecha, id), ver app/pagination.py
+ALTER TABLE ventas ADD INDEX idx_ventas_fecha_id (fecha, id);
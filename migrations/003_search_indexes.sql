@@ -0,0 +1,6 @@
+-- Búsqueda por nombre (FULLTEXT ngram) y por prefijo de correo, ver app/search.py
+ALTER TABLE clientes ADD INDEX idx_clientes_correo (correo);
+ALTER TABLE clientes ADD FULLTEXT INDEX ft_clientes_nombre (nombre) WITH PARSER ngram;
+ALTER TABLE proveedores ADD INDEX idx_proveedores_correo (correo);
+ALTER TABLE proveedores ADD FULLTEXT INDEX ft_proveedores_nombre (nombre) WITH PARSER ngram;
+ALTER TABLE empleados ADD FULLTEXT INDEX ft_empleados_nombre (nombre) WITH PARSER ngram;
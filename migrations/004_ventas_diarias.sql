@@ -0,0 +1,16 @@
+-- Resumen diario de ventas por empleado (mantenido por la app, ver app/rollups.py)
+CREATE TABLE ventas_diarias (
+    fecha DATE NOT NULL,
+    empleado_id INT NOT NULL,
+    total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    num_ventas INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, empleado_id),
+    INDEX idx_ventas_diarias_empleado (empleado_id, fecha),
+    FOREIGN KEY (empleado_id) REFERENCES empleados(id) ON DELETE CASCADE
+);
+
+INSERT INTO ventas_diarias (fecha, empleado_id, total, num_ventas)
+SELECT fecha, empleado_id, COALESCE(SUM(total), 0), COUNT(*)
+FROM ventas
+WHERE fecha IS NOT NULL AND empleado_id IS NOT NULL
+GROUP BY fecha, empleado_id;
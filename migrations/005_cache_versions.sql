@@ -0,0 +1,5 @@
+-- Versiones de caché para invalidar entre workers, ver app/cache.py
+CREATE TABLE cache_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
@@ -0,0 +1,16 @@
+-- Líneas de venta: qué vehículo se vendió, de qué almacén y a qué cliente (ver app/sales.py)
+ALTER TABLE ventas
+    ADD COLUMN cliente_id INT NULL,
+    ADD CONSTRAINT fk_ventas_cliente FOREIGN KEY (cliente_id) REFERENCES clientes(id) ON DELETE SET NULL;
+
+CREATE TABLE venta_lineas (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    venta_id INT NOT NULL,
+    vehiculo_id INT NOT NULL,
+    almacen_id INT NOT NULL,
+    cantidad INT NOT NULL,
+    precio_unitario DECIMAL(10,2) NOT NULL,
+    FOREIGN KEY (venta_id) REFERENCES ventas(id) ON DELETE CASCADE,
+    FOREIGN KEY (vehiculo_id) REFERENCES vehiculos(id),
+    FOREIGN KEY (almacen_id) REFERENCES almacenes(id)
+);
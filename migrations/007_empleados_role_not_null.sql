@@ -0,0 +1,3 @@
+-- El rol siempre tiene valor: el login ya no lo rellena al acceder
+UPDATE empleados SET role = 'empleado' WHERE role IS NULL OR role = '';
+ALTER TABLE empleados MODIFY role VARCHAR(20) NOT NULL DEFAULT 'empleado';
@@ -0,0 +1,8 @@
+-- Índices para los filtros y conteos de los listados, ver app/search.py
+-- y bench/explain_check.py (jefe_exists filtra por role)
+ALTER TABLE empleados ADD INDEX idx_empleados_role (role);
+ALTER TABLE vehiculos ADD FULLTEXT INDEX ft_vehiculos_modelo (modelo) WITH PARSER ngram;
+ALTER TABLE vehiculos ADD INDEX idx_vehiculos_tipo (tipo);
+ALTER TABLE vehiculos ADD INDEX idx_vehiculos_color (color);
+ALTER TABLE almacenes ADD FULLTEXT INDEX ft_almacenes_ubicacion (ubicacion) WITH PARSER ngram;
+ALTER TABLE almacenes ADD INDEX idx_almacenes_tipo (tipo_almacen);
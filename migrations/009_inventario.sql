@@ -0,0 +1,42 @@
+-- Resumen de inventario por tipo, por ubicación y total, y almacenes con poco stock
+-- (mantenidos por la app, ver app/inventory.py). El relleno usa LOW_STOCK_RATIO = 0.1;
+-- con otro umbral, ejecutar `flask --app app.main backfill-inventario`.
+CREATE TABLE inventario_resumen (
+    dimension VARCHAR(10) NOT NULL,
+    valor VARCHAR(100) NOT NULL DEFAULT '',
+    num_almacenes INT NOT NULL DEFAULT 0,
+    capacidad BIGINT NOT NULL DEFAULT 0,
+    disponible BIGINT NOT NULL DEFAULT 0,
+    bajo_stock INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, valor)
+);
+
+CREATE TABLE alertas_stock (
+    almacen_id INT NOT NULL PRIMARY KEY,
+    tipo_almacen VARCHAR(50) NOT NULL DEFAULT '',
+    ubicacion VARCHAR(100) NOT NULL DEFAULT '',
+    capacidad INT NOT NULL,
+    disponible INT NOT NULL,
+    nivel DECIMAL(10,4) NOT NULL,
+    desde TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_alertas_stock_nivel (nivel)
+);
+
+INSERT INTO inventario_resumen (dimension, valor, num_almacenes, capacidad, disponible, bajo_stock)
+SELECT 'total', '', COUNT(*), COALESCE(SUM(capacidad), 0), COALESCE(SUM(disponible), 0),
+       COALESCE(SUM(capacidad > 0 AND COALESCE(disponible, 0) <= capacidad * 0.1), 0)
+FROM almacenes
+UNION ALL
+SELECT 'tipo', COALESCE(tipo_almacen, ''), COUNT(*), COALESCE(SUM(capacidad), 0), COALESCE(SUM(disponible), 0),
+       COALESCE(SUM(capacidad > 0 AND COALESCE(disponible, 0) <= capacidad * 0.1), 0)
+FROM almacenes GROUP BY COALESCE(tipo_almacen, '')
+UNION ALL
+SELECT 'ubicacion', COALESCE(ubicacion, ''), COUNT(*), COALESCE(SUM(capacidad), 0), COALESCE(SUM(disponible), 0),
+       COALESCE(SUM(capacidad > 0 AND COALESCE(disponible, 0) <= capacidad * 0.1), 0)
+FROM almacenes GROUP BY COALESCE(ubicacion, '');
+
+INSERT INTO alertas_stock (almacen_id, tipo_almacen, ubicacion, capacidad, disponible, nivel)
+SELECT id, COALESCE(tipo_almacen, ''), COALESCE(ubicacion, ''), capacidad, COALESCE(disponible, 0),
+       COALESCE(disponible, 0) / capacidad
+FROM almacenes
+WHERE capacidad > 0 AND COALESCE(disponible, 0) <= capacidad * 0.1;
@@ -0,0 +1,20 @@
+-- Cola de trabajos en segundo plano (ver app/jobs.py)
+CREATE TABLE jobs (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    tipo VARCHAR(50) NOT NULL,
+    payload MEDIUMTEXT NOT NULL,
+    prioridad SMALLINT NOT NULL DEFAULT 0,
+    estado ENUM('pendiente', 'en_curso', 'hecho', 'fallido') NOT NULL DEFAULT 'pendiente',
+    intentos INT NOT NULL DEFAULT 0,
+    max_intentos INT NOT NULL DEFAULT 3,
+    ejecutar_desde DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    bloqueado_hasta DATETIME NULL,
+    creado_por INT NULL,
+    resultado MEDIUMTEXT NULL,
+    error TEXT NULL,
+    creado TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    actualizado TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_jobs_cola (estado, prioridad DESC, id),
+    INDEX idx_jobs_bloqueo (estado, bloqueado_hasta),
+    INDEX idx_jobs_creado_por (creado_por, id)
+);
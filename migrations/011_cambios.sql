@@ -0,0 +1,11 @@
+-- Cambios de clientes, empleados, vehiculos, almacenes, proveedores y ventas, escritos en la
+-- misma transacción que los produce (ver app/changes.py)
+CREATE TABLE cambios (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    entidad VARCHAR(20) NOT NULL,
+    entidad_id INT NOT NULL,
+    operacion ENUM('insert', 'update', 'delete') NOT NULL,
+    datos JSON NULL,
+    creado TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    INDEX idx_cambios_creado (creado)
+);
@@ -0,0 +1,31 @@
+-- Catálogo de vehículos por facetas (tipo, año, color y banda de precio): la banda
+-- calculada, índices compuestos para los filtros y los conteos por combinación
+-- (mantenidos por la app, ver app/facets.py; las bandas deben coincidir con PRICE_BANDS)
+ALTER TABLE vehiculos ADD COLUMN banda_precio TINYINT AS (
+    CASE WHEN precio_venta IS NULL THEN NULL
+         WHEN precio_venta < 20000 THEN 0
+         WHEN precio_venta < 35000 THEN 1
+         WHEN precio_venta < 50000 THEN 2
+         WHEN precio_venta < 80000 THEN 3
+         ELSE 4 END
+) STORED;
+
+-- idx_vehiculos_tipo queda cubierto por el prefijo del índice compuesto
+ALTER TABLE vehiculos DROP INDEX idx_vehiculos_tipo,
+    ADD INDEX idx_vehiculos_tipo_banda_anio (tipo, banda_precio, anio),
+    ADD INDEX idx_vehiculos_banda_anio (banda_precio, anio),
+    ADD INDEX idx_vehiculos_anio (anio);
+
+CREATE TABLE vehiculos_facetas (
+    tipo VARCHAR(50) NOT NULL DEFAULT '',
+    anio INT NOT NULL DEFAULT 0,
+    color VARCHAR(50) NOT NULL DEFAULT '',
+    banda_precio TINYINT NOT NULL DEFAULT -1,
+    num_vehiculos INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (tipo, anio, color, banda_precio)
+);
+
+INSERT INTO vehiculos_facetas (tipo, anio, color, banda_precio, num_vehiculos)
+SELECT COALESCE(tipo, ''), COALESCE(anio, 0), COALESCE(color, ''), COALESCE(banda_precio, -1), COUNT(*)
+FROM vehiculos
+GROUP BY COALESCE(tipo, ''), COALESCE(anio, 0), COALESCE(color, ''), COALESCE(banda_precio, -1);
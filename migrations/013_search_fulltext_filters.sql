@@ -0,0 +1,5 @@
+-- Búsqueda dentro de tipo, color y tipo_almacen (FULLTEXT ngram), como el
+-- LIKE '%q%' que reemplazó la búsqueda de la migración 008, ver app/search.py
+ALTER TABLE vehiculos ADD FULLTEXT INDEX ft_vehiculos_tipo (tipo) WITH PARSER ngram;
+ALTER TABLE vehiculos ADD FULLTEXT INDEX ft_vehiculos_color (color) WITH PARSER ngram;
+ALTER TABLE almacenes ADD FULLTEXT INDEX ft_almacenes_tipo (tipo_almacen) WITH PARSER ngram;
@@ -0,0 +1,5 @@
+-- Cada fila del resumen de inventario se reparte en INVENTORY_SLOTS filas que se
+-- suman al leer, para que las ventas concurrentes no esperen todas a la fila
+-- 'total' (ver app/inventory.py). Las filas existentes quedan en el slot 0.
+ALTER TABLE inventario_resumen ADD COLUMN slot TINYINT NOT NULL DEFAULT 0 AFTER valor,
+    DROP PRIMARY KEY, ADD PRIMARY KEY (dimension, valor, slot);
@@ -0,0 +1,6 @@
+-- Búsqueda dentro de departamento y role (FULLTEXT ngram), como el LIKE '%q%'
+-- original; el índice B-tree de departamento cubre las búsquedas de una letra
+-- (ver app/search.py). role ya tiene idx_empleados_role (migración 008).
+ALTER TABLE empleados ADD INDEX idx_empleados_departamento (departamento);
+ALTER TABLE empleados ADD FULLTEXT INDEX ft_empleados_departamento (departamento) WITH PARSER ngram;
+ALTER TABLE empleados ADD FULLTEXT INDEX ft_empleados_role (role) WITH PARSER ngram;
@@ -0,0 +1,13 @@
+-- El listado de ventas busca por (fecha, id) > (x, y), que nunca encuentra filas
+-- con fecha NULL: pasadas la primera página quedaban inalcanzables. Las ventas sin
+-- fecha pasan a '1970-01-01' (las últimas del listado) y entran en ventas_diarias,
+-- que antes las dejaba fuera.
+INSERT INTO ventas_diarias (fecha, empleado_id, total, num_ventas)
+SELECT '1970-01-01', empleado_id, COALESCE(SUM(total), 0), COUNT(*)
+FROM ventas WHERE fecha IS NULL AND empleado_id IS NOT NULL
+GROUP BY empleado_id
+ON DUPLICATE KEY UPDATE total = total + VALUES(total), num_ventas = num_ventas + VALUES(num_ventas);
+
+UPDATE ventas SET fecha = '1970-01-01' WHERE fecha IS NULL;
+
+ALTER TABLE ventas MODIFY fecha DATE NOT NULL;
@@ -0,0 +1,42 @@
+from app.cache import VersionedCache
+
+
+class VersionsDb:
+    """cache_versions as seen by readers: a bump only shows once committed."""
+
+    def __init__(self):
+        self.committed = {}
+        self.pending = {}
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=()):
+        if sql.strip().startswith("INSERT INTO cache_versions"):
+            name = params[0]
+            self.pending[name] = self.pending.get(name, self.committed.get(name, 0)) + 1
+        self.rows = list(self.committed.items())
+
+    def fetchall(self):
+        return self.rows
+
+    def commit(self):
+        self.committed.update(self.pending)
+        self.pending = {}
+
+    def close(self):
+        pass
+
+
+def test_entries_are_dropped_only_after_the_commit():
+    db = VersionsDb()
+    cache = VersionedCache(version_ttl=60)
+    assert cache.get(db, "options", lambda: ["old"], depends="empleados") == ["old"]
+    cursor = db.cursor()
+    cache.invalidate(cursor, "empleados")
+    # Before the commit every reader still gets the old rows from the cache
+    assert cache.get(db, "options", lambda: ["reloaded"], depends="empleados") == ["old"]
+    db.commit()
+    cache.forget("empleados")
+    assert cache.get(db, "options", lambda: ["new"], depends="empleados") == ["new"]
+    assert cache.version(db, "empleados") == 1
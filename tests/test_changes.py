@@ -0,0 +1,89 @@
+from datetime import datetime
+
+from app import changes
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def row(id, entidad="clientes"):
+    return {"id": id, "entidad": entidad, "entidad_id": id, "operacion": "insert", "datos": b'{"total": 1.10}',
+            "creado": NOW, "ahora": NOW}
+
+
+class FakeDb:
+    """Answers READ_SQL with ``reads`` in turn and OPEN_SQL with ``open`` transactions."""
+
+    def __init__(self, reads, open=0):
+        self.reads = list(reads)
+        self.open = open
+        self.commits = 0
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, sql, params=()):
+        self.sql = sql
+
+    def fetchall(self):
+        return self.db.reads.pop(0)
+
+    def fetchone(self):
+        assert self.sql == changes.OPEN_SQL
+        return {"n": self.db.open}
+
+    def close(self):
+        pass
+
+
+def test_settled_stops_at_a_gap():
+    rows = [row(5), row(6), row(8), row(9)]
+    assert [r["id"] for r in changes.settled(rows, 4)] == [5, 6]
+    assert changes.settled(rows, 3) == []
+    assert changes.gap(rows, 4)
+    assert not changes.gap(rows[:2], 4)
+
+
+def test_settled_moves_past_confirmed_gaps_only():
+    rows = [row(1), row(3), row(4), row(7)]
+    assert [r["id"] for r in changes.settled(rows, 0, confirmed=4)] == [1, 3, 4]
+    assert [r["id"] for r in changes.settled(rows, 0, confirmed=7)] == [1, 3, 4, 7]
+
+
+def test_old_rows_are_not_skipped_while_a_writer_is_open():
+    db = FakeDb([[row(1), row(3)]], open=1)
+    data, after = changes.read(db, 0)
+    assert [c["offset"] for c in data] == [1] and after == 1
+    assert db.commits == 0
+
+
+def test_gap_resolved_once_no_older_writer_is_open():
+    # Id 2 committed between the two reads; id 5 is after the first read's rows
+    db = FakeDb([[row(1), row(3), row(4)], [row(1), row(2), row(3), row(4), row(6)]], open=0)
+    data, after = changes.read(db, 0)
+    assert [c["offset"] for c in data] == [1, 2, 3, 4] and after == 4
+    assert db.commits == 1
+
+
+def test_rolled_back_gap_is_passed():
+    db = FakeDb([[row(1), row(3)], [row(1), row(3)]], open=0)
+    assert changes.read(db, 0)[1] == 3
+
+
+def test_filtered_changes_still_move_the_offset():
+    db = FakeDb([[row(1, "ventas"), row(2, "clientes")]])
+    data, after = changes.read(db, 0, entidades=["clientes"])
+    assert [c["entidad"] for c in data] == ["clientes"] and after == 2
+
+
+def test_decode_keeps_decimals_exact():
+    change = changes.decode(row(1))
+    assert str(change["datos"]["total"]) == "1.10"
+    assert change["creado"] == "2026-01-01T12:00:00"
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from app.db import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    unread_result = False
+
+    def __init__(self, n):
+        self.n = n
+        self.closed = False
+        self.pings = 0
+        self.healthy = True
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if not self.healthy:
+            raise OSError("gone away")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class Factory:
+    def __init__(self):
+        self.made = []
+
+    def __call__(self):
+        conn = FakeConnection(len(self.made) + 1)
+        self.made.append(conn)
+        return conn
+
+
+def make_pool(**kwargs):
+    factory = Factory()
+    return ConnectionPool(factory=factory, **kwargs), factory
+
+
+def test_connections_are_opened_lazily_and_reused():
+    pool, factory = make_pool(size=2)
+    assert factory.made == []
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert len(factory.made) == 1
+    assert pool.metrics()["checkouts"] == 2
+    assert pool.in_use == 1
+
+
+def test_waits_for_a_released_connection_at_size():
+    pool, factory = make_pool(size=1, timeout=5)
+    conn = pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    assert got == []
+    pool.release(conn)
+    waiter.join(5)
+    assert got == [conn]
+    assert len(factory.made) == 1
+    assert pool.metrics()["waits"] == 1
+
+
+def test_times_out_when_every_connection_is_in_use():
+    pool, factory = make_pool(size=1, timeout=0.05)
+    pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.metrics()["timeouts"] == 1
+    assert len(factory.made) == 1
+
+
+def test_idle_connections_past_max_idle_are_closed():
+    pool, factory = make_pool(size=2, max_idle=0.01)
+    conn = pool.acquire()
+    pool.release(conn)
+    time.sleep(0.02)
+    fresh = pool.acquire()
+    assert fresh is not conn and conn.closed
+    assert pool.metrics()["evicted"] == 1
+    assert pool.metrics()["open"] == 1
+
+
+def test_hot_connections_are_not_pinged():
+    pool, _ = make_pool(ping_after=60)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert conn.pings == 0
+
+
+def test_connection_failing_its_ping_is_replaced():
+    pool, factory = make_pool(size=1, ping_after=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.healthy = False
+    fresh = pool.acquire()
+    assert fresh is not conn and conn.closed
+    assert len(factory.made) == 2
+    data = pool.metrics()
+    assert data["discarded"] == 1 and data["open"] == 1
+
+
+def test_failed_connect_frees_its_slot():
+    def broken():
+        raise OSError("refused")
+
+    pool = ConnectionPool(size=1, timeout=0.05, factory=broken)
+    for _ in range(2):
+        with pytest.raises(OSError):
+            pool.acquire()
+    assert pool.metrics()["open"] == 0
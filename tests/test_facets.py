@@ -0,0 +1,153 @@
+import re
+import sqlite3
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from app import facets
+
+VEHICULOS = [
+    # tipo, anio, color, precio_venta
+    ("suv", 2012, "rojo", 30000),
+    ("suv", 2018, "negro", 45000),
+    ("suv", None, "rojo", 25000),
+    ("sedan", 2010, "rojo", 18000),
+    ("sedan", None, None, 90000),
+    (None, 2020, "blanco", None),
+]
+
+
+class Cursor:
+    # sqlite3 with MySQL-style %s placeholders and dict-like rows
+    def __init__(self, db):
+        self._cursor = db.cursor()
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(re.sub(r"%s", "?", sql), tuple(params))
+
+    def fetchall(self):
+        names = [d[0] for d in self._cursor.description]
+        return [dict(zip(names, row)) for row in self._cursor.fetchall()]
+
+    def fetchone(self):
+        rows = self.fetchall()
+        return rows[0] if rows else None
+
+
+def band(precio):
+    if precio is None:
+        return None
+    return sum(precio >= bound for bound in facets.PRICE_BANDS)
+
+
+@pytest.fixture
+def db():
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE vehiculos (id INTEGER PRIMARY KEY, tipo TEXT, anio INT, color TEXT, banda_precio INT)")
+    db.execute("""
+        CREATE TABLE vehiculos_facetas (tipo TEXT, anio INT, color TEXT, banda_precio INT, num_vehiculos INT,
+                                        PRIMARY KEY (tipo, anio, color, banda_precio))
+    """)
+    db.executemany("INSERT INTO vehiculos (tipo, anio, color, banda_precio) VALUES (?,?,?,?)",
+                   [(t, a, c, band(p)) for t, a, c, p in VEHICULOS])
+    facets.backfill(db)
+    return db
+
+
+def selection(**args):
+    return facets.parse(MultiDict(args))
+
+
+def list_count(db, seleccion):
+    cond, params = facets.where(seleccion)
+    cursor = Cursor(db)
+    cursor.execute(f"SELECT COUNT(*) AS cnt FROM vehiculos{' WHERE ' + cond if cond else ''}", params)
+    return cursor.fetchone()["cnt"]
+
+
+def test_parse_drops_invalid_values():
+    seleccion = facets.parse(MultiDict([("tipo", "suv"), ("tipo", ""), ("tipo", "suv"), ("banda_precio", "9"),
+                                        ("banda_precio", "x"), ("banda_precio", "1"), ("anio_desde", "abc")]))
+    assert seleccion == {"tipo": ["suv"], "color": [], "banda_precio": [1], "anio_desde": None, "anio_hasta": None}
+    assert facets.active(seleccion)
+    assert not facets.active(selection())
+
+
+def test_query_string_keeps_the_selection():
+    seleccion = selection(tipo="suv", anio_hasta="2015")
+    assert facets.query_string(seleccion, "hi lux") == "tipo=suv&anio_hasta=2015&q=hi+lux"
+
+
+def test_where_skips_one_facet():
+    seleccion = facets.parse(MultiDict([("tipo", "suv"), ("tipo", "van"), ("color", "rojo"), ("anio_desde", "2010")]))
+    assert facets.where(seleccion) == ("tipo IN (%s,%s) AND color IN (%s) AND anio >= %s", ["suv", "van", "rojo", 2010])
+    assert facets.where(seleccion, skip="tipo") == ("color IN (%s) AND anio >= %s", ["rojo", 2010])
+    assert facets.where(seleccion, skip="anio") == ("tipo IN (%s,%s) AND color IN (%s)", ["suv", "van", "rojo"])
+
+
+def test_anio_bound_leaves_null_anio_out_of_the_facet_table():
+    seleccion = selection(anio_hasta="2015")
+    assert facets.where(seleccion) == ("anio <= %s", [2015])
+    assert facets.where(seleccion, facet_table=True) == ("anio >= 1 AND anio <= %s", [2015])
+    assert facets.where(selection(), facet_table=True) == ("", [])
+
+
+@pytest.mark.parametrize("args", [
+    {},
+    {"anio_hasta": "2015"},
+    {"anio_desde": "0"},
+    {"anio_desde": "2011", "anio_hasta": "2019"},
+    {"tipo": "suv", "anio_hasta": "2015"},
+    {"color": "rojo", "banda_precio": "1"},
+])
+def test_total_matches_the_list_count(db, args):
+    seleccion = selection(**args)
+    assert facets.counts(Cursor(db), seleccion)["total"] == list_count(db, seleccion)
+
+
+def test_counts_apply_the_other_facets(db):
+    result = facets.counts(Cursor(db), selection(tipo="suv"))
+    assert result["total"] == 3
+    # Every tipo still shows how many it would add; the missing tipo is left out
+    assert result["tipo"] == [{"valor": "sedan", "n": 2, "activo": False}, {"valor": "suv", "n": 3, "activo": True}]
+    assert [(o["valor"], o["n"]) for o in result["color"]] == [("negro", 1), ("rojo", 2)]
+    assert [(o["valor"], o["n"]) for o in result["anio"]] == [(2012, 1), (2018, 1)]
+    assert result["banda_precio"][0] == {"valor": 1, "n": 2, "activo": False, "etiqueta": "20.000 - 35.000"}
+
+
+def test_counts_result_skips_missing_values():
+    rows = [
+        {"faceta": "tipo", "valor": "", "n": 4},
+        {"faceta": "anio", "valor": "0", "n": 2},
+        {"faceta": "banda_precio", "valor": "-1", "n": 1},
+        {"faceta": "banda_precio", "valor": "4", "n": 3},
+        {"faceta": "total", "valor": "", "n": 9},
+    ]
+    result = facets.counts_result(rows, selection(banda_precio="4"))
+    assert result["tipo"] == [] and result["anio"] == []
+    assert result["banda_precio"] == [{"valor": 4, "n": 3, "activo": True, "etiqueta": ">= 80.000"}]
+    assert result["total"] == 9
+
+
+def test_band_labels():
+    assert facets.band_label(0) == "< 20.000"
+    assert facets.band_label(2) == "35.000 - 50.000"
+    assert facets.band_label(len(facets.PRICE_BANDS)) == ">= 80.000"
+
+
+def test_vehiculos_changed_applies_sorted_deltas():
+    class Recorder:
+        def __init__(self):
+            self.calls = []
+
+        def execute(self, sql, params):
+            self.calls.append(params)
+
+    old = [{"id": 1, "tipo": "suv", "anio": 2012, "color": "rojo", "banda_precio": 1}]
+    new = [{"id": 1, "tipo": "suv", "anio": 2012, "color": None, "banda_precio": 1}]
+    cursor = Recorder()
+    facets.vehiculos_changed(cursor, old, new)
+    assert cursor.calls == [("suv", 2012, "", 1, 1), ("suv", 2012, "rojo", 1, -1)]
+    cursor = Recorder()
+    facets.vehiculos_changed(cursor, old, old)
+    assert cursor.calls == []
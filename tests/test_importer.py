@@ -0,0 +1,111 @@
+import io
+
+import pytest
+
+from app import importer
+from app.importer import CSVImportError, import_csv
+
+
+class FakeDb:
+    """Enough of a connection for import_csv: records the inserts and hands out ids."""
+
+    def __init__(self, step=1, taken=(), fail_multi_row=False):
+        self.step = step
+        self.fail_multi_row = fail_multi_row
+        self.taken = set(taken)
+        self.inserted = []
+        self.multi_row = 0
+        self.next_id = 100
+        self.unread_result = False
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeCursor:
+    with_rows = False
+
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        self.rows = []
+        if "@@auto_increment_increment" in sql:
+            self.rows = [(self.db.step,)]
+        elif sql.startswith("SELECT dni"):
+            self.rows = [(k,) for k in params if k in self.db.taken]
+        elif sql.startswith("INSERT INTO"):
+            rows = sql.count("),(") + 1
+            if rows > 1:
+                if self.db.fail_multi_row:
+                    raise importer.mysql.connector.IntegrityError(msg="Duplicate entry")
+                self.db.multi_row += 1
+            width = len(params) // rows
+            self.lastrowid = self.db.next_id
+            for i in range(rows):
+                self.db.inserted.append((self.db.next_id, params[i * width:(i + 1) * width]))
+                self.db.next_id += self.db.step
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def no_side_effects(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(importer.lookups, "bump", lambda db, *names: None)
+    for entity in ("clientes", "vehiculos"):
+        repo = importer.repositories[entity]
+        monkeypatch.setattr(repo, "record", lambda cursor, operacion, ids: recorded.append(list(ids)))
+        monkeypatch.setattr(repo, "written", lambda db, old, ids: None)
+    return recorded
+
+
+def test_rejects_missing_columns():
+    with pytest.raises(CSVImportError):
+        import_csv(FakeDb(), "clientes", io.StringIO("correo\nx@example.com\n"))
+    with pytest.raises(CSVImportError):
+        import_csv(FakeDb(), "ventas", io.StringIO("total\n1\n"))
+
+
+def test_reports_bad_and_duplicate_rows():
+    csv = "nombre,dni,correo\nAna,1,ana@example.com\n,2,\nLuis,1,\nEva,3,no-correo\nPia,9,\n"
+    result = import_csv(FakeDb(taken={"9"}), "clientes", io.StringIO(csv))
+    assert result["inserted"] == 1
+    assert result["errors"] == [(3, "Falta el campo nombre"), (4, "DNI repetido en el archivo: 1"),
+                                (5, "Correo no válido"), (6, "DNI duplicado: 9")]
+
+
+def test_batch_is_one_insert_with_ids_from_lastrowid(no_side_effects):
+    db = FakeDb()
+    import_csv(db, "vehiculos", io.StringIO("modelo,anio\nHilux,2020\nYaris,\nCorolla,2021\n"))
+    assert db.multi_row == 1
+    assert no_side_effects == [[100, 101, 102]]
+    assert [params[0] for _, params in db.inserted] == ["Hilux", "Yaris", "Corolla"]
+
+
+def test_ids_follow_the_auto_increment_step(no_side_effects):
+    db = FakeDb(step=2)
+    import_csv(db, "clientes", io.StringIO("nombre,dni\nAna,1\nLuis,2\n"))
+    assert db.multi_row == 1 and no_side_effects == [[100, 102]]
+
+
+def test_failed_batch_is_retried_row_by_row(no_side_effects):
+    db = FakeDb(fail_multi_row=True)
+    result = import_csv(db, "vehiculos", io.StringIO("modelo\nHilux\nYaris\n"))
+    assert result["inserted"] == 2 and db.multi_row == 0
+    assert no_side_effects == [[100, 101]]
@@ -0,0 +1,32 @@
+from app import inventory
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, sql, params=()):
+        self.calls.append(params)
+
+
+def test_deltas_are_summed_per_group_and_written_in_key_order():
+    deltas = inventory.Deltas()
+    deltas.add("taller", "Norte", disponible=-2)
+    deltas.add("nave", "Norte", disponible=-3)
+    deltas.add("taller", "Norte", bajo_stock=1)
+    cursor = RecordingCursor()
+    deltas.apply(cursor, slot=5)
+    assert [params[:3] for params in cursor.calls] == [
+        ("tipo", "nave", 5), ("tipo", "taller", 5), ("total", "", 5), ("ubicacion", "Norte", 5),
+    ]
+    assert cursor.calls[2][3:] == (0, 0, -5, 1)
+
+
+def test_groups_that_net_to_zero_are_not_written():
+    deltas = inventory.Deltas()
+    deltas.add("nave", "Norte", 1, 100, 50)
+    deltas.add("nave", "Sur", -1, -100, -50)
+    cursor = RecordingCursor()
+    deltas.apply(cursor)
+    assert sorted(params[:2] for params in cursor.calls) == [("ubicacion", "Norte"), ("ubicacion", "Sur")]
+    assert 0 <= cursor.calls[0][2] < inventory.INVENTORY_SLOTS
@@ -0,0 +1,20 @@
+from app import metrics
+
+
+def test_cumulative_stats_are_counters_and_the_rest_gauges():
+    lines = metrics.stats("erp_db_pool", "Connection pool", [({}, {"checkouts": 7, "in_use": 2, "error": "x"})],
+                          counters={"checkouts"})
+    assert "# TYPE erp_db_pool_checkouts_total counter" in lines
+    assert "erp_db_pool_checkouts_total 7" in lines
+    assert "# TYPE erp_db_pool_in_use gauge" in lines
+    assert not any("error" in line for line in lines)
+
+
+def test_instances_share_one_family_by_label():
+    lines = metrics.stats("erp_db_replica", "Read replica", [({"replica": "0"}, {"lag": 1.5}),
+                                                             ({"replica": "1"}, {"lag": None})])
+    assert lines == [
+        "# HELP erp_db_replica_lag Read replica (lag)",
+        "# TYPE erp_db_replica_lag gauge",
+        'erp_db_replica_lag{replica="0"} 1.5',
+    ]
@@ -0,0 +1,88 @@
+import mysql.connector
+import pytest
+
+from app import migrations
+
+
+def test_split_sql():
+    text = """
+        -- comment
+        DROP DATABASE IF EXISTS erp;
+        CREATE DATABASE erp;
+        USE erp;
+        CREATE TABLE a (
+            id INT
+        );
+        ALTER TABLE a ADD INDEX i (id);
+        INSERT INTO a VALUES (1)
+    """
+    assert migrations.split_sql(text) == [
+        "CREATE TABLE a (\n            id INT\n        )",
+        "ALTER TABLE a ADD INDEX i (id)",
+        "INSERT INTO a VALUES (1)",
+    ]
+
+
+def test_available_migrations_are_numbered_in_order():
+    found = migrations.available_migrations()
+    versions = [version for version, _, _ in found]
+    assert versions == sorted(versions) and len(set(versions)) == len(versions)
+    assert migrations.latest_version() == versions[-1]
+
+
+class FakeSchema:
+    """Records applied statements and schema_migration_steps like MySQL would."""
+
+    def __init__(self, applied=(), steps=None, fail=None):
+        self.applied = list(applied)
+        self.steps = steps
+        self.fail = fail
+
+    def commit(self):
+        pass
+
+    def execute(self, sql, params=()):
+        self.last = sql
+        if sql.startswith("SELECT steps"):
+            return
+        if sql.startswith("INSERT INTO schema_migration_steps"):
+            self.steps = params[1]
+        elif sql == self.fail:
+            raise mysql.connector.Error(msg="broken", errno=1054)
+        elif sql in self.applied:
+            raise mysql.connector.Error(msg="Duplicate key name", errno=1061)
+        else:
+            self.applied.append(sql)
+
+    def fetchone(self):
+        return None if self.steps is None else (self.steps,)
+
+
+@pytest.fixture
+def migration(tmp_path):
+    path = tmp_path / "099_test.sql"
+    path.write_text("ALTER TABLE a ADD x INT;\nALTER TABLE a ADD y INT;\nALTER TABLE a ADD INDEX i (x);\n")
+    return str(path)
+
+
+def test_failed_migration_resumes_at_the_failed_statement(migration):
+    schema = FakeSchema(fail="ALTER TABLE a ADD y INT")
+    with pytest.raises(mysql.connector.Error):
+        migrations._run_file(schema, schema, 99, migration)
+    assert schema.steps == 1
+    schema.fail = None
+    migrations._run_file(schema, schema, 99, migration)
+    assert schema.applied == ["ALTER TABLE a ADD x INT", "ALTER TABLE a ADD y INT", "ALTER TABLE a ADD INDEX i (x)"]
+    assert schema.steps == 3
+
+
+def test_statement_applied_but_not_recorded_counts_as_done(migration):
+    schema = FakeSchema(applied=["ALTER TABLE a ADD x INT", "ALTER TABLE a ADD y INT"], steps=1)
+    migrations._run_file(schema, schema, 99, migration)
+    assert schema.steps == 3
+
+
+def test_already_applied_error_on_a_new_migration_is_raised(migration):
+    schema = FakeSchema(applied=["ALTER TABLE a ADD x INT"])
+    with pytest.raises(mysql.connector.Error):
+        migrations._run_file(schema, schema, 99, migration)
@@ -0,0 +1,53 @@
+from app.pagination import decode_cursor, encode_cursor, keyset_query, keyset_result, page_count
+
+
+def test_cursor_round_trip():
+    token = encode_cursor([5, "2024-01-01"], 3, "next")
+    assert "=" not in token
+    assert decode_cursor(token) == ([5, "2024-01-01"], 3, "next")
+
+
+def test_bad_cursor_falls_back_to_first_page():
+    assert decode_cursor("") is None
+    assert decode_cursor("not-a-cursor") is None
+    assert decode_cursor(encode_cursor([1], 2, "next")[:-3]) is None
+
+
+def test_seek_condition_and_limit():
+    token = encode_cursor([7, 3], 2, "next")
+    sql, params, state = keyset_query("SELECT * FROM t", "a = %s", ["x"], ["fecha", "id"], token, per_page=10)
+    assert sql == ("SELECT * FROM t WHERE (a = %s) AND ((fecha > %s) OR (fecha = %s AND id > %s))"
+                   " ORDER BY fecha ASC, id ASC LIMIT %s")
+    assert params == ("x", 7, 7, 3, 11)
+    assert state == {"page": 2, "backwards": False, "seeking": True, "per_page": 10}
+
+
+def test_cursor_for_other_columns_is_ignored():
+    sql, params, state = keyset_query("SELECT * FROM t", "", [], ["id"], encode_cursor([1, 2], 2, "next"))
+    assert "WHERE" not in sql and params == (11,)
+    assert state["page"] == 1 and not state["seeking"]
+
+
+def test_prev_page_scans_backwards_and_restores_order():
+    sql, _, state = keyset_query("SELECT * FROM t", "", [], ["id"], encode_cursor([11], 3, "prev"), per_page=2)
+    assert "id < %s" in sql and sql.endswith("ORDER BY id DESC LIMIT %s")
+    result = keyset_result([{"id": 10}, {"id": 9}, {"id": 8}], state, ["id"])
+    assert [r["id"] for r in result["rows"]] == [9, 10]
+    assert result["page"] == 3
+    assert decode_cursor(result["next"]) == ([10], 4, "next")
+    assert decode_cursor(result["prev"]) == ([9], 2, "prev")
+
+
+def test_first_and_last_page_tokens():
+    _, _, state = keyset_query("SELECT * FROM t", "", [], ["id"], per_page=2)
+    first = keyset_result([{"id": 1}, {"id": 2}, {"id": 3}], state, ["id"])
+    assert first["prev"] is None and decode_cursor(first["next"]) == ([2], 2, "next")
+    _, _, state = keyset_query("SELECT * FROM t", "", [], ["id"], first["next"], per_page=2)
+    last = keyset_result([{"id": 3}], state, ["id"])
+    assert last["next"] is None and decode_cursor(last["prev"]) == ([3], 1, "prev")
+
+
+def test_page_count():
+    assert page_count(0) == 1
+    assert page_count(10, 10) == 1
+    assert page_count(11, 10) == 2
@@ -0,0 +1,28 @@
+from decimal import Decimal
+
+import pytest
+
+from app import rollups, sales
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, sql, params=()):
+        self.calls.append(params)
+
+
+def test_parse_total():
+    assert sales.parse_total("19999.99") == Decimal("19999.99")
+    assert sales.parse_total("") == 0
+    with pytest.raises(ValueError):
+        sales.parse_total("mucho")
+
+
+def test_rollup_deltas_stay_decimal():
+    cursor = RecordingCursor()
+    rollups.apply_venta(cursor, "2024-03-01", 7, "0.10")
+    rollups.apply_venta(cursor, "2024-03-01", 7, Decimal("0.20"), sign=-1)
+    assert cursor.calls[0][2] == Decimal("0.10") and isinstance(cursor.calls[0][2], Decimal)
+    assert cursor.calls[1][2] == Decimal("-0.20")
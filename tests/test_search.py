@@ -0,0 +1,56 @@
+from datetime import date
+
+from app.search import _date_span, filter_source, fulltext_query, search_source, ventas_filter
+
+
+def test_fulltext_query_requires_every_word():
+    assert fulltext_query("Juan Pérez") == '+"Juan" +"Pérez"'
+    # Words shorter than the ngram token size can't be matched by the index
+    assert fulltext_query("a b") == ""
+    # Quotes and boolean operators in the input never reach the query
+    assert fulltext_query('roj"o* -x') == '+"roj"'
+
+
+def test_short_search_uses_escaped_prefix():
+    source, params = search_source("clientes", "%")
+    assert "nombre LIKE %s" in source and "dni LIKE %s" in source
+    assert params == ["\\%%"] * 3
+
+
+def test_date_span():
+    assert _date_span("2024") == [date(2024, 1, 1), date(2024, 12, 31)]
+    assert _date_span("2024-02") == [date(2024, 2, 1), date(2024, 2, 29)]
+    assert _date_span("2024-12") == [date(2024, 12, 1), date(2024, 12, 31)]
+    assert _date_span("2024-03-15") == [date(2024, 3, 15)] * 2
+    assert _date_span("2024-13") is None
+    assert _date_span("2024-02-30") is None
+    assert _date_span("Maria") is None
+
+
+def test_ventas_filter_forms():
+    assert ventas_filter("17") == ("v.id = %s", [17])
+    where, params = ventas_filter("2024")
+    assert where == "(v.id = %s OR v.fecha BETWEEN %s AND %s)" and params[0] == 2024
+    assert ventas_filter("2024-03")[0] == "v.fecha BETWEEN %s AND %s"
+    assert "MATCH(nombre)" in ventas_filter("Maria")[0]
+    assert ventas_filter("M") == ("e.nombre LIKE %s", ["M%"])
+
+
+def test_search_matches_inside_tipo_and_color():
+    source, params = search_source("vehiculos", "roj")
+    for col in ("modelo", "tipo", "color"):
+        assert f"MATCH({col})" in source
+    assert params == ['+"roj"'] * 3
+
+
+def test_search_matches_inside_departamento_and_role():
+    source, params = search_source("empleados", "visor")
+    for col in ("nombre", "departamento", "role"):
+        assert f"MATCH({col})" in source
+    assert " = %s" not in source
+    assert params == ['+"visor"'] * 3 + ["visor%"] * 2
+
+
+def test_unfiltered_list_has_no_where():
+    assert filter_source("clientes", "") == ("clientes", "", [])
+    assert filter_source("ventas", "")[0].startswith("ventas v JOIN empleados e")
@@ -0,0 +1,23 @@
+import os
+import stat
+
+import pytest
+
+from app.sessions import SQLiteStore
+
+
+def test_sqlite_store_is_private_to_its_user(tmp_path):
+    path = tmp_path / "private" / "sessions.db"
+    store = SQLiteStore(str(path))
+    assert stat.S_IMODE(os.stat(path.parent).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    store.save("sid", "{}", 1, 60)
+    assert store.load("sid")[0] == "{}"
+
+
+def test_sqlite_store_refuses_a_shared_directory(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    os.chmod(shared, 0o1777)
+    with pytest.raises(RuntimeError):
+        SQLiteStore(str(shared / "sessions.db"))
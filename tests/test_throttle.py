@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from app import throttle
+from app.throttle import HashPool, HashPoolBusy, TokenBuckets
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(throttle.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    buckets = TokenBuckets(rate=0.5, burst=2)
+    assert buckets.take("ip") == 0.0
+    assert buckets.take("ip") == 0.0
+    assert buckets.take("ip") == pytest.approx(2.0)
+    assert buckets.wait_time("ip") == pytest.approx(2.0)
+    clock[0] += 2
+    assert buckets.wait_time("ip") == 0.0
+    assert buckets.take("ip") == 0.0
+
+
+def test_buckets_are_per_key(clock):
+    buckets = TokenBuckets(rate=1, burst=1)
+    assert buckets.take("a") == 0.0
+    assert buckets.take("a") > 0
+    assert buckets.take("b") == 0.0
+
+
+def test_least_recently_used_keys_are_dropped(clock):
+    buckets = TokenBuckets(rate=1, burst=1, max_keys=2)
+    for key in ("a", "b", "c"):
+        buckets.take(key)
+    # "a" was forgotten, so it starts again with a full bucket
+    assert buckets.take("a") == 0.0
+    assert buckets.take("c") > 0
+
+
+def test_hash_pool_refuses_work_past_its_queue():
+    pool = HashPool(workers=1, queue=0)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    results = []
+    worker = threading.Thread(target=lambda: results.append(pool._run(slow, (), 5)))
+    worker.start()
+    started.wait(5)
+    with pytest.raises(HashPoolBusy):
+        pool._run(lambda: None, (), 1)
+    release.set()
+    worker.join(5)
+    assert results == ["done"]
+    assert pool._run(lambda: "again", (), 5) == "again"
+
+
+def test_unknown_correo_still_pays_for_a_hash(monkeypatch):
+    checked = []
+    monkeypatch.setattr(throttle, "check_password_hash", lambda pwhash, pw: checked.append(pwhash) or True)
+    pool = HashPool(workers=1, queue=0)
+    # No stored hash: the dummy one is checked and the login fails anyway
+    assert pool.check(None, "secret") is False
+    assert pool.check("", "secret") is False
+    assert pool.check("pbkdf2:sha256$x", "secret") is True
+    assert checked == [throttle.DUMMY_HASH, throttle.DUMMY_HASH, "pbkdf2:sha256$x"]
@@ -0,0 +1,4 @@
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+from app.main import app, check_schema
+
+check_schema()